@@ -0,0 +1,147 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from .detector import detector
+from .metrics import INFERENCE_BATCH_SIZE, INFERENCE_QUEUE_WAIT_SECONDS
+
+MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH", "8"))
+MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "15"))
+
+
+class _Request:
+    __slots__ = ("image", "threshold", "future", "enqueued_at")
+
+    def __init__(self, image, threshold):
+        self.image = image
+        self.threshold = threshold
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class InferenceBatcher:
+    """
+    Collects concurrent analyze() calls into micro-batches so the detector
+    runs one forward pass per batch instead of one per image.
+    A batch is dispatched when it reaches max_batch_size images or when the
+    oldest queued image has waited max_wait_ms, whichever comes first.
+    """
+
+    def __init__(self, detector, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.detector = detector
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._batches = 0
+        self._images = 0
+        self._batch_sizes = {}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._infer_total = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, image, threshold=None):
+        """Queue one image and return a Future resolving to its analysis dict."""
+        self.start()
+        request = _Request(image, threshold)
+        self._queue.put(request)
+        return request.future
+
+    def analyze(self, image, threshold=None):
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(image, threshold).result()
+
+    def analyze_tiled(self, image, tiling, threshold=None):
+        """
+        Sliced inference with every tile queued like an uploaded image, so
+        tiles share batches with concurrent requests and show up in the
+        queue and batch-size stats.
+        """
+        return self.detector.analyze_tiled(image, tiling, threshold, analyze_crops=self._analyze_all)
+
+    def _analyze_all(self, images):
+        futures = [self.submit(image) for image in images]
+        return [future.result() for future in futures]
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                results = self.detector.analyze_batch(
+                    [r.image for r in batch],
+                    [r.threshold for r in batch]
+                )
+            except Exception as e:
+                for r in batch:
+                    r.future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            for r, result in zip(batch, results):
+                r.future.set_result(result)
+
+            self._record(batch, started, finished)
+
+    def _record(self, batch, started, finished):
+        INFERENCE_BATCH_SIZE.observe(len(batch))
+        for r in batch:
+            INFERENCE_QUEUE_WAIT_SECONDS.observe(started - r.enqueued_at)
+        with self._lock:
+            self._batches += 1
+            self._images += len(batch)
+            self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+            for r in batch:
+                wait = started - r.enqueued_at
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+            self._infer_total += finished - started
+
+    def stats(self, reset=False):
+        with self._lock:
+            batches = self._batches or 1
+            images = self._images or 1
+            snapshot = {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "images": self._images,
+                "avg_batch_size": self._images / batches,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "avg_queue_wait_ms": self._wait_total / images * 1000,
+                "max_queue_wait_ms": self._wait_max * 1000,
+                "avg_batch_inference_ms": self._infer_total / batches * 1000,
+            }
+            if reset:
+                self._reset_stats()
+        return snapshot
+
+
+# Singleton instance
+batcher = InferenceBatcher(detector)
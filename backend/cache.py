@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import or_
+
+from .database import CachedPrediction
+
+CACHE_MAX_BYTES = int(os.getenv("PREDICTION_CACHE_BYTES", str(64 * 1024 * 1024)))
+READ_CHUNK_SIZE = 1 << 20
+
+
+def read_and_hash(fileobj, chunk_size=READ_CHUNK_SIZE):
+    """Read a stream to the end, computing its sha256 in the same pass."""
+    digest = hashlib.sha256()
+    chunks = []
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        digest.update(chunk)
+        chunks.append(chunk)
+    return b"".join(chunks), digest.hexdigest()
+
+
+def file_checksum(path, chunk_size=READ_CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    LRU of model predictions keyed by (content hash, model version), bounded
+    by the approximate byte size of its entries and backed by the
+    prediction_cache table so hits survive restarts.
+    Because the model version is part of the key, new weights never see
+    predictions produced by old ones.
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _size_of(entry):
+        return len(json.dumps(entry["predictions"])) + len(entry["image_filename"]) + 128
+
+    def _remember(self, key, entry):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._sizes.pop(key)
+                del self._entries[key]
+            size = self._size_of(entry)
+            self._entries[key] = entry
+            self._sizes[key] = size
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(old_key)
+
+    def get(self, db, content_hash, model_version):
+        key = (content_hash, model_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        row = db.query(CachedPrediction).filter(
+            CachedPrediction.content_hash == content_hash,
+            CachedPrediction.model_version == model_version
+        ).first()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        entry = {
+            "image_filename": row.image_filename,
+            "predictions": row.predictions,
+            "max_confidence": row.max_confidence,
+            "image_width": row.image_width,
+            "image_height": row.image_height,
+            "perceptual_hash": row.perceptual_hash
+        }
+        self._remember(key, entry)
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def put(self, db, content_hash, model_version, image_filename, analysis, image_size=(None, None), perceptual_hash=None):
+        """Stage the entry in the caller's session; it is persisted on their commit."""
+        entry = {
+            "image_filename": image_filename,
+            "predictions": analysis["predictions"],
+            "max_confidence": analysis["max_confidence"],
+            "image_width": image_size[0],
+            "image_height": image_size[1],
+            "perceptual_hash": perceptual_hash
+        }
+        db.merge(CachedPrediction(content_hash=content_hash, model_version=model_version, **entry))
+        self._remember((content_hash, model_version), entry)
+
+    def _forget(self, should_drop):
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if should_drop(k, entry)]:
+                self._bytes -= self._sizes.pop(key)
+                del self._entries[key]
+
+    def discard_images(self, db, filenames):
+        """
+        Drop every entry pointing at one of these stored images (e.g. once
+        retention has archived or recompressed them). Stages the deletes in
+        the caller's transaction.
+        """
+        filenames = set(filenames)
+        if not filenames:
+            return
+        self._forget(lambda key, entry: entry["image_filename"] in filenames)
+        names = sorted(filenames)
+        for start in range(0, len(names), 500):
+            db.query(CachedPrediction).filter(
+                CachedPrediction.image_filename.in_(names[start:start + 500])
+            ).delete(synchronize_session=False)
+
+    @staticmethod
+    def _base_version(model_version):
+        # Tiled entries are keyed "<version>:tiled-..."
+        return model_version.split(":", 1)[0]
+
+    def prune_versions(self, db, keep_versions):
+        """Drop every entry (tiled variants included) produced by weights not in keep_versions."""
+        keep = sorted(set(v for v in keep_versions if v))
+        self._forget(lambda key, entry: self._base_version(key[1]) not in keep)
+        query = db.query(CachedPrediction)
+        if keep:
+            query = query.filter(~or_(*[
+                or_(CachedPrediction.model_version == v, CachedPrediction.model_version.like(f"{v}:%"))
+                for v in keep
+            ]))
+        query.delete(synchronize_session=False)
+        db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+# Singleton instance
+prediction_cache = PredictionCache()
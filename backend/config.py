@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+
+from sqlalchemy import Integer, String, cast, update
+
+from .database import SessionLocal, SystemConfig
+
+CONFIG_REFRESH_SECONDS = float(os.getenv("CONFIG_REFRESH_SECONDS", "1.0"))
+VERSION_KEY = "config_version"
+
+
+class ConfigStore:
+    """
+    In-memory view of the system_configs table.
+    Writes bump a shared version row in the same transaction, and every
+    worker re-reads that single row at most once per refresh interval,
+    reloading the whole table only when the version has moved.
+    """
+
+    def __init__(self, session_factory=SessionLocal, refresh_interval=CONFIG_REFRESH_SECONDS):
+        self.session_factory = session_factory
+        self.refresh_interval = refresh_interval
+        self._values = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, db):
+        rows = db.query(SystemConfig).all()
+        self._values = {row.key: row.value for row in rows}
+        self._version = self._values.get(VERSION_KEY)
+
+    def _refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self._version is not None and now - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            if not force and self._version is not None and now - self._checked_at < self.refresh_interval:
+                return
+            db = self.session_factory()
+            try:
+                row = db.query(SystemConfig.value).filter(SystemConfig.key == VERSION_KEY).first()
+                version = row[0] if row else None
+                if force or self._version is None or version != self._version:
+                    self._load(db)
+            finally:
+                db.close()
+            self._checked_at = now
+
+    def get(self, key, default=None):
+        self._refresh()
+        return self._values.get(key, default)
+
+    def get_float(self, key, default=0.0):
+        value = self.get(key)
+        try:
+            return float(value) if value is not None else default
+        except ValueError:
+            return default
+
+    def get_int(self, key, default=0):
+        value = self.get(key)
+        try:
+            return int(float(value)) if value is not None else default
+        except ValueError:
+            return default
+
+    def set(self, db, key, value):
+        """
+        Stage a config write plus a version bump in the caller's session and
+        return the previous value. Call invalidate() once the caller commits.
+        """
+        config = db.query(SystemConfig).filter(SystemConfig.key == key).first()
+        if config:
+            old_value = config.value
+            config.value = value
+        else:
+            old_value = None
+            db.add(SystemConfig(key=key, value=value))
+
+        bumped = db.execute(
+            update(SystemConfig)
+            .where(SystemConfig.key == VERSION_KEY)
+            .values(value=cast(cast(SystemConfig.value, Integer) + 1, String))
+        )
+        if bumped.rowcount == 0:
+            db.add(SystemConfig(key=VERSION_KEY, value="1"))
+        return old_value
+
+    def invalidate(self):
+        self._refresh(force=True)
+
+
+# Singleton instance
+config_store = ConfigStore()
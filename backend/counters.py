@@ -0,0 +1,91 @@
+import argparse
+
+from sqlalchemy import func, update
+
+from .database import SessionLocal, Inspection, StatusCounter
+
+STATUSES = ["automated", "pending_review", "reviewed"]
+
+
+def bump(db, status, delta=1):
+    """Adjust one status counter inside the caller's transaction."""
+    result = db.execute(
+        update(StatusCounter)
+        .where(StatusCounter.status == status)
+        .values(count=StatusCounter.count + delta)
+    )
+    if result.rowcount == 0:
+        db.add(StatusCounter(status=status, count=delta))
+        db.flush()
+
+
+def move(db, old_status, new_status):
+    if old_status == new_status:
+        return
+    if old_status:
+        bump(db, old_status, -1)
+    bump(db, new_status, 1)
+
+
+def get_counts(db):
+    counts = {status: 0 for status in STATUSES}
+    for row in db.query(StatusCounter).all():
+        counts[row.status] = row.count
+    return counts
+
+
+def actual_counts(db):
+    counts = {status: 0 for status in STATUSES}
+    for status, count in db.query(Inspection.status, func.count(Inspection.id)).group_by(Inspection.status):
+        counts[status] = count
+    return counts
+
+
+def reconcile(db, fix=True):
+    """
+    Recount inspections by status and compare with the stored counters.
+    Returns {status: (stored, actual)} for every mismatch; when fix is True
+    the counters are rewritten from the actual counts.
+    """
+    stored = get_counts(db)
+    actual = actual_counts(db)
+    mismatches = {
+        status: (stored.get(status, 0), actual.get(status, 0))
+        for status in set(stored) | set(actual)
+        if stored.get(status, 0) != actual.get(status, 0)
+    }
+    if fix:
+        db.query(StatusCounter).delete()
+        for status, count in actual.items():
+            db.add(StatusCounter(status=status, count=count))
+        db.commit()
+    return mismatches
+
+
+def init_counters():
+    # Seed from scratch the first time the counters table exists
+    db = SessionLocal()
+    try:
+        if db.query(StatusCounter).first() is None:
+            reconcile(db, fix=True)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild inspection status counters from the inspections table.")
+    parser.add_argument("--check", action="store_true", help="Only report mismatches, do not rewrite counters")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        mismatches = reconcile(db, fix=not args.check)
+    finally:
+        db.close()
+
+    if not mismatches:
+        print("Counters are consistent.")
+    for status, (stored, actual) in sorted(mismatches.items()):
+        print(f"{status}: stored={stored} actual={actual}")
+    if mismatches and args.check:
+        raise SystemExit(1)
@@ -0,0 +1,143 @@
+import argparse
+
+from sqlalchemy import func, exists
+
+from .database import SessionLocal, Inspection, Detection
+
+BACKFILL_BATCH = 1000
+GROUP_BY = ("class", "model_version", "day")
+
+# Detections are keyed by class name rather than the model's class index:
+# fine-tuned weights may number their classes differently from the base model.
+
+
+def detection_rows(inspection, predictions, created_at=None, model_version=None, inspection_id=None):
+    # Link through the relationship when the inspection is not flushed yet
+    link = {"inspection": inspection} if inspection is not None else {"inspection_id": inspection_id}
+    rows = []
+    for p in predictions or []:
+        bbox = p.get("bbox")
+        if not bbox or len(bbox) != 4:
+            continue
+        x1, y1, x2, y2 = (float(v) for v in bbox)
+        rows.append(Detection(
+            **link,
+            class_name=str(p.get("class", "defect")).lower(),
+            confidence=float(p.get("confidence", 0.0)),
+            x1=x1, y1=y1, x2=x2, y2=y2,
+            area=max(0.0, x2 - x1) * max(0.0, y2 - y1),
+            model_version=model_version,
+            created_at=created_at
+        ))
+    return rows
+
+
+def record(db, inspection, predictions):
+    """Stage one row per detection in the caller's transaction."""
+    rows = detection_rows(inspection, predictions, inspection.created_at, inspection.model_version)
+    db.add_all(rows)
+    return rows
+
+
+def filtered(query, classes=None, min_confidence=None, max_confidence=None, min_area=None, max_area=None,
+             since=None, until=None, model_version=None, inspection_id=None):
+    if classes:
+        query = query.filter(Detection.class_name.in_([c.lower() for c in classes]))
+    if min_confidence is not None:
+        query = query.filter(Detection.confidence >= min_confidence)
+    if max_confidence is not None:
+        query = query.filter(Detection.confidence <= max_confidence)
+    if min_area is not None:
+        query = query.filter(Detection.area >= min_area)
+    if max_area is not None:
+        query = query.filter(Detection.area <= max_area)
+    if since is not None:
+        query = query.filter(Detection.created_at >= since)
+    if until is not None:
+        query = query.filter(Detection.created_at < until)
+    if model_version:
+        query = query.filter(Detection.model_version == model_version)
+    if inspection_id is not None:
+        query = query.filter(Detection.inspection_id == inspection_id)
+    return query
+
+
+def aggregate(db, group_by="class", **filters):
+    """Count, confidence and area statistics per class, model version or day."""
+    if group_by not in GROUP_BY:
+        raise ValueError(f"group_by must be one of: {', '.join(GROUP_BY)}")
+    key = {
+        "class": Detection.class_name,
+        "model_version": Detection.model_version,
+        "day": func.date(Detection.created_at)
+    }[group_by].label("key")
+    query = db.query(
+        key,
+        func.count(Detection.id).label("count"),
+        func.avg(Detection.confidence).label("avg_confidence"),
+        func.max(Detection.confidence).label("max_confidence"),
+        func.avg(Detection.area).label("avg_area")
+    )
+    rows = filtered(query, **filters).group_by(key).order_by(key).all()
+    return [
+        {
+            "key": str(row.key) if row.key is not None else None,
+            "count": row.count,
+            "avg_confidence": float(row.avg_confidence or 0),
+            "max_confidence": float(row.max_confidence or 0),
+            "avg_area": float(row.avg_area or 0)
+        }
+        for row in rows
+    ]
+
+
+def backfill(db, batch_size=BACKFILL_BATCH):
+    """
+    Copy detections out of the prediction JSON of inspections that have no
+    detection rows yet. Works in id order and commits per batch, so it can be
+    interrupted and re-run.
+    """
+    has_rows = exists().where(Detection.inspection_id == Inspection.id)
+    last_id = 0
+    inserted = 0
+    while True:
+        batch = db.query(
+            Inspection.id, Inspection.prediction, Inspection.created_at, Inspection.model_version
+        ).filter(
+            Inspection.id > last_id,
+            Inspection.prediction.isnot(None),
+            ~has_rows
+        ).order_by(Inspection.id).limit(batch_size).all()
+        if not batch:
+            break
+        for row in batch:
+            detections = detection_rows(None, row.prediction, row.created_at, row.model_version, inspection_id=row.id)
+            db.add_all(detections)
+            inserted += len(detections)
+        db.commit()
+        last_id = batch[-1].id
+    return inserted
+
+
+def init_detections():
+    # Backfill once, the first time the detections table is empty next to existing inspections
+    db = SessionLocal()
+    try:
+        if db.query(Detection.id).first() is None and db.query(Inspection.id).first() is not None:
+            inserted = backfill(db)
+            print(f"Backfilled {inserted} detections from existing inspections.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the detections table from inspection predictions.")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        inserted = backfill(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"Inserted {inserted} detections.")
@@ -1,38 +1,370 @@
-from ultralytics import YOLO
+import numpy as np
+import cv2
 import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from .cache import file_checksum
+from .metrics import DETECTOR_STAGE_SECONDS, TILES_PER_IMAGE
+from .tiling import box_iou, tile_grid, merge_predictions
+
+# Leading magic bytes of the formats we accept
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"BM", "bmp"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+]
+
+class InvalidImageError(ValueError):
+    pass
+
+def YOLO(*args, **kwargs):
+    # Imported on first use: ultralytics pulls in torch, which dominates API import time
+    from ultralytics import YOLO
+    return YOLO(*args, **kwargs)
+
+def sniff_image_format(data):
+    """Return the file extension for an image buffer based on its header, or None."""
+    head = bytes(data[:12])
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    return None
+
+def decode_image(data):
+    """
+    Decode an encoded image buffer into a BGR numpy array without touching disk.
+    Raises InvalidImageError for unknown headers or undecodable payloads.
+    """
+    if sniff_image_format(data) is None:
+        raise InvalidImageError("Unsupported or corrupt image header")
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise InvalidImageError("Image data could not be decoded")
+    return image
+
+def load_image(image):
+    """Accept a path, raw bytes, a file-like object or a decoded array."""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return decode_image(image)
+    if hasattr(image, "read"):
+        return decode_image(image.read())
+    return image
+
+def version_for(model_path):
+    # Weights checksum, so cached predictions are invalidated when weights change
+    if os.path.isfile(model_path):
+        return file_checksum(model_path)[:16]
+    return os.path.basename(model_path)
+
+# Inference backends: Ultralytics export arguments and the artifact each export produces
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "pytorch")
+BACKENDS = {
+    "pytorch": None,
+    "onnx": ({"format": "onnx", "dynamic": True}, ".onnx"),
+    "openvino": ({"format": "openvino", "dynamic": True}, "_openvino_model"),
+    "openvino_int8": ({"format": "openvino", "int8": True}, "_int8_openvino_model"),
+}
+INT8_CALIBRATION_DATA = os.getenv("INT8_CALIBRATION_DATA", "data/active_learning/dataset.yaml")
+PARITY_TOLERANCE = float(os.getenv("BACKEND_PARITY_TOLERANCE", "0.05"))
+# Quantized weights shift confidences well beyond FP32/FP16 rounding
+INT8_PARITY_TOLERANCE = float(os.getenv("BACKEND_INT8_PARITY_TOLERANCE", "0.15"))
+PARITY_SAMPLES = 4
+TILE_BATCH_SIZE = int(os.getenv("TILE_BATCH_SIZE", "16"))
+
+class BackendError(RuntimeError):
+    pass
+
+def export_backend(model_path, backend):
+    """
+    Export .pt weights for a CPU backend, reusing a previous export that sits
+    next to the weights. Returns the path of the exported model.
+    """
+    if backend not in BACKENDS:
+        raise BackendError(f"Unknown inference backend '{backend}'")
+    if BACKENDS[backend] is None:
+        return model_path
+    export_args, suffix = BACKENDS[backend]
+    target = os.path.splitext(model_path)[0] + suffix
+    if os.path.exists(target):
+        return target
+
+    export_args = dict(export_args)
+    if export_args.get("int8") and os.path.exists(INT8_CALIBRATION_DATA):
+        export_args["data"] = INT8_CALIBRATION_DATA
+    exported = str(YOLO(model_path).export(**export_args))
+    if exported != target and os.path.exists(exported):
+        # Keep int8 and fp32 OpenVINO exports side by side
+        os.replace(exported, target)
+    return target
+
+def parity_tolerance(backend):
+    export = BACKENDS.get(backend)
+    return INT8_PARITY_TOLERANCE if export and export[0].get("int8") else PARITY_TOLERANCE
+
+def parity_samples(limit=PARITY_SAMPLES, raw_dir="data/raw"):
+    samples = []
+    # Uploads are sharded into subdirectories; skip derived renditions
+    for root, dirs, files in os.walk(raw_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("_"))
+        for name in sorted(files)[-limit * 4:]:
+            image = cv2.imread(os.path.join(root, name))
+            if image is not None:
+                samples.append(image)
+            if len(samples) >= limit:
+                break
+        if len(samples) >= limit:
+            break
+    if not samples:
+        rng = np.random.default_rng(0)
+        samples = [rng.integers(0, 255, (640, 640, 3), dtype=np.uint8) for _ in range(limit)]
+    return samples
+
+def check_parity(reference, candidate, samples, tolerance=PARITY_TOLERANCE):
+    """
+    Compare a candidate backend with the PyTorch reference on the same images.
+    Every reference detection must have a same-class candidate box with
+    IoU >= 0.5 and a confidence within `tolerance`, and vice versa.
+    """
+    worst = 0.0
+    mismatches = 0
+    for image in samples:
+        ref = reference(image, verbose=False)[0].boxes
+        cand = candidate(image, verbose=False)[0].boxes
+        ref_boxes = list(zip(ref.cls.tolist(), ref.conf.tolist(), ref.xyxy.tolist()))
+        cand_boxes = list(zip(cand.cls.tolist(), cand.conf.tolist(), cand.xyxy.tolist()))
+        unmatched = list(cand_boxes)
+        for cls, conf, xyxy in ref_boxes:
+            match = max(
+                (c for c in unmatched if c[0] == cls),
+                key=lambda c: box_iou(xyxy, c[2]),
+                default=None
+            )
+            if match is None or box_iou(xyxy, match[2]) < 0.5:
+                mismatches += 1
+                continue
+            unmatched.remove(match)
+            diff = abs(conf - match[1])
+            worst = max(worst, diff)
+            if diff > tolerance:
+                mismatches += 1
+        mismatches += len(unmatched)
+    return {"ok": mismatches == 0, "max_confidence_diff": worst, "mismatches": mismatches, "samples": len(samples), "tolerance": tolerance}
+
+LoadedModel = namedtuple("LoadedModel", ["model", "version", "path", "backend", "parity"])
+
+class ModelNotReadyError(RuntimeError):
+    pass
 
 class DefectDetector:
-    def __init__(self, model_path="yolo11n.pt", default_threshold=0.6):
+    def __init__(self, model_path="yolo11n.pt", default_threshold=0.6, backend="pytorch"):
         """
-        Initialize the YOLO detector. 
+        Create the YOLO detector. Weights are not loaded until start() is
+        called, so importing this module stays cheap.
         yolo11n.pt will be downloaded automatically if not found.
         """
-        self.model = YOLO(model_path)
+        self.default_model_path = model_path
+        self.default_backend = backend
         self.default_threshold = default_threshold
+        self._inflight = {}
+        self._inflight_cond = threading.Condition()
+        self._active = None
+
+    def start(self, model_path=None, version=None, backend=None):
+        """Load and warm up the initial weights (blocking)."""
+        self._active = self.load(
+            model_path or self.default_model_path,
+            version=version,
+            backend=backend or self.default_backend
+        )
+        return self._active
+
+    @property
+    def ready(self):
+        return self._active is not None
+
+    def _require_active(self):
+        active = self._active
+        if active is None:
+            raise ModelNotReadyError("Model is still loading")
+        return active
+
+    @property
+    def model(self):
+        return self._require_active().model
+
+    @property
+    def model_version(self):
+        return self._active.version if self._active else None
+
+    @property
+    def model_path(self):
+        return self._active.path if self._active else self.default_model_path
+
+    @property
+    def backend(self):
+        return self._active.backend if self._active else None
+
+    @property
+    def parity(self):
+        return self._active.parity if self._active else None
+
+    def load(self, model_path, version=None, warmup=True, backend="pytorch"):
+        """
+        Load weights without touching the serving model; swap() makes them live.
+        Non-PyTorch backends are exported from the .pt weights and must pass a
+        parity check against PyTorch, otherwise PyTorch is served instead and
+        the parity report records the backend that was asked for and why it
+        is not served.
+        """
+        model = YOLO(model_path)
+        parity = None
+        if backend != "pytorch":
+            try:
+                candidate = YOLO(export_backend(model_path, backend), task="detect")
+                parity = check_parity(model, candidate, parity_samples(), parity_tolerance(backend))
+                if not parity["ok"]:
+                    raise BackendError(f"{backend} output differs from pytorch: {parity}")
+                model = candidate
+            except Exception as e:
+                print(f"Falling back to pytorch backend: {e}")
+                parity = dict(parity or {}, ok=False, requested_backend=backend, fallback_reason=str(e))
+                backend = "pytorch"
+        if warmup:
+            model(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+        return LoadedModel(model, version or version_for(model_path), model_path, backend, parity)
+
+    def swap(self, loaded, drain_timeout=30.0):
+        """
+        Atomically make `loaded` the serving model. Batches already running keep
+        the model they started with; this waits for them to drain (up to
+        drain_timeout) and returns the previous LoadedModel for rollback.
+        """
+        previous = self._active
+        self._active = loaded
+        with self._inflight_cond:
+            self._inflight_cond.wait_for(lambda: not self._inflight.get(id(previous)), timeout=drain_timeout)
+        return previous
+
+    def analyze(self, image, threshold=None):
+        return self.analyze_batch([image], [threshold])[0]
+
+    @contextmanager
+    def _pinned(self):
+        # Pin the serving model for the whole batch so a swap cannot split it
+        active = self._require_active()
+        with self._inflight_cond:
+            self._inflight[id(active)] = self._inflight.get(id(active), 0) + 1
+        try:
+            yield active
+        finally:
+            with self._inflight_cond:
+                self._inflight[id(active)] -= 1
+                if not self._inflight[id(active)]:
+                    del self._inflight[id(active)]
+                self._inflight_cond.notify_all()
+
+    def analyze_batch(self, images, thresholds=None):
+        """
+        Run a single forward pass over several images.
+        Images may be paths, encoded bytes or decoded BGR arrays.
+        Returns one analysis dict per image, in input order.
+        """
+        if not images:
+            return []
+        if thresholds is None:
+            thresholds = [None] * len(images)
+
+        with self._pinned() as active:
+            with DETECTOR_STAGE_SECONDS.time(stage="decode"):
+                decoded = [load_image(i) for i in images]
+            with DETECTOR_STAGE_SECONDS.time(stage="forward"):
+                results = active.model(decoded, verbose=False)
+        with DETECTOR_STAGE_SECONDS.time(stage="postprocess"):
+            return [self._summarize(r, t, active.version) for r, t in zip(results, thresholds)]
+
+    def analyze_tiled(self, image, tiling, threshold=None, analyze_crops=None):
+        """
+        Sliced inference for high-resolution frames: overlapping tiles of
+        tiling.tile_size are run through the model, their boxes are shifted
+        back into image coordinates and duplicates across tiles are merged
+        with NMS or WBF. With tiling.full_frame, a whole-frame pass is added
+        so defects larger than a tile are still found. The analysis also
+        reports the tile count and latency_ms.
+
+        analyze_crops(crops) returns one analysis per crop. By default the
+        crops run here in batches of TILE_BATCH_SIZE; the micro-batcher
+        passes its own so tiles share batches with other requests.
+        """
+        started = time.perf_counter()
+        image = load_image(image)
+        height, width = image.shape[:2]
+        tiles = tile_grid(width, height, tiling.tile_size, tiling.overlap)
+        crops = [image[y0:y1, x0:x1] for x0, y0, x1, y1 in tiles]
+        offsets = [(x0, y0) for x0, y0, _, _ in tiles]
+        if tiling.full_frame and len(tiles) > 1:
+            crops.append(image)
+            offsets.append((0, 0))
+
+        analyze_crops = analyze_crops or self._analyze_crops
+        with DETECTOR_STAGE_SECONDS.time(stage="forward_tiles"):
+            analyses = analyze_crops(crops)
+            if len({a["model_version"] for a in analyses}) > 1:
+                # A hot swap landed between the tile batches: run them all on the new model
+                analyses = analyze_crops(crops)
 
-    def analyze(self, image_path, threshold=None):
-        if threshold is None:
-            threshold = self.default_threshold
-            
-        results = self.model(image_path)[0]
-        
         predictions = []
-        max_conf = 0
-        
+        for (dx, dy), analysis in zip(offsets, analyses):
+            for p in analysis["predictions"]:
+                x1, y1, x2, y2 = p["bbox"]
+                predictions.append(dict(p, bbox=[x1 + dx, y1 + dy, x2 + dx, y2 + dy]))
+
+        with DETECTOR_STAGE_SECONDS.time(stage="merge_tiles"):
+            predictions = merge_predictions(predictions, tiling.merge, tiling.iou)
+        max_conf = max((p["confidence"] for p in predictions), default=0)
+        analysis = self.summarize(predictions, max_conf, threshold, analyses[-1]["model_version"])
+        elapsed = time.perf_counter() - started
+        DETECTOR_STAGE_SECONDS.observe(elapsed, stage="tiled_total")
+        TILES_PER_IMAGE.observe(len(crops))
+        analysis["tiles"] = len(crops)
+        analysis["latency_ms"] = elapsed * 1000
+        return analysis
+
+    def _analyze_crops(self, crops):
+        analyses = []
+        for start in range(0, len(crops), TILE_BATCH_SIZE):
+            analyses.extend(self.analyze_batch(crops[start:start + TILE_BATCH_SIZE]))
+        return analyses
+
+    @staticmethod
+    def _predictions(results):
+        predictions = []
         for box in results.boxes:
-            conf = float(box.conf[0])
             cls = int(box.cls[0])
-            name = results.names[cls]
-            xyxy = box.xyxy[0].tolist()
-            
             predictions.append({
-                "class": name,
-                "confidence": conf,
-                "bbox": xyxy
+                "class": results.names[cls],
+                "confidence": float(box.conf[0]),
+                "bbox": box.xyxy[0].tolist()
             })
-            
-            if conf > max_conf:
-                max_conf = conf
+        return predictions
+
+    def _summarize(self, results, threshold=None, model_version=None):
+        predictions = self._predictions(results)
+        max_conf = max((p["confidence"] for p in predictions), default=0)
+        return self.summarize(predictions, max_conf, threshold, model_version)
+
+    def summarize(self, predictions, max_conf, threshold=None, model_version=None):
+        """Build the analysis dict for already-computed predictions."""
+        if threshold is None:
+            threshold = self.default_threshold
+        if model_version is None:
+            model_version = self.model_version
 
         # Logic for "Uncertainty"
         status = "automated" if max_conf >= threshold else "pending_review"
@@ -41,8 +373,9 @@ class DefectDetector:
             "predictions": predictions,
             "max_confidence": max_conf,
             "status": status,
-            "used_threshold": threshold
+            "used_threshold": threshold,
+            "model_version": model_version
         }
 
 # Singleton instance
-detector = DefectDetector()
+detector = DefectDetector(backend=INFERENCE_BACKEND)
@@ -0,0 +1,307 @@
+import datetime
+import json
+import os
+import threading
+from collections import deque
+
+from .database import Inspection
+
+DRIFT_STATE_PATH = os.getenv("DRIFT_STATE_PATH", "data/drift_state.json")
+RECENT_WINDOW = 20
+BASELINE_WINDOW = 80
+MIN_SAMPLES = 40
+DRIFT_THRESHOLD = 0.15 # Mean confidence drop between baseline and recent windows
+MIN_STD = 0.02 # Floor for the spread estimate, so a near-constant stream is not hypersensitive
+SNAPSHOT_EVERY = 50
+ALERT_INTERVAL_SECONDS = 3600
+
+
+class StreamStats:
+    """
+    O(1)-per-update statistics for one numeric stream: recent/baseline
+    rolling windows with running sums, fast/slow EWMAs, and a Page-Hinkley
+    test plus a lower CUSUM for a sustained drop in the mean.
+
+    The sequential tests work in standard deviations of the values in the
+    rolling windows, so one setting fits streams as different as a narrow
+    confidence band and a mix that includes empty images. After either test
+    fires, both restart from the current level instead of staying latched.
+    The rolling window test (baseline minus recent mean above
+    DRIFT_THRESHOLD) gates every alarm, and one of the sequential tests must
+    have located a drop within the span of the windows to confirm it.
+    """
+
+    # Tuning in units of the stream's standard deviation, not of its values
+    TUNING = ("ph_delta", "ph_threshold", "cusum_k", "cusum_h")
+
+    def __init__(self, ph_delta=0.5, ph_threshold=14.0, cusum_k=0.5, cusum_h=14.0):
+        self.ph_delta = ph_delta
+        self.ph_threshold = ph_threshold
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+
+        self.count = 0
+        self.recent = deque()
+        self.baseline = deque()
+        self.recent_sum = 0.0
+        self.baseline_sum = 0.0
+        self.window_squares = 0.0
+        self.ewma_fast = None
+        self.ewma_slow = None
+        self.changes = 0
+        self.last_change = {}
+        self._reset_sequential()
+
+    def _reset_sequential(self):
+        # Page-Hinkley measures against the mean of the values since its last reset
+        self.seq_count = 0
+        self.mean = 0.0
+        self.ph_cumulative = 0.0
+        self.ph_minimum = 0.0
+        self.cusum = 0.0
+
+    @property
+    def std(self):
+        n = len(self.recent) + len(self.baseline)
+        if n < 2:
+            return MIN_STD
+        mean = (self.recent_sum + self.baseline_sum) / n
+        variance = max(0.0, self.window_squares / n - mean * mean) * n / (n - 1)
+        return max(MIN_STD, variance ** 0.5)
+
+    def update(self, x):
+        x = float(x)
+        self.count += 1
+
+        # Rolling windows: values age out of recent into baseline, then drop off
+        self.recent.append(x)
+        self.recent_sum += x
+        self.window_squares += x * x
+        if len(self.recent) > RECENT_WINDOW:
+            moved = self.recent.popleft()
+            self.recent_sum -= moved
+            self.baseline.append(moved)
+            self.baseline_sum += moved
+            if len(self.baseline) > BASELINE_WINDOW:
+                dropped = self.baseline.popleft()
+                self.baseline_sum -= dropped
+                self.window_squares -= dropped * dropped
+
+        # Lower CUSUM against the slow EWMA, once the windows hold enough values
+        if self.ready:
+            self.cusum = max(0.0, self.cusum + (self.ewma_slow - x) / self.std - self.cusum_k)
+
+        self.ewma_fast = x if self.ewma_fast is None else 0.2 * x + 0.8 * self.ewma_fast
+        self.ewma_slow = x if self.ewma_slow is None else 0.02 * x + 0.98 * self.ewma_slow
+
+        # Page-Hinkley: cumulative deviation below the running mean
+        self.seq_count += 1
+        self.mean += (x - self.mean) / self.seq_count
+        if self.ready and self.seq_count >= RECENT_WINDOW:
+            self.ph_cumulative += (self.mean - x) / self.std - self.ph_delta
+            self.ph_minimum = min(self.ph_minimum, self.ph_cumulative)
+
+        fired = [name for name, stat, limit in (
+            ("page_hinkley", self.page_hinkley, self.ph_threshold),
+            ("cusum", self.cusum, self.cusum_h)
+        ) if stat > limit]
+        if fired:
+            self.changes += 1
+            for name in fired:
+                self.last_change[name] = self.count
+            self._reset_sequential()
+            # Measure further drops from the level the stream moved to
+            self.ewma_slow = self.ewma_fast
+
+    @property
+    def ready(self):
+        return self.count >= MIN_SAMPLES
+
+    @property
+    def recent_avg(self):
+        return self.recent_sum / len(self.recent) if self.recent else 0.0
+
+    @property
+    def baseline_avg(self):
+        return self.baseline_sum / len(self.baseline) if self.baseline else 0.0
+
+    @property
+    def window_score(self):
+        return self.baseline_avg - self.recent_avg
+
+    @property
+    def page_hinkley(self):
+        return self.ph_cumulative - self.ph_minimum
+
+    def changes_detected(self):
+        """Sequential tests that located a drop within the span of the rolling windows."""
+        span = RECENT_WINDOW + BASELINE_WINDOW
+        return [name for name, at in sorted(self.last_change.items()) if self.count - at < span]
+
+    def alarms(self):
+        # The window test gates; a sequential test must confirm the drop happened inside the windows
+        if not self.ready or self.window_score <= DRIFT_THRESHOLD:
+            return []
+        changes = self.changes_detected()
+        return ["window"] + changes if changes else []
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "recent_avg": self.recent_avg,
+            "baseline_avg": self.baseline_avg,
+            "window_score": self.window_score,
+            "ewma_fast": self.ewma_fast,
+            "ewma_slow": self.ewma_slow,
+            "std": self.std,
+            "page_hinkley": self.page_hinkley,
+            "cusum": self.cusum,
+            "changes": self.changes,
+            "changes_detected": self.changes_detected(),
+            "alarms": self.alarms()
+        }
+
+    def to_dict(self):
+        state = {k: v for k, v in self.__dict__.items() if k not in self.TUNING}
+        state["recent"] = list(self.recent)
+        state["baseline"] = list(self.baseline)
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls()
+        stats.__dict__.update({k: v for k, v in state.items() if k not in cls.TUNING})
+        stats.recent = deque(state.get("recent", []))
+        stats.baseline = deque(state.get("baseline", []))
+        stats.window_squares = sum(x * x for x in stats.recent) + sum(x * x for x in stats.baseline)
+        if "seq_count" not in state:
+            # Snapshot from before the tests were scaled: their sums are in other units
+            stats._reset_sequential()
+        return stats
+
+
+class DriftMonitor:
+    """
+    Online drift engine updated once per inspection. Tracks the overall max
+    confidence, the number of detections per image and the confidence of
+    each class, and snapshots its state to disk so it survives restarts.
+    State is per process: each API worker sees the inspections it handled.
+    """
+
+    def __init__(self, state_path=DRIFT_STATE_PATH):
+        self.state_path = state_path
+        self.streams = {}
+        self.last_alert_at = None
+        self._updates_since_save = 0
+        self._lock = threading.Lock()
+
+    def _stream(self, name):
+        stream = self.streams.get(name)
+        if stream is None:
+            stream = self.streams[name] = StreamStats()
+        return stream
+
+    def update(self, predictions, max_confidence):
+        per_class = {}
+        for p in predictions or []:
+            name = p.get("class", "unknown")
+            per_class[name] = max(per_class.get(name, 0.0), p.get("confidence", 0.0))
+
+        with self._lock:
+            self._stream("confidence").update(max_confidence)
+            self._stream("detections").update(len(predictions or []))
+            for name, conf in per_class.items():
+                self._stream(f"class:{name}").update(conf)
+
+            self._updates_since_save += 1
+            if self._updates_since_save >= SNAPSHOT_EVERY:
+                self._save()
+
+    def report(self):
+        with self._lock:
+            overall = self.streams.get("confidence") or StreamStats()
+            if not overall.ready:
+                return {
+                    "drift_detected": False,
+                    "message": f"Insufficient data for drift analysis (need at least {MIN_SAMPLES} scans)",
+                    "recent_avg": 0,
+                    "baseline_avg": 0,
+                    "count": overall.count
+                }
+            alarms = overall.alarms()
+            return {
+                "drift_detected": bool(alarms),
+                "drift_score": float(overall.window_score),
+                "recent_avg": float(overall.recent_avg),
+                "baseline_avg": float(overall.baseline_avg),
+                "count": overall.count,
+                "alarms": alarms,
+                "changes_detected": overall.changes_detected(),
+                "streams": {name: s.summary() for name, s in sorted(self.streams.items())}
+            }
+
+    def alarming(self):
+        """Cheap check for the upload path; report() builds the full summary."""
+        with self._lock:
+            overall = self.streams.get("confidence")
+            return bool(overall and overall.ready and overall.alarms())
+
+    def claim_alert(self, now=None):
+        """Return True at most once per ALERT_INTERVAL_SECONDS, for audit logging."""
+        now = now or datetime.datetime.utcnow()
+        with self._lock:
+            if self.last_alert_at and (now - self.last_alert_at).total_seconds() <= ALERT_INTERVAL_SECONDS:
+                return False
+            self.last_alert_at = now
+            self._save()
+            return True
+
+    def reset(self):
+        with self._lock:
+            self.streams = {}
+            self._save()
+
+    def _save(self):
+        state = {
+            "streams": {name: s.to_dict() for name, s in self.streams.items()},
+            "last_alert_at": self.last_alert_at.isoformat() if self.last_alert_at else None
+        }
+        # Every worker snapshots to the same state_path; each writes its own temp file
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+        self._updates_since_save = 0
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def load(self, db=None):
+        """
+        Restore the last snapshot. Without one, warm up from the most recent
+        inspections in the database (a one-off bounded read).
+        """
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path) as f:
+                    state = json.load(f)
+                with self._lock:
+                    self.streams = {name: StreamStats.from_dict(s) for name, s in state.get("streams", {}).items()}
+                    last = state.get("last_alert_at")
+                    self.last_alert_at = datetime.datetime.fromisoformat(last) if last else None
+                return
+            except Exception as e:
+                print(f"Error loading drift state from {self.state_path}: {e}")
+
+        if db is not None:
+            rows = db.query(Inspection.prediction, Inspection.confidence).order_by(
+                Inspection.created_at.desc(), Inspection.id.desc()
+            ).limit(RECENT_WINDOW + BASELINE_WINDOW).all()
+            for prediction, confidence in reversed(rows):
+                self.update(prediction if isinstance(prediction, list) else [], confidence or 0.0)
+
+
+# Singleton instance
+drift_monitor = DriftMonitor()
@@ -0,0 +1,164 @@
+import asyncio
+import datetime
+import json
+import os
+import threading
+import uuid
+from collections import deque
+
+EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", "2000"))
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("EVENT_SUBSCRIBER_QUEUE", "500"))
+KEEPALIVE_SECONDS = 15
+EVENT_TYPES = ("inspection-created", "status-changed", "config-changed", "drift-alert")
+
+
+class Event:
+    __slots__ = ("seq", "type", "data", "statuses", "line")
+
+    def __init__(self, seq, type, data, statuses=(), line=None):
+        self.seq = seq
+        self.type = type
+        self.data = data
+        self.statuses = tuple(s for s in statuses if s)
+        self.line = line
+
+
+class Subscription:
+    def __init__(self, statuses=None, lines=None, types=None):
+        self.statuses = set(statuses) if statuses else None
+        self.lines = set(lines) if lines else None
+        self.types = set(types) if types else None
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.lagged = False
+
+    def matches(self, event):
+        if self.types and event.type not in self.types:
+            return False
+        # Config and drift events carry no status or line and go to everyone
+        if self.statuses and event.statuses and not self.statuses.intersection(event.statuses):
+            return False
+        if self.lines and event.line is not None and event.line not in self.lines:
+            return False
+        return True
+
+
+class EventBus:
+    """
+    In-process broadcast of inspection, review, config and drift events.
+
+    publish() is called from request threads and only appends to a ring
+    buffer and schedules the fan-out on the event loop, so a slow or stuck
+    client never holds up an upload. The ring buffer lets a reconnecting
+    client resume from its Last-Event-ID. Subscribers that fall too far
+    behind are dropped and told to resync instead of buffering without bound.
+    """
+
+    def __init__(self, buffer_size=EVENT_BUFFER_SIZE):
+        # Event ids are "<boot>-<seq>" so ids from before a restart are recognised as stale
+        self.boot_id = uuid.uuid4().hex[:8]
+        self._buffer = deque(maxlen=buffer_size)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._loop = None
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    def bind(self, loop):
+        self._loop = loop
+
+    def event_id(self, event):
+        return f"{self.boot_id}-{event.seq}"
+
+    def publish(self, type, data, statuses=(), line=None):
+        with self._lock:
+            self._seq += 1
+            event = Event(self._seq, type, dict(data, at=datetime.datetime.utcnow().isoformat()), statuses, line)
+            self._buffer.append(event)
+            self.published += 1
+        loop = self._loop
+        if loop is not None and self._subscribers:
+            try:
+                loop.call_soon_threadsafe(self._fanout, event)
+            except RuntimeError:
+                pass  # Loop already closed during shutdown
+        return event
+
+    def _fanout(self, event):
+        for sub in list(self._subscribers):
+            if sub.lagged or not sub.matches(event):
+                continue
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                sub.lagged = True
+                self.dropped_subscribers += 1
+
+    def replay(self, last_event_id):
+        """
+        Buffered events after last_event_id, or None when the client has to
+        resync (unknown boot, or the id already fell out of the buffer).
+        """
+        if not last_event_id:
+            return []
+        boot, _, seq = last_event_id.rpartition("-")
+        if boot != self.boot_id or not seq.isdigit():
+            return None
+        seq = int(seq)
+        with self._lock:
+            events = list(self._buffer)
+        if events and seq < events[0].seq - 1:
+            return None
+        return [e for e in events if e.seq > seq]
+
+    def subscribe(self, statuses=None, lines=None, types=None):
+        sub = Subscription(statuses, lines, types)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        self._subscribers.discard(sub)
+
+    def format(self, event):
+        return f"id: {self.event_id(event)}\nevent: {event.type}\ndata: {json.dumps(event.data)}\n\n"
+
+    async def stream(self, request, statuses=None, lines=None, types=None, last_event_id=None):
+        """Server-sent events for one client: replay, then live events and keepalives."""
+        # Subscribe before replaying so nothing published in between is missed
+        sub = self.subscribe(statuses, lines, types)
+        try:
+            replayed = self.replay(last_event_id)
+            last_seq = 0
+            if replayed is None:
+                yield f"event: resync\ndata: {json.dumps({'reason': 'history unavailable'})}\n\n"
+            else:
+                for event in replayed:
+                    if sub.matches(event):
+                        yield self.format(event)
+                    last_seq = event.seq
+            while not await request.is_disconnected():
+                if sub.lagged:
+                    yield f"event: resync\ndata: {json.dumps({'reason': 'client too slow'})}\n\n"
+                    return
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event.seq <= last_seq:
+                    continue
+                yield self.format(event)
+        finally:
+            self.unsubscribe(sub)
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "buffered": len(self._buffer),
+            "dropped_subscribers": self.dropped_subscribers,
+            "boot_id": self.boot_id
+        }
+
+
+event_bus = EventBus()
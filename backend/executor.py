@@ -0,0 +1,90 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+INFERENCE_SLOTS = int(os.getenv("INFERENCE_SLOTS", "8"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "32"))
+RETRY_AFTER_SECONDS = int(os.getenv("INFERENCE_RETRY_AFTER", "1"))
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after=RETRY_AFTER_SECONDS):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Runs blocking upload work (file I/O, inference, DB commits) on a fixed
+    pool of worker threads so it never blocks the event loop.
+    At most `slots` jobs run at once and at most `queue_size` more may wait;
+    anything beyond that is rejected immediately with QueueFullError.
+    """
+
+    def __init__(self, slots=INFERENCE_SLOTS, queue_size=INFERENCE_QUEUE_SIZE, retry_after=RETRY_AFTER_SECONDS):
+        self.slots = max(1, int(slots))
+        self.queue_size = max(0, int(queue_size))
+        self.retry_after = retry_after
+        self._pool = ThreadPoolExecutor(max_workers=self.slots, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        self._rejected = 0
+
+    @property
+    def capacity(self):
+        return self.slots + self.queue_size
+
+    def acquire(self):
+        """Reserve a slot for work that runs outside the pool (e.g. a streaming batch)."""
+        with self._lock:
+            if self._admitted >= self.capacity:
+                self._rejected += 1
+                raise QueueFullError(self.retry_after)
+            self._admitted += 1
+
+    def check(self):
+        """Raise QueueFullError if no slot is free right now, without reserving one."""
+        with self._lock:
+            if self._admitted >= self.capacity:
+                self._rejected += 1
+                raise QueueFullError(self.retry_after)
+
+    def release(self):
+        with self._lock:
+            self._admitted -= 1
+
+    def _call(self, fn, args, kwargs):
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    async def run(self, fn, *args, **kwargs):
+        self.acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, self._call, fn, args, kwargs)
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "slots": self.slots,
+                "queue_size": self.queue_size,
+                "running": self._running,
+                "waiting": self._admitted - self._running,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+# Singleton instance
+inference_executor = InferenceExecutor()
@@ -0,0 +1,52 @@
+import os
+import tarfile
+import zipfile
+
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "bmp", "tif", "tiff", "webp"}
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+def is_image_name(name):
+    return name.rsplit(".", 1)[-1].lower() in IMAGE_EXTENSIONS
+
+
+def is_archive_name(name):
+    lower = name.lower()
+    return lower.endswith(".zip") or lower.endswith(TAR_SUFFIXES)
+
+
+def iter_archive(name, fileobj):
+    """
+    Yield (member_name, file-like) for every image inside a zip or tar archive.
+    Members are streamed one at a time; nothing is extracted to disk.
+    """
+    if name.lower().endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not is_image_name(info.filename):
+                    continue
+                with archive.open(info) as member:
+                    yield os.path.basename(info.filename), member
+    else:
+        with tarfile.open(fileobj=fileobj, mode="r:*") as archive:
+            for info in archive:
+                if not info.isfile() or not is_image_name(info.name):
+                    continue
+                member = archive.extractfile(info)
+                if member is None:
+                    continue
+                with member:
+                    yield os.path.basename(info.name), member
+
+
+def iter_upload_files(files):
+    """
+    Flatten a list of UploadFile objects into (name, file-like) pairs,
+    expanding any zip/tar archives into their image members.
+    """
+    for upload in files:
+        name = upload.filename or ""
+        if is_archive_name(name):
+            yield from iter_archive(name, upload.file)
+        else:
+            yield name, upload.file
@@ -0,0 +1,208 @@
+import datetime
+import multiprocessing
+import os
+import threading
+import time
+
+from sqlalchemy import update
+
+from .database import SessionLocal, TrainingJob
+
+ACTIVE_STATES = ("queued", "running")
+TRAINING_EPOCHS = int(os.getenv("TRAINING_EPOCHS", "10"))
+TRAINING_NICE = int(os.getenv("TRAINING_NICE", "10"))
+TRAINING_THREADS = int(os.getenv("TRAINING_THREADS", "0")) # 0 keeps the torch default
+CANCEL_POLL_SECONDS = 2.0
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+class JobConflictError(Exception):
+    def __init__(self, job):
+        super().__init__(f"Training job #{job.id} is already {job.status}")
+        self.job = job
+
+
+def job_to_dict(job):
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "cancel_requested": bool(job.cancel_requested),
+        "epoch": job.epoch,
+        "total_epochs": job.total_epochs,
+        "metrics": job.metrics,
+        "message": job.message,
+        "weights": job.weights,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at
+    }
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def active_job(db):
+    return db.query(TrainingJob).filter(TrainingJob.status.in_(ACTIVE_STATES)).order_by(TrainingJob.id).first()
+
+
+def submit_job(db, epochs=TRAINING_EPOCHS):
+    """Queue a training job and make sure a worker process is running it."""
+    existing = active_job(db)
+    if existing:
+        raise JobConflictError(existing)
+    job = TrainingJob(status="queued", total_epochs=epochs)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    ensure_worker()
+    return job
+
+
+def get_job(db, job_id):
+    return db.query(TrainingJob).filter(TrainingJob.id == job_id).first()
+
+
+def cancel_job(db, job_id):
+    """Queued jobs are cancelled at once; running ones stop at the next batch boundary."""
+    job = get_job(db, job_id)
+    if job is None:
+        return None
+    if job.status == "queued":
+        job.status = "cancelled"
+        job.finished_at = datetime.datetime.utcnow()
+    elif job.status == "running":
+        job.cancel_requested = True
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def recover_jobs():
+    """Fail jobs left active by a worker that no longer exists (e.g. after a restart)."""
+    db = SessionLocal()
+    try:
+        for job in db.query(TrainingJob).filter(TrainingJob.status == "running").all():
+            if not _pid_alive(job.pid):
+                job.status = "failed"
+                job.message = "Training worker exited unexpectedly"
+                job.finished_at = datetime.datetime.utcnow()
+        db.commit()
+        if db.query(TrainingJob).filter(TrainingJob.status == "queued").first():
+            ensure_worker()
+    finally:
+        db.close()
+
+
+def ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return
+        # Spawned (not forked) so the worker does not inherit the API's threads and model;
+        # not a daemon because Ultralytics starts its own dataloader processes
+        _worker = multiprocessing.get_context("spawn").Process(target=worker_main, name="training-worker")
+        _worker.start()
+
+
+def _claim_next(db):
+    job = db.query(TrainingJob).filter(TrainingJob.status == "queued").order_by(TrainingJob.id).first()
+    if job is None:
+        return None
+    claimed = db.execute(
+        update(TrainingJob)
+        .where(TrainingJob.id == job.id, TrainingJob.status == "queued")
+        .values(status="running", pid=os.getpid(), started_at=datetime.datetime.utcnow())
+    )
+    db.commit()
+    return job.id if claimed.rowcount else None
+
+
+def worker_main():
+    """Entry point of the training process: run queued jobs one at a time, then exit."""
+    # Keep the API's inference threads ahead of training on a shared CPU
+    if TRAINING_NICE and hasattr(os, "nice"):
+        os.nice(TRAINING_NICE)
+    if TRAINING_THREADS:
+        import torch
+        torch.set_num_threads(TRAINING_THREADS)
+
+    while True:
+        db = SessionLocal()
+        try:
+            job_id = _claim_next(db)
+        finally:
+            db.close()
+        if job_id is None:
+            return
+        run_job(job_id)
+
+
+def run_job(job_id):
+    from .trainer import train_model, TrainingCancelled
+
+    last_poll = [0.0]
+
+    def update_job(**values):
+        db = SessionLocal()
+        try:
+            db.execute(update(TrainingJob).where(TrainingJob.id == job_id).values(**values))
+            db.commit()
+        finally:
+            db.close()
+
+    def on_train_start(trainer):
+        update_job(total_epochs=trainer.epochs)
+
+    def on_fit_epoch_end(trainer):
+        metrics = {k: float(v) for k, v in (trainer.metrics or {}).items()}
+        update_job(epoch=trainer.epoch + 1, metrics=metrics)
+
+    def on_train_batch_end(trainer):
+        now = time.monotonic()
+        if now - last_poll[0] < CANCEL_POLL_SECONDS:
+            return
+        last_poll[0] = now
+        db = SessionLocal()
+        try:
+            requested = db.query(TrainingJob.cancel_requested).filter(TrainingJob.id == job_id).scalar()
+        finally:
+            db.close()
+        if requested:
+            raise TrainingCancelled()
+
+    db = SessionLocal()
+    try:
+        epochs = db.query(TrainingJob.total_epochs).filter(TrainingJob.id == job_id).scalar() or TRAINING_EPOCHS
+    finally:
+        db.close()
+
+    try:
+        result = train_model(epochs=epochs, job_id=job_id, callbacks={
+            "on_train_start": on_train_start,
+            "on_fit_epoch_end": on_fit_epoch_end,
+            "on_train_batch_end": on_train_batch_end
+        })
+    except Exception as e:
+        result = {"success": False, "message": str(e)}
+
+    if result.get("success"):
+        status = "done"
+    elif result.get("cancelled"):
+        status = "cancelled"
+    else:
+        status = "failed"
+    update_job(
+        status=status,
+        message=result.get("message"),
+        weights=result.get("weights"),
+        finished_at=datetime.datetime.utcnow()
+    )
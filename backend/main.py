@@ -1,189 +1,924 @@
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse, PlainTextResponse, FileResponse, RedirectResponse
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-import shutil
+from concurrent.futures import as_completed
+from contextlib import asynccontextmanager
+import asyncio
+import cv2
+import datetime
+import io
+import json
 import os
+import threading
+import time
 import uuid
-from typing import List
+from collections import namedtuple
+from typing import List, Optional
 
-from .database import engine, init_db, get_db, Inspection, SystemConfig, AuditLog
-from .detector import detector
-from .trainer import train_model
+from .database import engine, init_db, get_db, SessionLocal, Inspection, Detection, AuditLog
+from .config import config_store, VERSION_KEY
+from . import counters
+from . import detections
+from .drift import drift_monitor
+from .events import event_bus, EVENT_TYPES
+from .batcher import batcher
+from .detector import detector, decode_image, sniff_image_format, InvalidImageError
+from .cache import prediction_cache, read_and_hash
+from . import storage
+from . import renditions
+from . import video
+from . import near_duplicates
+from .near_duplicates import dhash, pending_index
+from .executor import inference_executor, QueueFullError
+from .writer import writer
+from .ingest import iter_upload_files
+from .tiling import TILING_KEY, tiling_for, parse_tiling, cache_variant
+from .pagination import keyset_page, parse_fields, estimate_count, InvalidCursorError, DEFAULT_PAGE_SIZE
+from . import jobs
+from . import registry
+from .metrics import Gauge, UPLOAD_STAGE_SECONDS, DETECTOR_STAGE_SECONDS, UPLOADS_TOTAL, render as render_metrics
 
-# Create tables
-init_db()
+PROCESS_STARTED_AT = time.monotonic()
 
-app = FastAPI(title="Opti-Quality: HITL Inspection System")
+# Uploaded files and their renditions never change once written (names are UUIDs)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
-# Ensure directories exist
-UPLOAD_DIR = "data/raw"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Filled in by the startup tasks; /readyz reports it
+startup_state = {
+    "db_ready": False,
+    "model_ready": False,
+    "error": None,
+    "db_init_seconds": None,
+    "model_load_seconds": None,
+    "cold_start_seconds": None
+}
+model_watcher = None
+video_sessions = {}
+video_sessions_lock = threading.Lock()
 
-# Serve uploaded files
-app.mount("/images", StaticFiles(directory=UPLOAD_DIR), name="images")
+def load_drift_state():
+    db = SessionLocal()
+    try:
+        drift_monitor.load(db)
+    finally:
+        db.close()
+
+def load_model():
+    """Load and warm up the detector off the event loop, then mark the API ready."""
+    global model_watcher
+    started = time.monotonic()
+    try:
+        model_watcher = registry.init_registry(detector)
+    except Exception as e:
+        startup_state["error"] = f"Model load failed: {e}"
+        print(startup_state["error"])
+        return
+    startup_state["model_load_seconds"] = time.monotonic() - started
+    startup_state["model_ready"] = True
+    startup_state["cold_start_seconds"] = time.monotonic() - PROCESS_STARTED_AT
+    print(f"Model {detector.model_version} ready ({detector.backend}); cold start took {startup_state['cold_start_seconds']:.1f}s")
+
+def startup():
+    # Create tables and restore in-memory state (fast), then load the model in the background
+    started = time.monotonic()
+    init_db()
+    counters.init_counters()
+    load_drift_state()
+    jobs.recover_jobs()
+    startup_state["db_init_seconds"] = time.monotonic() - started
+    startup_state["db_ready"] = True
+    threading.Thread(target=load_model, name="model-loader", daemon=True).start()
+    threading.Thread(target=detections.init_detections, name="detections-backfill", daemon=True).start()
+    threading.Thread(target=near_duplicates.init_index, name="near-duplicate-index", daemon=True).start()
+
+def flush_storage():
+    if model_watcher:
+        model_watcher.stop()
+    for session in list(video_sessions.values()):
+        session.stop()
+    storage.flush(timeout=30)
+    drift_monitor.save()
+
+@asynccontextmanager
+async def lifespan(app):
+    # Events are published from worker threads and fanned out on this loop
+    event_bus.bind(asyncio.get_running_loop())
+    startup()
+    yield
+    flush_storage()
+
+app = FastAPI(title="Opti-Quality: HITL Inspection System", lifespan=lifespan)
+
+def require_model():
+    if not detector.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Model is still loading",
+            headers={"Retry-After": "5"}
+        )
+
+@app.get("/healthz")
+async def healthz():
+    # Liveness: the process is up and serving requests
+    return {"status": "alive", "uptime_seconds": time.monotonic() - PROCESS_STARTED_AT}
+
+@app.get("/readyz")
+def readyz(response: Response):
+    # Readiness: model warmed up and database reachable
+    db_ok = False
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        db_ok = True
+    except Exception as e:
+        startup_state["error"] = startup_state["error"] or f"Database unreachable: {e}"
+    ready = startup_state["db_ready"] and db_ok and detector.ready
+    if not ready:
+        response.status_code = 503
+    return dict(startup_state, ready=ready, db_reachable=db_ok, model_version=detector.model_version)
 
 @app.get("/")
 async def root():
     return {"message": "Opti-Quality API is active."}
 
-@app.post("/upload/")
-async def upload_image(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    # Fetch current threshold
-    threshold_config = db.query(SystemConfig).filter(SystemConfig.key == "confidence_threshold").first()
-    current_threshold = float(threshold_config.value) if threshold_config else 0.6
-    
-    # Generate unique filename
-    file_extension = file.filename.split(".")[-1]
-    filename = f"{uuid.uuid4()}.{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    
-    # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Run Model Inference
-    analysis = detector.analyze(file_path, threshold=current_threshold)
-    
-    # Save to Database
-    new_inspection = Inspection(
-        image_filename=filename,
+def get_threshold():
+    # Served from the in-memory config cache, no DB round trip
+    return config_store.get_float("confidence_threshold", 0.6)
+
+# image is None when a cached prediction for the same bytes and weights exists
+Upload = namedtuple("Upload", ["filename", "content_hash", "model_version", "image", "cached", "width", "height", "tiling", "perceptual_hash"])
+
+def read_upload(fileobj, db: Session, tiling=None):
+    """
+    Read, hash and decode an upload entirely in memory. The original bytes are
+    persisted in the background so the disk write is off the latency path.
+    Raises InvalidImageError before anything is stored or sent to the model.
+    """
+    with UPLOAD_STAGE_SECONDS.time(stage="read"):
+        data, content_hash = read_and_hash(fileobj)
+    extension = sniff_image_format(data)
+    if extension is None:
+        raise InvalidImageError("Unsupported or corrupt image header")
+    
+    # Identical bytes already inspected by the current weights: reuse the stored image
+    model_version = detector.model_version
+    with UPLOAD_STAGE_SECONDS.time(stage="cache_lookup"):
+        cached = prediction_cache.get(db, content_hash, cache_variant(model_version, tiling))
+    if cached and storage.exists(cached["image_filename"]):
+        return Upload(cached["image_filename"], content_hash, model_version, None, cached, cached.get("image_width"), cached.get("image_height"), tiling, cached.get("perceptual_hash"))
+    
+    with UPLOAD_STAGE_SECONDS.time(stage="decode"):
+        image = decode_image(data)
+    
+    # Generate unique filename, trusting the header over the client's name
+    filename = f"{uuid.uuid4()}.{extension}"
+    storage.write_async(filename, data)
+    height, width = image.shape[:2]
+    return Upload(filename, content_hash, model_version, image, None, width, height, tiling, dhash(image))
+
+def cached_analysis(upload, threshold):
+    return detector.summarize(upload.cached["predictions"], upload.cached["max_confidence"], threshold, upload.model_version)
+
+def record_inspection(db: Session, upload, analysis, cache=True, line=None):
+    inspection = Inspection(
+        created_at=datetime.datetime.utcnow(),
+        image_filename=upload.filename,
         prediction=analysis["predictions"],
         confidence=analysis["max_confidence"],
-        status=analysis["status"]
+        status=analysis["status"],
+        content_hash=upload.content_hash,
+        image_width=upload.width,
+        image_height=upload.height,
+        perceptual_hash=upload.perceptual_hash,
+        model_version=analysis["model_version"],
+        line=line
     )
-    db.add(new_inspection)
-    db.commit()
-    db.refresh(new_inspection)
-    
+    db.add(inspection)
+    detections.record(db, inspection, analysis["predictions"])
+    counters.bump(db, inspection.status)
+    if cache and upload.cached is None:
+        prediction_cache.put(db, upload.content_hash, cache_variant(analysis["model_version"], upload.tiling), upload.filename, analysis, (upload.width, upload.height), upload.perceptual_hash)
+    return inspection
+
+def created_event(inspection):
+    # Captured before commit so publishing never reloads expired rows
     return {
-        "id": new_inspection.id,
-        "filename": filename,
+        "id": inspection.id,
+        "image_filename": inspection.image_filename,
+        "status": inspection.status,
+        "confidence": inspection.confidence,
+        "model_version": inspection.model_version,
+        "line": inspection.line,
+        "perceptual_hash": inspection.perceptual_hash
+    }
+
+def publish_created(event):
+    if event["status"] == "pending_review":
+        pending_index.add(event["id"], event["perceptual_hash"], event["confidence"], event["image_filename"])
+    event_bus.publish("inspection-created", event, statuses=[event["status"]], line=event["line"])
+
+def check_drift_alert():
+    """
+    Audit and broadcast a drift alarm, at most once per alert interval.
+    Returns the current drift report.
+    """
+    report = drift_monitor.report()
+    if report["drift_detected"] and drift_monitor.claim_alert():
+        details = f"CRITICAL: Performance drift detected ({', '.join(report['alarms'])}). Confidence dropped from {report['baseline_avg']:.2f} (baseline) to {report['recent_avg']:.2f} (recent)."
+        audit = AuditLog(action_type="drift_alert", details=details)
+        writer.submit(lambda wdb: wdb.add(audit))
+        event_bus.publish("drift-alert", {
+            "alarms": report["alarms"],
+            "drift_score": report["drift_score"],
+            "recent_avg": report["recent_avg"],
+            "baseline_avg": report["baseline_avg"],
+            "details": details
+        })
+    return report
+
+def upload_result(inspection, upload, analysis, threshold):
+    result = {
+        "id": inspection.id,
+        "filename": upload.filename,
         "status": analysis["status"],
         "confidence": analysis["max_confidence"],
-        "threshold_used": current_threshold
+        "threshold_used": threshold,
+        "cached": upload.cached is not None
     }
+    if "tiles" in analysis:
+        result["tiles"] = analysis["tiles"]
+        result["inference_ms"] = analysis["latency_ms"]
+    return result
+
+def run_inference(upload, threshold):
+    # Tiles are queued on the micro-batcher alongside whole-frame uploads
+    if upload.tiling:
+        return batcher.analyze_tiled(upload.image, upload.tiling, threshold=threshold)
+    return batcher.analyze(upload.image, threshold=threshold)
+
+def inspect_image(fileobj, db: Session, line=None):
+    """
+    The single-image pipeline shared by /upload/ and video ingestion.
+    Raises InvalidImageError for unreadable images.
+    """
+    with UPLOAD_STAGE_SECONDS.time(stage="total"):
+        # Fetch current threshold
+        with UPLOAD_STAGE_SECONDS.time(stage="config"):
+            current_threshold = get_threshold()
+            tiling = tiling_for(config_store, line)
+        
+        # Decode in memory and persist in the background
+        upload = read_upload(fileobj, db, tiling)
+        
+        # Run Model Inference (micro-batched with concurrent uploads) unless cached
+        if upload.cached:
+            analysis = cached_analysis(upload, current_threshold)
+        else:
+            with UPLOAD_STAGE_SECONDS.time(stage="inference"):
+                analysis = run_inference(upload, current_threshold)
+            renditions.render_async(upload.filename, upload.image, analysis["predictions"])
+        
+        # Save to Database
+        # Group-committed with concurrent uploads; if the same bytes were cached
+        # by a concurrent request, the fallback keeps only the inspection
+        with UPLOAD_STAGE_SECONDS.time(stage="db_commit"):
+            new_inspection = writer.write(
+                lambda wdb: record_inspection(wdb, upload, analysis, line=line),
+                fallback=lambda wdb: record_inspection(wdb, upload, analysis, cache=False, line=line)
+            )
+        drift_monitor.update(analysis["predictions"], analysis["max_confidence"])
+        publish_created(created_event(new_inspection))
+        if drift_monitor.alarming():
+            check_drift_alert()
+    
+    UPLOADS_TOTAL.inc(outcome="cached" if upload.cached else "inferred")
+    return upload_result(new_inspection, upload, analysis, current_threshold)
+
+def process_upload(file: UploadFile, db: Session, line=None):
+    try:
+        return inspect_image(file.file, db, line)
+    except InvalidImageError as e:
+        UPLOADS_TOTAL.inc(outcome="invalid")
+        raise HTTPException(status_code=400, detail=str(e))
+
+def inspect_frame(frame, line=None):
+    # Video frames are stored as JPEG like any other upload
+    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 92])
+    if not ok:
+        raise InvalidImageError("Could not encode video frame")
+    db = SessionLocal()
+    try:
+        return inspect_image(io.BytesIO(buf.tobytes()), db, line)
+    finally:
+        db.close()
+
+def stream_batch(files: List[UploadFile], line=None):
+    """
+    Analyze a lot of images chunk by chunk, yielding one NDJSON line per image.
+    Each result is handed to the group-commit writer as soon as inference
+    returns it, so the batch shares commits with concurrent uploads and the
+    database is never held while the model runs.
+    """
+    # Reserved here rather than in the handler: a generator that never starts never releases
+    try:
+        inference_executor.acquire()
+    except QueueFullError as e:
+        yield json.dumps({"done": True, "count": 0, "committed": False, "error": str(e), "retry_after": e.retry_after}) + "\n"
+        return
+    db = SessionLocal()
+    count = 0
+    failed = 0
+    try:
+        current_threshold = get_threshold()
+        tiling = tiling_for(config_store, line)
+        chunk = []
+        
+        def analyses_of(chunk):
+            pending = []
+            for index, name, upload in chunk:
+                if upload.cached:
+                    yield index, name, upload, cached_analysis(upload, current_threshold), None
+                elif tiling:
+                    # Tiled images are run one at a time; their tiles fill the batcher's batches
+                    try:
+                        yield index, name, upload, run_inference(upload, current_threshold), None
+                    except Exception as error:
+                        yield index, name, upload, None, error
+                else:
+                    pending.append((index, name, upload))
+            futures = {batcher.submit(upload.image, threshold=current_threshold): (index, name, upload) for index, name, upload in pending}
+            for future in as_completed(futures):
+                index, name, upload = futures[future]
+                try:
+                    yield index, name, upload, future.result(), None
+                except Exception as error:
+                    yield index, name, upload, None, error
+        
+        def store(upload, analysis):
+            # Group-committed with concurrent uploads, one job per image so a bad row only fails itself
+            return writer.submit(
+                lambda wdb: record_inspection(wdb, upload, analysis, line=line),
+                fallback=lambda wdb: record_inspection(wdb, upload, analysis, cache=False, line=line)
+            )
+        
+        def flush(chunk):
+            nonlocal failed
+            stored = []
+            for index, name, upload, analysis, error in analyses_of(chunk):
+                if error is not None:
+                    yield {"index": index, "source": name, "error": str(error)}
+                    continue
+                if not upload.cached:
+                    renditions.render_async(upload.filename, upload.image, analysis["predictions"])
+                stored.append((index, name, upload, analysis, store(upload, analysis)))
+            for index, name, upload, analysis, job in stored:
+                try:
+                    inspection = job.result()
+                except Exception as e:
+                    failed += 1
+                    yield {"index": index, "source": name, "error": f"Could not store result: {e}"}
+                    continue
+                drift_monitor.update(analysis["predictions"], analysis["max_confidence"])
+                publish_created(created_event(inspection))
+                yield dict(upload_result(inspection, upload, analysis, current_threshold), index=index, source=name)
+            if stored and drift_monitor.alarming():
+                check_drift_alert()
+        
+        for index, (name, fileobj) in enumerate(iter_upload_files(files)):
+            count += 1
+            try:
+                upload = read_upload(fileobj, db, tiling)
+            except Exception as e:
+                yield json.dumps({"index": index, "source": name, "error": str(e)}) + "\n"
+                continue
+            chunk.append((index, name, upload))
+            if len(chunk) >= batcher.max_batch_size:
+                for result in flush(chunk):
+                    yield json.dumps(result) + "\n"
+                chunk = []
+                # Drop the read snapshot held by the cache lookups between chunks
+                db.rollback()
+        for result in flush(chunk):
+            yield json.dumps(result) + "\n"
+        
+        yield json.dumps({"done": True, "count": count, "committed": failed == 0}) + "\n"
+    except Exception as e:
+        yield json.dumps({"done": True, "count": count, "committed": False, "error": str(e)}) + "\n"
+    finally:
+        db.close()
+        inference_executor.release()
+
+@app.post("/upload/")
+async def upload_image(file: UploadFile = File(...), line: Optional[str] = Form(None), db: Session = Depends(get_db)):
+    require_model()
+    # Blocking work runs on the bounded inference pool, never on the event loop
+    try:
+        return await inference_executor.run(process_upload, file, db, line)
+    except QueueFullError as e:
+        UPLOADS_TOTAL.inc(outcome="rejected")
+        raise HTTPException(
+            status_code=429,
+            detail="Inference queue is full, retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+@app.post("/upload/batch")
+async def upload_batch(files: List[UploadFile] = File(...), line: Optional[str] = Form(None)):
+    require_model()
+    # One admission slot covers the whole lot; the stream reserves it and releases it when done
+    try:
+        inference_executor.check()
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Inference queue is full, retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    return StreamingResponse(stream_batch(files, line), media_type="application/x-ndjson")
+
+@app.post("/ingest/video")
+def start_video_ingest(request_data: dict):
+    """
+    Start sampling a video file, stream URL or camera index in the background.
+    Only frames that changed since the last inspected one reach the detector.
+    Files must be under VIDEO_SOURCE_DIR; streams and cameras must be listed
+    in VIDEO_ALLOWED_SOURCES. At most VIDEO_MAX_RUNNING_SESSIONS run at once.
+    """
+    require_model()
+    source = request_data.get("source")
+    if not source:
+        raise HTTPException(status_code=400, detail="source is required")
+    try:
+        session = video.VideoSession(
+            video.check_source(source),
+            inspect_frame,
+            line=request_data.get("line"),
+            sample_fps=float(request_data.get("sample_fps", video.VIDEO_SAMPLE_FPS)),
+            diff_threshold=float(request_data.get("diff_threshold", video.VIDEO_DIFF_THRESHOLD)),
+            max_frames=int(request_data["max_frames"]) if request_data.get("max_frames") else None
+        )
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    with video_sessions_lock:
+        video.expire_sessions(video_sessions)
+        if video.running_count(video_sessions) >= video.VIDEO_MAX_RUNNING:
+            raise HTTPException(
+                status_code=429,
+                detail=f"{video.VIDEO_MAX_RUNNING} video ingests are already running, stop one first",
+                headers={"Retry-After": "60"}
+            )
+        video_sessions[session.id] = session.start()
+    return session.to_dict()
+
+@app.get("/ingest/video")
+def list_video_ingests():
+    video.expire_sessions(video_sessions)
+    return [session.to_dict() for session in list(video_sessions.values())]
+
+@app.get("/ingest/video/{session_id}")
+def get_video_ingest(session_id: str):
+    session = video_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Ingest session not found")
+    return session.to_dict()
+
+@app.post("/ingest/video/{session_id}/stop")
+def stop_video_ingest(session_id: str):
+    session = video_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Ingest session not found")
+    session.stop()
+    return session.to_dict()
+
+@app.get("/inference/stats")
+async def get_inference_stats(reset: bool = False):
+    return {
+        "batcher": batcher.stats(reset=reset),
+        "executor": inference_executor.stats(),
+        "cold_start_seconds": startup_state["cold_start_seconds"],
+        "pending_writes": storage.pending_writes(),
+        "prediction_cache": prediction_cache.stats(),
+        "writer": writer.stats(),
+        "events": event_bus.stats(),
+        "model_version": detector.model_version,
+        "backend": detector.backend,
+        "ready": detector.ready,
+        "p95_ms": {
+            stage: (UPLOAD_STAGE_SECONDS.quantile(0.95, stage=stage) or 0.0) * 1000
+            for stage in ("total", "inference", "decode", "db_commit")
+        },
+        "tiled_p95_ms": (DETECTOR_STAGE_SECONDS.quantile(0.95, stage="tiled_total") or 0.0) * 1000
+    }
+
+def pool_usage():
+    pool = engine.pool
+    usage = {("checked_out",): pool.checkedout()} if hasattr(pool, "checkedout") else {}
+    if hasattr(pool, "size"):
+        usage[("size",)] = pool.size()
+    return usage
+
+def training_job_state():
+    db = SessionLocal()
+    try:
+        active = jobs.active_job(db)
+    finally:
+        db.close()
+    states = {(state,): 0 for state in jobs.ACTIVE_STATES}
+    if active:
+        states[(active.status,)] = 1
+    return states
+
+# Scrape-time gauges read state that already lives in memory (plus one indexed query for jobs)
+Gauge("optiq_inference_queue_depth", "Images waiting in the micro-batcher", fn=lambda: batcher.stats()["queue_depth"])
+Gauge("optiq_executor_jobs", "Upload jobs in the bounded inference pool", ["state"],
+      fn=lambda: {(k,): v for k, v in inference_executor.stats().items() if k in ("running", "waiting")})
+Gauge("optiq_executor_rejected", "Uploads rejected with 429 since start", fn=lambda: inference_executor.stats()["rejected"])
+Gauge("optiq_prediction_cache_hit_rate", "Prediction cache hit rate since start", fn=lambda: prediction_cache.stats()["hit_rate"])
+Gauge("optiq_prediction_cache_bytes", "Approximate bytes held by the prediction cache", fn=lambda: prediction_cache.stats()["bytes"])
+Gauge("optiq_db_writer_queue_depth", "Write jobs waiting for the group-commit writer", fn=writer.queue_depth)
+Gauge("optiq_storage_pending_writes", "Uploads waiting to be persisted", fn=storage.pending_writes)
+Gauge("optiq_db_pool_connections", "Database pool connections", ["state"], fn=pool_usage)
+Gauge("optiq_training_job_active", "Active training job by state", ["state"], fn=training_job_state)
+Gauge("optiq_model_ready", "1 once the detector is loaded and warmed up", fn=lambda: 1 if detector.ready else 0)
+Gauge("optiq_cold_start_seconds", "Process start to model ready", fn=lambda: startup_state["cold_start_seconds"])
+
+@app.get("/metrics")
+def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.get("/inspections/", response_model=None)
-async def get_inspections(status: str = None, db: Session = Depends(get_db)):
-    query = db.query(Inspection)
+def get_inspections(
+    response: Response,
+    status: str = None,
+    line: str = None,
+    cursor: str = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: str = None,
+    count: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Newest-first page of inspections. Pass the X-Next-Cursor header back as
+    `cursor` to fetch the next page; `fields=` limits the returned columns
+    (e.g. fields=id,status,confidence skips the JSON blobs).
+    """
+    try:
+        names = parse_fields(fields, [c.name for c in Inspection.__table__.columns])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    query = db.query(*[Inspection.__table__.c[name] for name in names])
     if status:
         query = query.filter(Inspection.status == status)
-    return query.order_by(Inspection.created_at.desc()).all()
+    if line:
+        query = query.filter(Inspection.line == line)
+    
+    if count:
+        response.headers["X-Total-Count-Estimate"] = str(estimate_count(db, query, Inspection.__tablename__))
+    
+    try:
+        rows, next_cursor = keyset_page(query, Inspection.created_at, Inspection.id, cursor=cursor, limit=limit)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [dict(row._mapping) for row in rows]
+
+def detection_filters(
+    class_name: Optional[List[str]] = Query(None),
+    min_confidence: Optional[float] = None,
+    max_confidence: Optional[float] = None,
+    min_area: Optional[float] = None,
+    max_area: Optional[float] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    model_version: Optional[str] = None,
+    inspection_id: Optional[int] = None
+):
+    return {
+        "classes": class_name,
+        "min_confidence": min_confidence,
+        "max_confidence": max_confidence,
+        "min_area": min_area,
+        "max_area": max_area,
+        "since": since,
+        "until": until,
+        "model_version": model_version,
+        "inspection_id": inspection_id
+    }
+
+@app.get("/detections/", response_model=None)
+def get_detections(
+    response: Response,
+    filters: dict = Depends(detection_filters),
+    cursor: str = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    db: Session = Depends(get_db)
+):
+    """
+    Newest-first page of individual detections, served from the indexed
+    detections table, e.g. class_name=fracture&min_confidence=0.8&min_area=5000
+    &since=2024-05-01. Paginate with the X-Next-Cursor header.
+    """
+    query = detections.filtered(db.query(Detection), **filters)
+    try:
+        rows, next_cursor = keyset_page(query, Detection.created_at, Detection.id, cursor=cursor, limit=limit)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [
+        {
+            "id": d.id,
+            "inspection_id": d.inspection_id,
+            "class": d.class_name,
+            "confidence": d.confidence,
+            "bbox": [d.x1, d.y1, d.x2, d.y2],
+            "area": d.area,
+            "model_version": d.model_version,
+            "created_at": d.created_at
+        }
+        for d in rows
+    ]
+
+@app.get("/detections/summary")
+def get_detection_summary(group_by: str = "class", filters: dict = Depends(detection_filters), db: Session = Depends(get_db)):
+    """Detection counts and confidence/area statistics grouped by class, model_version or day."""
+    try:
+        return detections.aggregate(db, group_by=group_by, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/images/{filename}")
+def get_image(filename: str):
+    """Serve a stored original from whichever storage tier holds it."""
+    if os.path.basename(filename) != filename:
+        raise HTTPException(status_code=404, detail="Image not found")
+    backend, key = storage.locate(filename)
+    if backend is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if isinstance(backend, storage.LocalBackend):
+        return FileResponse(backend.path(key), headers=headers)
+    return RedirectResponse(backend.presigned_url(key))
+
+@app.get("/renditions/{rendition}/{filename}")
+def get_rendition(rendition: str, filename: str, request: Request):
+    """
+    Serve a downscaled JPEG of an upload (thumb, review, or overlay with the
+    model's boxes). Renditions are immutable, so clients revalidate with the
+    ETag and Range requests are answered by FileResponse.
+    """
+    if os.path.basename(filename) != filename:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    def load_predictions():
+        db = SessionLocal()
+        try:
+            inspection = db.query(Inspection).filter(Inspection.image_filename == filename).order_by(Inspection.id.desc()).first()
+            # Boxes stay in upload coordinates even after retention downscaled the stored image
+            return (inspection.prediction, inspection.image_width) if inspection else ([], None)
+        finally:
+            db.close()
+    
+    try:
+        path = renditions.ensure(rendition, filename, load_predictions)
+    except renditions.UnknownRenditionError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    etag = f'"{rendition}-{os.path.splitext(filename)[0]}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
 
 @app.post("/review/{inspection_id}")
-async def submit_review(inspection_id: int, review_data: dict, db: Session = Depends(get_db)):
+def submit_review(inspection_id: int, review_data: dict, db: Session = Depends(get_db)):
+    """
+    Record a human review. With "apply_to_cluster": true, the same verdict is
+    applied to the other pending cases of the group /review/clusters lists
+    the inspection in, limited to the "inspection_ids" the reviewer was shown
+    when those are sent.
+    """
     inspection = db.query(Inspection).filter(Inspection.id == inspection_id).first()
     if not inspection:
         raise HTTPException(status_code=404, detail="Inspection not found")
     
-    old_status = inspection.status
-    inspection.final_prediction = review_data.get("final_prediction")
-    inspection.status = "reviewed"
+    targets = [(inspection.id, inspection.status, inspection.line)]
+    if review_data.get("apply_to_cluster"):
+        member_ids = pending_index.cluster_of(db, inspection_id)
+        if review_data.get("inspection_ids"):
+            # Only the part of what the reviewer saw that is still in the case's group
+            try:
+                shown = {int(i) for i in review_data["inspection_ids"]}
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="inspection_ids must be a list of inspection ids")
+            member_ids = [i for i in member_ids if i in shown]
+        other_ids = [i for i in member_ids if i != inspection_id]
+        if other_ids:
+            targets += [tuple(row) for row in db.query(Inspection.id, Inspection.status, Inspection.line).filter(
+                Inspection.id.in_(other_ids), Inspection.status == "pending_review"
+            )]
     
-    # Add Audit Log
-    audit = AuditLog(
-        inspection_id=inspection_id,
-        action_type="human_review",
-        details=f"Human reviewer updated status from {old_status} to reviewed. Notes: {review_data.get('final_prediction', {}).get('notes', 'None')}"
-    )
-    db.add(audit)
+    final_prediction = review_data.get("final_prediction")
+    notes = (final_prediction or {}).get("notes", "None")
+    changes = []
+    for target_id, old_status, line in targets:
+        # Conditional on the status read above, so of two concurrent reviews only one moves the counters
+        moved = db.query(Inspection).filter(
+            Inspection.id == target_id, Inspection.status == old_status
+        ).update({Inspection.status: "reviewed", Inspection.final_prediction: final_prediction}, synchronize_session=False)
+        if not moved:
+            if target_id == inspection_id:
+                db.rollback()
+                raise HTTPException(status_code=409, detail="Inspection was changed by a concurrent review, reload and retry")
+            continue
+        changes.append((target_id, old_status, line))
+        counters.move(db, old_status, "reviewed")
+        
+        # Add Audit Log
+        via = f" (near-duplicate of #{inspection_id})" if target_id != inspection_id else ""
+        db.add(AuditLog(
+            inspection_id=target_id,
+            action_type="human_review",
+            details=f"Human reviewer updated status from {old_status} to reviewed{via}. Notes: {notes}"
+        ))
     db.commit()
     
-    return {"message": "Review submitted successfully"}
+    for target_id, old_status, line in changes:
+        pending_index.remove(target_id)
+        event_bus.publish("status-changed", {
+            "id": target_id,
+            "old_status": old_status,
+            "status": "reviewed",
+            "line": line
+        }, statuses=[old_status, "reviewed"], line=line)
+    
+    return {"message": "Review submitted successfully", "reviewed_ids": [c[0] for c in changes]}
+
+@app.get("/review/clusters")
+def get_review_clusters(limit: int = 20, min_size: int = 2, radius: Optional[int] = Query(None, ge=0, lt=64), db: Session = Depends(get_db)):
+    """Pending cases grouped by near-identical images (dHash within `radius` bits), largest groups first."""
+    groups = pending_index.clusters(db, radius=radius, min_size=max(1, min_size))[:max(1, limit)]
+    info = pending_index.snapshot()
+    return [
+        {
+            "representative_id": group[0],
+            "image_filename": info.get(group[0], {}).get("image_filename"),
+            "size": len(group),
+            "inspection_ids": group,
+            "min_confidence": min((info.get(i, {}).get("confidence") or 0.0) for i in group),
+            "max_confidence": max((info.get(i, {}).get("confidence") or 0.0) for i in group)
+        }
+        for group in groups
+    ]
+
+@app.get("/inspections/{inspection_id}/similar")
+def get_similar_inspections(inspection_id: int, radius: Optional[int] = Query(None, ge=0, lt=64), db: Session = Depends(get_db)):
+    """Pending inspections whose image is a near-duplicate of this one."""
+    inspection = db.query(Inspection).filter(Inspection.id == inspection_id).first()
+    if not inspection:
+        raise HTTPException(status_code=404, detail="Inspection not found")
+    if not inspection.perceptual_hash:
+        return []
+    return [
+        {"id": i, "distance": d}
+        for i, d in pending_index.similar(db, inspection.perceptual_hash, radius)
+        if i != inspection_id
+    ]
 
 @app.get("/stats/")
-async def get_stats(db: Session = Depends(get_db)):
-    total = db.query(Inspection).count()
-    automated = db.query(Inspection).filter(Inspection.status == "automated").count()
-    pending = db.query(Inspection).filter(Inspection.status == "pending_review").count()
-    reviewed = db.query(Inspection).filter(Inspection.status == "reviewed").count()
+def get_stats(db: Session = Depends(get_db)):
+    # Maintained incrementally alongside every insert / status change
+    counts = counters.get_counts(db)
     
     return {
-        "total": total,
-        "automated": automated,
-        "pending": pending,
-        "reviewed": reviewed
+        "total": sum(counts.values()),
+        "automated": counts["automated"],
+        "pending": counts["pending_review"],
+        "reviewed": counts["reviewed"]
     }
 
 @app.get("/config/{key}")
-async def get_config(key: str, db: Session = Depends(get_db)):
-    config = db.query(SystemConfig).filter(SystemConfig.key == key).first()
-    if not config:
+def get_config(key: str):
+    value = config_store.get(key)
+    if value is None:
         raise HTTPException(status_code=404, detail="Config not found")
-    return {"key": key, "value": config.value}
+    return {"key": key, "value": value}
 
 @app.post("/config/")
-async def set_config(config_data: dict, db: Session = Depends(get_db)):
+def set_config(config_data: dict, db: Session = Depends(get_db)):
     key = config_data.get("key")
     value = str(config_data.get("value"))
+    if not key or key == VERSION_KEY:
+        raise HTTPException(status_code=400, detail="Invalid config key")
+    if key == TILING_KEY or key.startswith(f"{TILING_KEY}:"):
+        try:
+            parse_tiling(value)
+        except (ValueError, TypeError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid tiling config: {e}")
     
-    config = db.query(SystemConfig).filter(SystemConfig.key == key).first()
-    if config:
-        old_value = config.value
-        config.value = value
-    else:
-        old_value = "None"
-        config = SystemConfig(key=key, value=value)
-        db.add(config)
+    old_value = config_store.set(db, key, value)
     
     # Audit trail for config change
     audit = AuditLog(
         action_type="config_change",
-        details=f"Config '{key}' changed from {old_value} to {value}"
+        details=f"Config '{key}' changed from {old_value if old_value is not None else 'None'} to {value}"
     )
     db.add(audit)
     db.commit()
+    config_store.invalidate()
+    event_bus.publish("config-changed", {"key": key, "old_value": old_value, "value": value})
     return {"message": f"Config {key} updated"}
 
+@app.get("/events/")
+async def stream_events(
+    request: Request,
+    status: Optional[List[str]] = Query(None),
+    line: Optional[List[str]] = Query(None),
+    types: Optional[List[str]] = Query(None),
+    last_event_id: Optional[str] = None
+):
+    """
+    Server-sent events: inspection-created, status-changed, config-changed and
+    drift-alert. Filter with repeated status=, line= and types= parameters.
+    Reconnecting clients resume from the Last-Event-ID header (or the
+    last_event_id parameter); a `resync` event means history was lost and the
+    client should reload its lists.
+    """
+    unknown = [t for t in types or [] if t not in EVENT_TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown event types: {', '.join(unknown)}")
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        event_bus.stream(request, statuses=status, lines=line, types=types, last_event_id=resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/drift/")
-async def detect_drift(db: Session = Depends(get_db)):
-    # Fetch recent inspections (last 100)
-    inspections = db.query(Inspection).order_by(Inspection.created_at.desc()).limit(100).all()
-    
-    if len(inspections) < 40:
-        return {
-            "drift_detected": False,
-            "message": "Insufficient data for drift analysis (need at least 40 scans)",
-            "recent_avg": 0,
-            "baseline_avg": 0
-        }
-    
-    # Split into Recent (top 20) and Baseline (rest)
-    recent = inspections[:20]
-    baseline = inspections[20:]
-    
-    recent_avg = sum(item.confidence for item in recent) / len(recent)
-    baseline_avg = sum(item.confidence for item in baseline) / len(baseline)
-    
-    # If confidence drops by more than 15% relative to baseline
-    drift_score = baseline_avg - recent_avg
-    is_drift = drift_score > 0.15
-    
-    # Store in Audit Log if drift detected and not recently logged
-    if is_drift:
-        last_drift_log = db.query(AuditLog).filter(AuditLog.action_type == "drift_alert").order_by(AuditLog.timestamp.desc()).first()
-        # Log at most once per hour
-        if not last_drift_log or (datetime.datetime.utcnow() - last_drift_log.timestamp).total_seconds() > 3600:
-            audit = AuditLog(
-                action_type="drift_alert",
-                details=f"CRITICAL: Performance drift detected. Confidence dropped from {baseline_avg:.2f} (baseline) to {recent_avg:.2f} (recent)."
-            )
-            db.add(audit)
-            db.commit()
+def detect_drift():
+    # Constant time: the monitor is updated online as inspections are recorded
+    return check_drift_alert()
 
+@app.get("/models/")
+def list_models(db: Session = Depends(get_db)):
+    active = registry.active_version()
     return {
-        "drift_detected": bool(is_drift),
-        "drift_score": float(drift_score),
-        "recent_avg": float(recent_avg),
-        "baseline_avg": float(baseline_avg),
-        "count": len(inspections)
+        "active": active,
+        "serving": detector.model_version,
+        "backend": registry.active_backend(),
+        "serving_backend": detector.backend,
+        "parity": detector.parity,
+        "versions": [registry.model_to_dict(m, active) for m in registry.list_versions(db)]
     }
 
+@app.post("/models/{version}/activate")
+def activate_model(version: str, db: Session = Depends(get_db)):
+    try:
+        model = registry.activate(db, version)
+    except registry.RegistryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Swap this worker right away; others follow within the watch interval
+    if model_watcher:
+        model_watcher.sync()
+    return registry.model_to_dict(model, registry.active_version())
+
+@app.post("/models/rollback")
+def rollback_model(db: Session = Depends(get_db)):
+    try:
+        model = registry.rollback(db)
+    except registry.RegistryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if model_watcher:
+        model_watcher.sync()
+    return registry.model_to_dict(model, registry.active_version())
+
 @app.post("/retrain/")
-async def trigger_retrain():
-    # In a production app, this should be an async task (Celery/RQ)
-    result = train_model()
-    return result
+def trigger_retrain(db: Session = Depends(get_db)):
+    # Training runs in a separate worker process; poll GET /retrain/{job_id} for progress
+    try:
+        job = jobs.submit_job(db)
+    except jobs.JobConflictError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "job_id": e.job.id})
+    return dict(jobs.job_to_dict(job), success=True, message=f"Training job #{job.id} queued")
+
+@app.get("/retrain/{job_id}")
+def get_retrain_job(job_id: int, db: Session = Depends(get_db)):
+    job = jobs.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return jobs.job_to_dict(job)
+
+@app.post("/retrain/{job_id}/cancel")
+def cancel_retrain_job(job_id: int, db: Session = Depends(get_db)):
+    job = jobs.cancel_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return jobs.job_to_dict(job)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,245 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+from sqlalchemy import func
+
+from .database import SessionLocal, Inspection, AuditLog
+from . import storage
+
+HASH_BITS = 64
+NEAR_DUPLICATE_RADIUS = int(os.getenv("NEAR_DUPLICATE_RADIUS", "6")) # Max differing dHash bits
+HASH_BACKFILL_BATCH = 500
+
+
+def dhash(image):
+    """
+    64-bit difference hash of a BGR or grayscale image as 16 hex characters:
+    one bit per horizontal gradient sign of a 9x8 grayscale thumbnail. It is
+    stable under rescaling, recompression and small exposure changes.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return f"{value:016x}"
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class HashIndex:
+    """
+    Multi-index hash table for Hamming-radius lookups. The 64-bit hash is cut
+    into radius + 1 chunks; by the pigeonhole principle any hash within the
+    radius matches at least one chunk exactly, so a lookup only compares
+    against the ids sharing a chunk instead of every stored hash.
+    """
+
+    def __init__(self, radius=NEAR_DUPLICATE_RADIUS):
+        self.radius = radius
+        parts = radius + 1
+        edges = [round(i * HASH_BITS / parts) for i in range(parts + 1)]
+        self._chunks = [(edges[i], edges[i + 1] - edges[i]) for i in range(parts)]
+        self._tables = [{} for _ in self._chunks]
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def _keys(self, value):
+        return [(value >> start) & ((1 << width) - 1) for start, width in self._chunks]
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def __contains__(self, item_id):
+        return item_id in self._hashes
+
+    def add(self, item_id, hex_hash):
+        value = int(hex_hash, 16)
+        with self._lock:
+            if item_id in self._hashes:
+                self._remove(item_id)
+            self._hashes[item_id] = value
+            for table, key in zip(self._tables, self._keys(value)):
+                table.setdefault(key, set()).add(item_id)
+
+    def _remove(self, item_id):
+        value = self._hashes.pop(item_id)
+        for table, key in zip(self._tables, self._keys(value)):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(item_id)
+                if not bucket:
+                    del table[key]
+
+    def remove(self, item_id):
+        with self._lock:
+            if item_id in self._hashes:
+                self._remove(item_id)
+
+    def query(self, hex_hash, radius=None):
+        """[(id, distance)] within radius, nearest first."""
+        radius = self.radius if radius is None else radius
+        value = int(hex_hash, 16)
+        with self._lock:
+            if radius > self.radius:
+                # Beyond the pigeonhole guarantee: fall back to a full scan
+                candidates = set(self._hashes)
+            else:
+                candidates = set()
+                for table, key in zip(self._tables, self._keys(value)):
+                    candidates |= table.get(key, set())
+            matches = [(i, hamming(value, self._hashes[i])) for i in candidates]
+        return sorted([(i, d) for i, d in matches if d <= radius], key=lambda m: (m[1], m[0]))
+
+
+def cluster(items, radius=NEAR_DUPLICATE_RADIUS):
+    """
+    Greedy leader clustering of (id, hex_hash) pairs in the given order: an
+    item joins the nearest existing leader within radius, or leads a new
+    cluster. Items without a hash form clusters of one. Returns lists of ids.
+    """
+    leaders = HashIndex(radius)
+    clusters = {}
+    for item_id, hex_hash in items:
+        if not hex_hash:
+            clusters[("single", item_id)] = [item_id]
+            continue
+        nearest = leaders.query(hex_hash)
+        if nearest:
+            clusters[nearest[0][0]].append(item_id)
+        else:
+            leaders.add(item_id, hex_hash)
+            clusters[item_id] = [item_id]
+    return list(clusters.values())
+
+
+class PendingIndex:
+    """
+    Near-duplicate index of the inspections waiting for review. It is
+    rebuilt from the database on startup, then kept current by sync(), which
+    picks up rows added by any worker since the last high-water mark and
+    drops rows reviewed since, from the human_review audit entries written
+    in the same transaction as the status change.
+    """
+
+    def __init__(self, radius=NEAR_DUPLICATE_RADIUS):
+        self.index = HashIndex(radius)
+        self.info = {}
+        self._last_id = 0
+        self._last_review_id = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def add(self, inspection_id, hex_hash, confidence=None, image_filename=None):
+        if not hex_hash:
+            return
+        with self._lock:
+            self.index.add(inspection_id, hex_hash)
+            self.info[inspection_id] = {"hash": hex_hash, "confidence": confidence, "image_filename": image_filename}
+
+    def remove(self, inspection_id):
+        with self._lock:
+            self.index.remove(inspection_id)
+            self.info.pop(inspection_id, None)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.info)
+
+    def sync(self, db):
+        with self._sync_lock:
+            rows = db.query(
+                Inspection.id, Inspection.perceptual_hash, Inspection.confidence, Inspection.image_filename
+            ).filter(
+                Inspection.id > self._last_id,
+                Inspection.status == "pending_review"
+            ).order_by(Inspection.id).all()
+            for row in rows:
+                self.add(row.id, row.perceptual_hash, row.confidence, row.image_filename)
+            if rows:
+                self._last_id = rows[-1].id
+            reviews = db.query(AuditLog.id, AuditLog.inspection_id).filter(
+                AuditLog.id > self._last_review_id,
+                AuditLog.action_type == "human_review"
+            ).order_by(AuditLog.id).all()
+            for review in reviews:
+                self.remove(review.inspection_id)
+            if reviews:
+                self._last_review_id = reviews[-1].id
+
+    def similar(self, db, hex_hash, radius=None):
+        self.sync(db)
+        return self.index.query(hex_hash, radius)
+
+    def clusters(self, db, radius=None, min_size=2):
+        """Groups of near-identical pending cases, largest first."""
+        self.sync(db)
+        info = self.snapshot()
+        groups = cluster([(i, info[i]["hash"]) for i in sorted(info)], self.index.radius if radius is None else radius)
+        groups = [g for g in groups if len(g) >= min_size]
+        return sorted(groups, key=len, reverse=True)
+
+    def cluster_of(self, db, inspection_id, radius=None):
+        """The clusters() group an inspection belongs to, as listed by /review/clusters."""
+        for group in self.clusters(db, radius, min_size=1):
+            if inspection_id in group:
+                return group
+        return [inspection_id]
+
+    def rebuild(self, db):
+        with self._sync_lock, self._lock:
+            self.index = HashIndex(self.index.radius)
+            self.info = {}
+            self._last_id = 0
+            # Reviews before the reload are reflected in the rows it reads
+            self._last_review_id = db.query(func.max(AuditLog.id)).scalar() or 0
+        self.sync(db)
+
+
+def backfill_hashes(db, statuses=("pending_review", "reviewed"), batch_size=HASH_BACKFILL_BATCH):
+    """Hash stored images of rows from before hashes were recorded at upload."""
+    last_id = 0
+    hashed = 0
+    while True:
+        rows = db.query(Inspection.id, Inspection.image_filename).filter(
+            Inspection.id > last_id,
+            Inspection.perceptual_hash.is_(None),
+            Inspection.status.in_(statuses)
+        ).order_by(Inspection.id).limit(batch_size).all()
+        if not rows:
+            break
+        for row in rows:
+            try:
+                data = storage.read_bytes(row.image_filename)
+            except FileNotFoundError:
+                continue
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                continue
+            db.query(Inspection).filter(Inspection.id == row.id).update(
+                {Inspection.perceptual_hash: dhash(image)}, synchronize_session=False
+            )
+            hashed += 1
+        db.commit()
+        last_id = rows[-1].id
+    return hashed
+
+
+def init_index():
+    # Hash older pending/reviewed rows once, then load the pending cases
+    db = SessionLocal()
+    try:
+        hashed = backfill_hashes(db)
+        if hashed:
+            print(f"Computed perceptual hashes for {hashed} existing inspections.")
+        pending_index.rebuild(db)
+    finally:
+        db.close()
+
+
+pending_index = PendingIndex()
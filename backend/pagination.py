@@ -0,0 +1,71 @@
+import base64
+import datetime
+
+from sqlalchemy import and_, or_, text
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(created_at, row_id):
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise InvalidCursorError("Malformed cursor")
+
+
+def keyset_page(query, created_col, id_col, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Apply newest-first keyset pagination on (created_at, id).
+    Fetches one extra row to know whether another page exists.
+    Returns (rows, next_cursor_or_None).
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            created_col < created_at,
+            and_(created_col == created_at, id_col < row_id)
+        ))
+    rows = query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
+
+
+def parse_fields(fields, allowed, required=("id", "created_at")):
+    """Turn a comma-separated fields= value into an ordered list of column names."""
+    if not fields:
+        return list(allowed)
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [n for n in names if n not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return list(required) + [n for n in names if n not in required]
+
+
+def estimate_count(db, query, table_name):
+    """
+    Cheap row-count estimate. On Postgres an unfiltered count comes from the
+    planner statistics; otherwise it falls back to an index-backed COUNT.
+    """
+    if db.bind.dialect.name == "postgresql" and query.whereclause is None:
+        row = db.execute(text("SELECT reltuples FROM pg_class WHERE relname = :name"), {"name": table_name}).first()
+        if row and row[0] >= 0:
+            return int(row[0])
+    return query.order_by(None).count()
@@ -0,0 +1,208 @@
+import os
+import shutil
+import threading
+
+from .config import config_store
+from .database import SessionLocal, ModelVersion, AuditLog
+from .cache import file_checksum, prediction_cache
+from .detector import BACKENDS, INFERENCE_BACKEND
+
+REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "models/registry")
+BASE_MODEL_PATH = os.getenv("BASE_MODEL_PATH", "yolo11n.pt")
+WATCH_INTERVAL_SECONDS = float(os.getenv("MODEL_WATCH_INTERVAL", "5"))
+ACTIVE_KEY = "active_model_version"
+PREVIOUS_KEY = "previous_model_version"
+BACKEND_KEY = "inference_backend"
+
+
+class RegistryError(Exception):
+    pass
+
+
+def model_to_dict(model, active_version=None):
+    return {
+        "version": model.version,
+        "path": model.path,
+        "checksum": model.checksum,
+        "source": model.source,
+        "training_job_id": model.training_job_id,
+        "details": model.details,
+        "created_at": model.created_at,
+        "active": model.version == active_version
+    }
+
+
+def register(db, weights_path, source="manual", training_job_id=None, details=None):
+    """
+    Copy weights into the registry under their checksum and record them.
+    Registering identical weights twice returns the existing version.
+    """
+    checksum = file_checksum(weights_path)
+    version = checksum[:16]
+    existing = db.query(ModelVersion).filter(ModelVersion.version == version).first()
+    if existing:
+        return existing
+
+    os.makedirs(os.path.join(REGISTRY_DIR, version), exist_ok=True)
+    dest = os.path.join(REGISTRY_DIR, version, "weights.pt")
+    tmp_dest = dest + ".part"
+    shutil.copy(weights_path, tmp_dest)
+    os.replace(tmp_dest, dest)
+
+    model = ModelVersion(
+        version=version,
+        path=dest,
+        checksum=checksum,
+        source=source,
+        training_job_id=training_job_id,
+        details=details
+    )
+    db.add(model)
+    db.commit()
+    db.refresh(model)
+    return model
+
+
+def get_version(db, version):
+    return db.query(ModelVersion).filter(ModelVersion.version == version).first()
+
+
+def list_versions(db):
+    return db.query(ModelVersion).order_by(ModelVersion.created_at.desc()).all()
+
+
+def active_version():
+    return config_store.get(ACTIVE_KEY)
+
+
+def active_backend():
+    return config_store.get(BACKEND_KEY, INFERENCE_BACKEND)
+
+
+def activate(db, version, reason="manual"):
+    """
+    Point the active-version config key at `version`. Every API worker notices
+    the change through the config version counter and hot-swaps its detector.
+    """
+    model = get_version(db, version)
+    if model is None:
+        raise RegistryError(f"Unknown model version {version}")
+    if not os.path.exists(model.path) or file_checksum(model.path) != model.checksum:
+        raise RegistryError(f"Weights for {version} are missing or corrupt")
+
+    current = config_store.get(ACTIVE_KEY)
+    if current == version:
+        return model
+    config_store.set(db, ACTIVE_KEY, version)
+    if current:
+        config_store.set(db, PREVIOUS_KEY, current)
+    db.add(AuditLog(action_type="model_activate", details=f"Active model changed from {current} to {version} ({reason})."))
+    db.commit()
+    config_store.invalidate()
+    # Entries of older weights can never hit again; the previous version's stay for a rollback
+    prediction_cache.prune_versions(db, [version, current])
+    return model
+
+
+def rollback(db):
+    previous = config_store.get(PREVIOUS_KEY)
+    if not previous:
+        raise RegistryError("No previous model version to roll back to")
+    return activate(db, previous, reason="rollback")
+
+
+class ModelWatcher:
+    """
+    Background thread that keeps the detector on the registry's active version:
+    new weights are loaded and warmed up off the serving path, then swapped in
+    between batches once in-flight requests have drained. The model it
+    replaced stays loaded, so rolling back to it is an instant swap.
+    """
+
+    def __init__(self, detector, interval=WATCH_INTERVAL_SECONDS):
+        self.detector = detector
+        self.interval = interval
+        # (version, requested backend) currently loaded; the detector may have
+        # fallen back to pytorch if the requested backend failed its parity check
+        self.loaded = (detector.model_version, active_backend())
+        self.failed = None
+        self.previous = None # (target, LoadedModel) swapped out last, kept warm
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def sync(self):
+        # Called by the watcher thread and the activate/rollback handlers; only one may load
+        with self._lock:
+            version = active_version() or self.detector.model_version
+            backend = active_backend()
+            if backend not in BACKENDS:
+                backend = "pytorch"
+            target = (version, backend)
+            if target == self.loaded or target == self.failed:
+                return False
+            if self.previous is not None and self.previous[0] == target:
+                loaded = self.previous[1]
+            else:
+                loaded = self._load(version, backend)
+                if loaded is None:
+                    self.failed = target
+                    return False
+            replaced = self.detector.swap(loaded)
+            self.previous = (self.loaded, replaced) if replaced is not None else None
+            self.loaded = target
+            self.failed = None
+            return True
+
+    def _load(self, version, backend):
+        db = SessionLocal()
+        try:
+            model = get_version(db, version)
+        finally:
+            db.close()
+        if model is None:
+            return None
+        try:
+            return self.detector.load(model.path, version=model.version, backend=backend)
+        except Exception as e:
+            print(f"Error loading model version {version}: {e}")
+            return None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Model watcher error: {e}")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def init_registry(detector):
+    """
+    Load the active version into the detector (registering the base weights
+    on first start) and return a started ModelWatcher. Blocking: meant to
+    run in a background startup task.
+    """
+    db = SessionLocal()
+    try:
+        model = get_version(db, active_version() or "")
+        if model:
+            detector.start(model.path, version=model.version, backend=active_backend())
+        else:
+            detector.start(BASE_MODEL_PATH, backend=active_backend())
+            if os.path.isfile(detector.model_path):
+                model = register(db, detector.model_path, source="base")
+                activate(db, model.version, reason="initial registration")
+    finally:
+        db.close()
+    watcher = ModelWatcher(detector)
+    watcher.start()
+    return watcher
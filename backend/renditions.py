@@ -0,0 +1,136 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from . import storage
+
+DERIVED_DIR = os.path.join(storage.UPLOAD_DIR, "_derived")
+JPEG_QUALITY = int(os.getenv("RENDITION_JPEG_QUALITY", "85"))
+
+# Longest edge in pixels; "overlay" is review-sized with the model's boxes drawn on it
+RENDITIONS = {
+    "thumb": 256,
+    "review": 1024,
+    "overlay": 1024,
+}
+
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv("RENDITION_WORKERS", "1")), thread_name_prefix="renditions")
+# Queued jobs hold full-resolution frames; past this many, renditions are left to ensure()
+QUEUE_SIZE = int(os.getenv("RENDITION_QUEUE_SIZE", "32"))
+_pending = threading.BoundedSemaphore(QUEUE_SIZE)
+
+
+class UnknownRenditionError(ValueError):
+    pass
+
+
+def rendition_name(filename):
+    return os.path.splitext(filename)[0] + ".jpg"
+
+
+def path_for(rendition, filename):
+    if rendition not in RENDITIONS:
+        raise UnknownRenditionError(f"Unknown rendition '{rendition}'")
+    return os.path.join(DERIVED_DIR, rendition, *storage.key_for(rendition_name(filename)).split("/"))
+
+
+def _resize(image, max_edge):
+    height, width = image.shape[:2]
+    scale = max_edge / max(height, width)
+    if scale >= 1:
+        return image.copy(), 1.0
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+
+def _draw_boxes(image, predictions, scale):
+    thickness = max(1, round(max(image.shape[:2]) / 400))
+    for p in predictions or []:
+        bbox = p.get("bbox")
+        if not bbox:
+            continue
+        x1, y1, x2, y2 = [int(round(v * scale)) for v in bbox]
+        cv2.rectangle(image, (x1, y1), (x2, y2), (0, 141, 255), thickness)
+        label = f"{p.get('class', 'defect')} {p.get('confidence', 0):.2f}"
+        cv2.putText(image, label, (x1, max(12, y1 - 4)), cv2.FONT_HERSHEY_SIMPLEX, 0.4 * thickness, (0, 141, 255), thickness)
+    return image
+
+
+def _write(path, image):
+    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not ok:
+        raise ValueError(f"Could not encode rendition {path}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Background and on-demand renders of the same file may race; each gets its own temp name
+    tmp_path = f"{path}.{threading.get_ident()}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(buf.tobytes())
+    os.replace(tmp_path, path)
+
+
+def render(filename, image, predictions, only=None, original_width=None):
+    """
+    Write every rendition of a decoded BGR frame. Each size is derived from
+    the next larger one so the full-resolution frame is only resized once.
+    Boxes are in the coordinates of the image as uploaded; original_width is
+    needed when the stored image was downscaled since (by retention).
+    """
+    review, scale = _resize(image, RENDITIONS["review"])
+    if original_width:
+        scale = review.shape[1] / original_width
+    if only in (None, "review"):
+        _write(path_for("review", filename), review)
+    if only in (None, "overlay"):
+        _write(path_for("overlay", filename), _draw_boxes(review.copy(), predictions, scale))
+    if only in (None, "thumb"):
+        thumb, _ = _resize(review, RENDITIONS["thumb"])
+        _write(path_for("thumb", filename), thumb)
+
+
+def _render_quietly(filename, image, predictions):
+    try:
+        render(filename, image, predictions)
+    except Exception as e:
+        print(f"Error rendering derived images for {filename}: {e}")
+    finally:
+        _pending.release()
+
+
+def render_async(filename, image, predictions):
+    """
+    Generate renditions in the background, off the upload latency path.
+    Returns None without queueing when QUEUE_SIZE jobs are already waiting;
+    those renditions are rendered on first request instead.
+    """
+    if not _pending.acquire(blocking=False):
+        return None
+    try:
+        return _pool.submit(_render_quietly, filename, image, predictions)
+    except Exception:
+        _pending.release()
+        raise
+
+
+def ensure(rendition, filename, predictions_loader):
+    """
+    Return the path of a rendition, rendering it from the stored original if
+    the background job has not produced it (yet). predictions_loader returns
+    (predictions, width of the image as uploaded) and is only called when an
+    overlay has to be drawn.
+    """
+    path = path_for(rendition, filename)
+    if os.path.exists(path):
+        return path
+    try:
+        data = storage.read_bytes(filename)
+    except FileNotFoundError:
+        return None
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    predictions, original_width = predictions_loader() if rendition == "overlay" else (None, None)
+    render(filename, image, predictions, only=rendition, original_width=original_width)
+    return path
@@ -0,0 +1,109 @@
+import argparse
+import datetime
+import os
+
+import cv2
+import numpy as np
+
+from .database import SessionLocal, Inspection, AuditLog
+from . import storage
+from .cache import prediction_cache
+
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "30"))
+RETENTION_ACTION = os.getenv("RETENTION_ACTION", "compress")
+COMPRESS_MAX_EDGE = int(os.getenv("RETENTION_MAX_EDGE", "1280"))
+COMPRESS_JPEG_QUALITY = int(os.getenv("RETENTION_JPEG_QUALITY", "70"))
+ACTIONS = {"compress": "compressed", "archive": "archived"}
+
+
+def compress(data, filename):
+    """Downscale and re-encode an image in its original format."""
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    height, width = image.shape[:2]
+    scale = COMPRESS_MAX_EDGE / max(height, width)
+    if scale < 1:
+        image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    extension = os.path.splitext(filename)[1].lower() or ".jpg"
+    params = [cv2.IMWRITE_JPEG_QUALITY, COMPRESS_JPEG_QUALITY] if extension in (".jpg", ".jpeg") else []
+    ok, buf = cv2.imencode(extension, image, params)
+    if not ok or len(buf) >= len(data):
+        return None
+    return buf.tobytes()
+
+
+def candidates(db, cutoff):
+    """
+    Filenames of automated passes older than cutoff that are still in the hot
+    tier. Images shared (via the prediction cache) with any inspection that is
+    pending or reviewed are kept, since those feed training.
+    """
+    kept = db.query(Inspection.image_filename).filter(Inspection.status != "automated")
+    rows = db.query(Inspection.image_filename).filter(
+        Inspection.status == "automated",
+        Inspection.created_at < cutoff,
+        Inspection.storage_tier.is_(None),
+        Inspection.image_filename.notin_(kept)
+    ).distinct()
+    return [row.image_filename for row in rows]
+
+
+def apply_retention(db, days=RETENTION_DAYS, action=RETENTION_ACTION, dry_run=False):
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown retention action '{action}'")
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    filenames = candidates(db, cutoff)
+    if dry_run:
+        return {"candidates": len(filenames), "processed": 0, "bytes_saved": 0}
+
+    processed = 0
+    bytes_saved = 0
+    touched = []
+    for filename in filenames:
+        try:
+            if action == "archive":
+                if not storage.move_to_archive(filename):
+                    continue
+            else:
+                data = storage.read_bytes(filename)
+                smaller = compress(data, filename)
+                if smaller is not None:
+                    storage.replace(filename, smaller)
+                    bytes_saved += len(data) - len(smaller)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error applying retention to {filename}: {e}")
+            continue
+        # Mark every row sharing the image so it is not picked up again
+        db.query(Inspection).filter(Inspection.image_filename == filename).update(
+            {Inspection.storage_tier: ACTIONS[action]}, synchronize_session=False
+        )
+        touched.append(filename)
+        processed += 1
+        if processed % 500 == 0:
+            # Cached predictions must not hand out an image that was moved or rewritten
+            prediction_cache.discard_images(db, touched)
+            touched = []
+            db.commit()
+
+    prediction_cache.discard_images(db, touched)
+    db.add(AuditLog(action_type="retention", details=f"{action} {processed} images older than {days} days"))
+    db.commit()
+    return {"candidates": len(filenames), "processed": processed, "bytes_saved": bytes_saved}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compress or archive old automated-pass images; reviewed images are kept.")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS, help="Only touch images older than this")
+    parser.add_argument("--action", choices=sorted(ACTIONS), default=RETENTION_ACTION)
+    parser.add_argument("--dry-run", action="store_true", help="Only count matching images")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        result = apply_retention(db, days=args.days, action=args.action, dry_run=args.dry_run)
+    finally:
+        db.close()
+    print(f"{result['processed']}/{result['candidates']} images {ACTIONS[args.action]}, {result['bytes_saved'] / 1e6:.1f} MB saved.")
@@ -0,0 +1,241 @@
+import hashlib
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Local root for uploads (and derived renditions); STORAGE_URL can move the originals elsewhere
+UPLOAD_DIR = "data/raw"
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+STORAGE_URL = os.getenv("STORAGE_URL", UPLOAD_DIR)
+ARCHIVE_URL = os.getenv("ARCHIVE_URL", "data/archive")
+# Two levels of two hex characters: 65,536 directories, ~15 files each per million uploads
+SHARD_DEPTH = int(os.getenv("STORAGE_SHARD_DEPTH", "2"))
+
+_writer = ThreadPoolExecutor(max_workers=int(os.getenv("STORAGE_WRITERS", "2")), thread_name_prefix="storage")
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def key_for(filename, depth=SHARD_DEPTH):
+    """Sharded object key for a stored filename, e.g. 'ab/cd/<uuid>.jpg'."""
+    digest = hashlib.sha1(filename.encode()).hexdigest()
+    return "/".join([digest[i * 2:i * 2 + 2] for i in range(depth)] + [filename])
+
+
+class LocalBackend:
+    """Objects as files under a root directory."""
+
+    def __init__(self, root):
+        self.root = root
+        self.url = root
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def put(self, key, data):
+        # Write to a temp name first so readers never see a half-written image
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+    def get(self, key):
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def copy_to(self, key, dest):
+        # Hardlink when on the same filesystem, fall back to a copy otherwise
+        try:
+            os.link(self.path(key), dest)
+        except OSError:
+            shutil.copy(self.path(key), dest)
+
+
+class S3Backend:
+    """
+    Objects in an S3-compatible bucket. S3_ENDPOINT_URL points the client at a
+    local stand-in such as MinIO; credentials come from the usual AWS env vars.
+    """
+
+    def __init__(self, bucket, prefix="", endpoint_url=None):
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError("boto3 must be installed to use s3:// storage") from e
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.url = f"s3://{bucket}/{self.prefix}"
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or os.getenv("S3_ENDPOINT_URL"))
+
+    def _key(self, key):
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def put(self, key, data):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+        return self._key(key)
+
+    def get(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"].read()
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def copy_to(self, key, dest):
+        self.client.download_file(self.bucket, self._key(key), dest)
+
+    def presigned_url(self, key, expires=3600):
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": self._key(key)}, ExpiresIn=expires
+        )
+
+
+def backend_from_url(url):
+    if url.startswith("s3://"):
+        bucket, _, prefix = url[len("s3://"):].partition("/")
+        return S3Backend(bucket, prefix)
+    if url.startswith("file://"):
+        url = url[len("file://"):]
+    return LocalBackend(url)
+
+
+hot = backend_from_url(STORAGE_URL)
+archive = backend_from_url(ARCHIVE_URL)
+
+
+def locate(filename):
+    """(backend, key) holding filename: hot shard, legacy flat hot file, then archive."""
+    key = key_for(filename)
+    if hot.exists(key):
+        return hot, key
+    if isinstance(hot, LocalBackend) and hot.exists(filename):
+        return hot, filename
+    if archive.exists(key):
+        return archive, key
+    return None, None
+
+
+def exists(filename):
+    # Only the hot tier counts: archived images are not reused by the prediction cache
+    with _pending_lock:
+        if filename in _pending:
+            return True
+    return hot.exists(key_for(filename)) or (isinstance(hot, LocalBackend) and hot.exists(filename))
+
+
+def read_bytes(filename):
+    backend, key = locate(filename)
+    if backend is None:
+        raise FileNotFoundError(filename)
+    return backend.get(key)
+
+
+def export_to(filename, dest):
+    """Hardlink, copy or download a stored original to a local path."""
+    backend, key = locate(filename)
+    if backend is None:
+        raise FileNotFoundError(filename)
+    backend.copy_to(key, dest)
+
+
+def write_bytes(filename, data):
+    return hot.put(key_for(filename), data)
+
+
+def _write_and_forget(filename, data):
+    try:
+        write_bytes(filename, data)
+    except Exception as e:
+        print(f"Error persisting {filename}: {e}")
+    finally:
+        with _pending_lock:
+            _pending.pop(filename, None)
+
+
+def write_async(filename, data):
+    """Persist an uploaded image in the background, off the request latency path."""
+    with _pending_lock:
+        future = _writer.submit(_write_and_forget, filename, data)
+        _pending[filename] = future
+    return future
+
+
+def pending_writes():
+    with _pending_lock:
+        return len(_pending)
+
+
+def flush(timeout=None):
+    """Block until all queued background writes have completed."""
+    with _pending_lock:
+        futures = list(_pending.values())
+    wait(futures, timeout=timeout)
+
+
+def move_to_archive(filename):
+    """Copy an original to the archive tier, then drop it from the hot tier."""
+    backend, key = locate(filename)
+    if backend is None or backend is archive:
+        return False
+    archive.put(key_for(filename), backend.get(key))
+    backend.delete(key)
+    return True
+
+
+def replace(filename, data):
+    """Overwrite a stored original in place (used when recompressing old images)."""
+    backend, key = locate(filename)
+    if backend is None:
+        raise FileNotFoundError(filename)
+    backend.put(key, data)
+
+
+def reshard(root=UPLOAD_DIR):
+    """Move files from the old flat upload directory into the sharded layout."""
+    moved = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if not os.path.isfile(path) or name.endswith(".part"):
+            continue
+        key = key_for(name)
+        if isinstance(hot, LocalBackend):
+            dest = hot.path(key)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(path, dest)
+        else:
+            with open(path, "rb") as f:
+                hot.put(key, f.read())
+            os.remove(path)
+        moved += 1
+    return moved
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Move flat uploads in data/raw into the sharded storage layout.")
+    parser.parse_args()
+    print(f"Moved {reshard()} files into {hot.url}.")
@@ -0,0 +1,113 @@
+import json
+from collections import namedtuple
+
+TILING_KEY = "tiling"
+MERGE_METHODS = ("nms", "wbf")
+
+# merge is "nms" (keep the most confident box) or "wbf" (confidence-weighted
+# average of overlapping boxes); iou is the overlap at which boxes are merged
+TileConfig = namedtuple("TileConfig", ["tile_size", "overlap", "merge", "iou", "full_frame"])
+DEFAULT_TILING = TileConfig(tile_size=1024, overlap=0.2, merge="wbf", iou=0.5, full_frame=True)
+
+
+def parse_tiling(value):
+    """
+    Parse a tiling config value, e.g. '{"enabled": true, "tile_size": 1280,
+    "overlap": 0.25, "merge": "nms"}'. Returns None when tiling is off.
+    """
+    if not value:
+        return None
+    try:
+        options = json.loads(value)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"tiling is not valid JSON: {e}") from e
+    if not isinstance(options, dict):
+        raise ValueError("tiling must be a JSON object")
+    if not options.get("enabled", True):
+        return None
+    fields = {k: options[k] for k in TileConfig._fields if k in options}
+    config = DEFAULT_TILING._replace(**fields)
+    if config.merge not in MERGE_METHODS:
+        raise ValueError(f"merge must be one of: {', '.join(MERGE_METHODS)}")
+    if not 0 <= config.overlap < 1 or config.tile_size < 32:
+        raise ValueError("tile_size must be >= 32 and overlap in [0, 1)")
+    return config._replace(tile_size=int(config.tile_size), overlap=float(config.overlap))
+
+
+def tiling_for(config_store, line=None):
+    """Tiling settings for a line ("tiling:<line>"), falling back to the global "tiling" key."""
+    value = config_store.get(f"{TILING_KEY}:{line}") if line else None
+    if value is None:
+        value = config_store.get(TILING_KEY)
+    try:
+        return parse_tiling(value)
+    except (ValueError, TypeError) as e:
+        print(f"Ignoring invalid tiling config for line {line!r}: {e}")
+        return None
+
+
+def cache_variant(model_version, tiling):
+    # Tiled and whole-frame results for the same bytes must not share a cache entry
+    if tiling is None:
+        return model_version
+    return f"{model_version}:tiled-{tiling.tile_size}-{tiling.overlap:g}-{tiling.merge}-{tiling.iou:g}-{int(tiling.full_frame)}"
+
+
+def tile_grid(width, height, tile_size, overlap):
+    """
+    Tile origins covering the image, with adjacent tiles overlapping by
+    `overlap` of the tile size. Edge tiles are shifted inwards so every tile
+    is full-size (unless the image itself is smaller).
+    """
+    step = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, step))
+        positions.append(length - tile_size)
+        return positions
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def box_iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def merge_predictions(predictions, method="wbf", iou=0.5):
+    """
+    Merge duplicate boxes of the same class found in overlapping tiles.
+    Greedy by confidence: each cluster keeps its best box (nms) or the
+    confidence-weighted mean of its boxes (wbf), with the top confidence.
+    """
+    merged = []
+    by_class = {}
+    for p in sorted(predictions, key=lambda p: p["confidence"], reverse=True):
+        by_class.setdefault(p["class"], []).append(p)
+    for name, items in by_class.items():
+        clusters = []
+        for p in items:
+            for cluster in clusters:
+                if box_iou(cluster[0]["bbox"], p["bbox"]) >= iou:
+                    cluster.append(p)
+                    break
+            else:
+                clusters.append([p])
+        for cluster in clusters:
+            best = cluster[0]
+            if method == "wbf" and len(cluster) > 1:
+                total = sum(p["confidence"] for p in cluster)
+                bbox = [sum(p["bbox"][i] * p["confidence"] for p in cluster) / total for i in range(4)]
+                merged.append({"class": name, "confidence": best["confidence"], "bbox": bbox})
+            else:
+                merged.append(dict(best))
+    return sorted(merged, key=lambda p: p["confidence"], reverse=True)
@@ -1,96 +1,200 @@
 from ultralytics import YOLO
+import hashlib
+import json
 import os
-import shutil
 import yaml
 from sqlalchemy.orm import Session
 from .database import SessionLocal, Inspection, AuditLog, datetime
+from . import registry
+from . import storage
+from . import near_duplicates
 
 DATASET_PATH = "data/active_learning"
 TRAIN_DIR = os.path.join(DATASET_PATH, "train")
+MANIFEST_PATH = os.path.join(DATASET_PATH, "manifest.json")
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "0"))
+AUTO_ACTIVATE = os.getenv("AUTO_ACTIVATE_MODELS", "1") == "1"
+EXPORT_MAX_NEAR_DUPLICATES = int(os.getenv("EXPORT_MAX_NEAR_DUPLICATES", "3")) # 0 keeps every image
+
+# Class mapping (Assuming 1 class 'defect' for simplicity, or we can extract from predictions)
+# Mapping index: 0 -> 'defect'
+CLASSES = ["defect", "fracture", "stain", "misalignment"] # Example classes
+CLASS_MAP = {name: i for i, name in enumerate(CLASSES)}
+
+def read_image_size(filename):
+    import io
+    from PIL import Image
+    with Image.open(io.BytesIO(storage.read_bytes(filename))) as img:
+        return img.size
+
+def build_label(row):
+    """
+    Render one inspection as YOLO label text.
+    row is (image_filename, data, width, height); returns (image_filename, text).
+    """
+    image_filename, data, img_w, img_h = row
+    lines = []
+    if isinstance(data, list):
+        for obj in data:
+            cls_name = obj.get("class", "defect").lower()
+            cls_id = CLASS_MAP.get(cls_name, 0)
+            
+            bbox = obj.get("bbox")
+            if bbox:
+                try:
+                    # Convert [x1, y1, x2, y2] to center_x, center_y, w, h (normalized)
+                    x1, y1, x2, y2 = bbox
+                    w = (x2 - x1) / img_w
+                    h = (y2 - y1) / img_h
+                    x_center = (x1 + (x2 - x1)/2) / img_w
+                    y_center = (y1 + (y2 - y1)/2) / img_h
+                    
+                    lines.append(f"{cls_id} {x_center} {y_center} {w} {h}\n")
+                except Exception as e:
+                    print(f"Error processing label for {image_filename}: {e}")
+    return image_filename, "".join(lines)
+
+def build_labels(rows):
+    if EXPORT_WORKERS > 1 and len(rows) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=EXPORT_WORKERS) as pool:
+            return list(pool.map(build_label, rows, chunksize=64))
+    return [build_label(row) for row in rows]
+
+def load_manifest():
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    return {}
+
+def save_manifest(manifest):
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def remove_export(entry):
+    for path in (os.path.join(TRAIN_DIR, "images", entry["image"]), os.path.join(TRAIN_DIR, "labels", entry["label"])):
+        if os.path.exists(path):
+            os.remove(path)
 
 def prepare_dataset():
     """
     Export reviewed inspections into YOLO format.
+    Only images that are new or whose labels changed since the last export
+    (tracked in manifest.json) are written; images are hardlinked from local storage or downloaded.
+    Reviewed rows whose original is gone from storage are skipped.
     """
     db = SessionLocal()
-    reviewed = db.query(Inspection).filter(Inspection.status == "reviewed").all()
+    try:
+        reviewed = db.query(
+            Inspection.id,
+            Inspection.image_filename,
+            Inspection.prediction,
+            Inspection.final_prediction,
+            Inspection.image_width,
+            Inspection.image_height,
+            Inspection.perceptual_hash
+        ).filter(Inspection.status == "reviewed").all()
+    finally:
+        db.close()
     
     if len(reviewed) < 5: # Minimum threshold to bother retraining
-        db.close()
         return False, "Not enough reviewed data (need at least 5 samples)"
 
     # Setup directories
     for sub in ["images", "labels"]:
-        path = os.path.join(TRAIN_DIR, sub)
-        if os.path.exists(path):
-            shutil.rmtree(path)
-        os.makedirs(path, exist_ok=True)
-
-    # Class mapping (Assuming 1 class 'defect' for simplicity, or we can extract from predictions)
-    # Mapping index: 0 -> 'defect'
-    classes = ["defect", "fracture", "stain", "misalignment"] # Example classes
-    class_map = {name: i for i, name in enumerate(classes)}
-
-    for item in reviewed:
-        # 1. Copy Image
-        src_img = os.path.join("data/raw", item.image_filename)
-        dest_img = os.path.join(TRAIN_DIR, "images", item.image_filename)
-        if os.path.exists(src_img):
-            shutil.copy(src_img, dest_img)
-        
-        # 2. Create Label
-        # YOLO format: cls x_center y_center width height (normalized)
-        label_filename = item.image_filename.split(".")[0] + ".txt"
-        label_path = os.path.join(TRAIN_DIR, "labels", label_filename)
+        os.makedirs(os.path.join(TRAIN_DIR, sub), exist_ok=True)
+    manifest = load_manifest()
+
+    # Cache hits share a stored image; the most recent review of an image wins
+    rows = {}
+    hashes = {}
+    for item in sorted(reviewed, key=lambda r: r.id):
+        # Use dimensions recorded at upload; only older rows need the image opened
+        img_w, img_h = item.image_width, item.image_height
+        if not img_w or not img_h:
+            try:
+                img_w, img_h = read_image_size(item.image_filename)
+            except Exception as e:
+                print(f"Error reading size for {item.image_filename}: {e}")
+                continue
         
         # Use final_prediction if available, else prediction
         data = item.final_prediction if item.final_prediction else item.prediction
+        rows[item.image_filename] = (item.image_filename, data, img_w, img_h)
+        hashes[item.image_filename] = item.perceptual_hash
+
+    # Near-identical shots add epochs but little signal: keep the newest few per cluster
+    if EXPORT_MAX_NEAR_DUPLICATES > 0:
+        newest_first = list(reversed(list(rows)))
+        thinned = set()
+        for group in near_duplicates.cluster([(name, hashes[name]) for name in newest_first]):
+            thinned.update(group[EXPORT_MAX_NEAR_DUPLICATES:])
+        if thinned:
+            print(f"Dataset export: skipping {len(thinned)} near-duplicate images.")
+        rows = {name: row for name, row in rows.items() if name not in thinned}
+
+    labels = build_labels(list(rows.values()))
+    
+    exported = 0
+    current = {}
+    for image_filename, text in labels:
+        label_filename = image_filename.split(".")[0] + ".txt"
+        entry = {
+            "image": image_filename,
+            "label": label_filename,
+            "label_hash": hashlib.sha1(text.encode()).hexdigest()
+        }
+        current[image_filename] = entry
         
+        dest_img = os.path.join(TRAIN_DIR, "images", image_filename)
+        label_path = os.path.join(TRAIN_DIR, "labels", label_filename)
+        if manifest.get(image_filename) == entry and os.path.exists(dest_img) and os.path.exists(label_path):
+            continue
+        
+        if not os.path.exists(dest_img):
+            # Hardlinked from local storage, downloaded from object storage. Storage is
+            # only asked about images that still need exporting, not every reviewed row.
+            try:
+                storage.export_to(image_filename, dest_img)
+            except FileNotFoundError:
+                del current[image_filename]
+                continue
         with open(label_path, "w") as f:
-            if isinstance(data, list):
-                for obj in data:
-                    cls_name = obj.get("class", "defect").lower()
-                    cls_id = class_map.get(cls_name, 0)
-                    
-                    bbox = obj.get("bbox")
-                    if bbox:
-                        # Convert [x1, y1, x2, y2] to center_x, center_y, w, h
-                        # This part assumes standardized image size or we'd need to fetch actual size
-                        # For robustness, we'd open the image and get width/height
-                        try:
-                            from PIL import Image
-                            with Image.open(src_img) as img:
-                                img_w, img_h = img.size
-                            
-                            x1, y1, x2, y2 = bbox
-                            w = (x2 - x1) / img_w
-                            h = (y2 - y1) / img_h
-                            x_center = (x1 + (x2 - x1)/2) / img_w
-                            y_center = (y1 + (y2 - y1)/2) / img_h
-                            
-                            f.write(f"{cls_id} {x_center} {y_center} {w} {h}\n")
-                        except Exception as e:
-                            print(f"Error processing label for {item.image_filename}: {e}")
+            f.write(text)
+        exported += 1
+    
+    # Drop exports for inspections that are no longer reviewed
+    for key, entry in manifest.items():
+        if key not in current:
+            remove_export(entry)
+    save_manifest(current)
+    print(f"Dataset export: {exported} new or changed, {len(current) - exported} unchanged, {len(set(manifest) - set(current))} removed.")
 
     # 3. Create YAML
     dataset_yaml = {
         "path": os.path.abspath(DATASET_PATH),
         "train": "train/images",
         "val": "train/images", # Use train for val as well if dataset is tiny
-        "nc": len(classes),
-        "names": classes
+        "nc": len(CLASSES),
+        "names": CLASSES
     }
     
     yaml_path = os.path.join(DATASET_PATH, "dataset.yaml")
     with open(yaml_path, "w") as f:
         yaml.dump(dataset_yaml, f)
     
-    db.close()
     return True, yaml_path
 
-def train_model():
+class TrainingCancelled(Exception):
+    pass
+
+def train_model(epochs=10, callbacks=None, job_id=None):
     """
     Main entry point for retraining.
+    callbacks maps Ultralytics callback events (e.g. "on_fit_epoch_end") to
+    functions taking the trainer; raising TrainingCancelled from one stops the run.
     """
     db = SessionLocal()
     success, result = prepare_dataset()
@@ -102,36 +206,43 @@ def train_model():
         db.add(AuditLog(action_type="model_train_start", details="Starting YOLOv11 fine-tuning on human-reviewed data."))
         db.commit()
 
-        # Load current model
-        model = YOLO("yolo11n.pt")
+        # Fine-tune from the currently active registry version
+        active = registry.get_version(db, registry.active_version() or "")
+        model = YOLO(active.path if active else registry.BASE_MODEL_PATH)
+        for event, fn in (callbacks or {}).items():
+            model.add_callback(event, fn)
         
         # Train for a small number of epochs (fine-tuning)
-        # Note: In a real environment, this should happen in a background process
-        model.train(data=result, epochs=10, imgsz=640, device='cpu') # Forcing cpu for user safety
+        model.train(data=result, epochs=epochs, imgsz=640, device='cpu') # Forcing cpu for user safety
         
-        # Save the new version
-        new_weights = "models/fine_tuned_yolo.pt"
-        if not os.path.exists("models"):
-            os.makedirs("models")
-            
-        # Ultralytics saves to 'runs/detect/train/weights/best.pt' usually
-        # We find the latest run
-        runs_dir = "runs/detect"
-        latest_run = sorted(os.listdir(runs_dir))[-1]
-        best_pt = os.path.join(runs_dir, latest_run, "weights", "best.pt")
+        # Ultralytics writes best.pt under this run's own save_dir
+        best_pt = os.path.join(str(model.trainer.save_dir), "weights", "best.pt")
         
         if os.path.exists(best_pt):
-            shutil.copy(best_pt, new_weights)
+            metrics = {k: float(v) for k, v in (model.trainer.metrics or {}).items()}
+            dataset_size = len(os.listdir(os.path.join(TRAIN_DIR, 'images')))
+            new_model = registry.register(
+                db, best_pt,
+                source="fine_tune",
+                training_job_id=job_id,
+                details={"metrics": metrics, "dataset_size": dataset_size, "base_version": active.version if active else None}
+            )
             
             db.add(AuditLog(
                 action_type="model_train_complete", 
-                details=f"Fine-tuning complete. New weights saved to {new_weights}. Dataset size: {len(os.listdir(os.path.join(TRAIN_DIR, 'images')))} images."
+                details=f"Fine-tuning complete. Registered model version {new_model.version}. Dataset size: {dataset_size} images."
             ))
             db.commit()
-            return {"success": True, "message": "Training successful", "weights": new_weights}
+            if AUTO_ACTIVATE:
+                registry.activate(db, new_model.version, reason="training complete")
+            return {"success": True, "message": "Training successful", "weights": new_model.path, "version": new_model.version}
         else:
             return {"success": False, "message": "Training finished but weights not found."}
 
+    except TrainingCancelled:
+        db.add(AuditLog(action_type="model_train_cancelled", details="Retraining cancelled by operator."))
+        db.commit()
+        return {"success": False, "cancelled": True, "message": "Training cancelled"}
     except Exception as e:
         db.add(AuditLog(action_type="model_train_failed", details=f"Retraining failed: {str(e)}"))
         db.commit()
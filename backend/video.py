@@ -0,0 +1,269 @@
+import argparse
+import os
+import threading
+import time
+import uuid
+
+import cv2
+import numpy as np
+
+VIDEO_SAMPLE_FPS = float(os.getenv("VIDEO_SAMPLE_FPS", "2"))
+VIDEO_DIFF_THRESHOLD = float(os.getenv("VIDEO_DIFF_THRESHOLD", "0.04"))
+GATE_SIZE = 64 # Longest edge of the thumbnail frames are compared at
+# Files the API may read must live under this directory; streams and cameras must be listed
+VIDEO_SOURCE_DIR = os.getenv("VIDEO_SOURCE_DIR", "data/videos")
+VIDEO_ALLOWED_SOURCES = [s.strip() for s in os.getenv("VIDEO_ALLOWED_SOURCES", "").split(",") if s.strip()]
+VIDEO_SESSION_TTL = float(os.getenv("VIDEO_SESSION_TTL_SECONDS", "3600")) # How long finished runs stay listed
+VIDEO_MAX_FINISHED = int(os.getenv("VIDEO_MAX_FINISHED_SESSIONS", "50"))
+# Each running session feeds the detector from its own thread, outside the upload admission queue
+VIDEO_MAX_RUNNING = int(os.getenv("VIDEO_MAX_RUNNING_SESSIONS", "4"))
+
+
+class VideoSourceError(ValueError):
+    pass
+
+
+def check_source(source, source_dir=VIDEO_SOURCE_DIR, allowed=VIDEO_ALLOWED_SOURCES):
+    """
+    Validate a source requested through the API and return what to open.
+    Stream URLs and camera indexes must match an entry (or URL prefix) of
+    `allowed`; anything else is a file that must resolve inside source_dir,
+    and is returned as an absolute path so FFmpeg never reads it as a URL.
+    """
+    source = str(source).strip()
+    for entry in allowed:
+        if source == entry or ("://" in entry and source.startswith(entry)):
+            return source
+    if source.isdigit() or "://" in source:
+        raise VideoSourceError(f"Video source '{source}' is not in VIDEO_ALLOWED_SOURCES")
+    root = os.path.realpath(source_dir)
+    path = os.path.realpath(source)
+    if os.path.commonpath([root, path]) != root:
+        raise VideoSourceError(f"Video files must be under {source_dir}")
+    return path
+
+
+def open_source(source):
+    """Open a video file, stream URL (rtsp://, http://) or camera index ("0")."""
+    capture = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not capture.isOpened():
+        raise VideoSourceError(f"Could not open video source '{source}'")
+    return capture
+
+
+def iter_frames(capture, sample_fps=VIDEO_SAMPLE_FPS, stats=None, stop=None):
+    """
+    Yield (frame_index, BGR frame) at roughly sample_fps. Frames between
+    samples are only grabbed, not decoded. Sources that report no frame rate
+    (live streams) are sampled by wall-clock time instead.
+    """
+    source_fps = capture.get(cv2.CAP_PROP_FPS) or 0
+    step = max(1, round(source_fps / sample_fps)) if source_fps > 0 and sample_fps > 0 else None
+    interval = 1.0 / sample_fps if sample_fps > 0 else 0
+    next_at = 0.0
+    index = -1
+    while not (stop and stop.is_set()):
+        if not capture.grab():
+            break
+        index += 1
+        if stats is not None:
+            stats["frames_read"] += 1
+        if step is not None:
+            if index % step:
+                continue
+        else:
+            now = time.monotonic()
+            if now < next_at:
+                continue
+            next_at = now + interval
+        ok, frame = capture.retrieve()
+        if ok:
+            yield index, frame
+
+
+class FrameGate:
+    """
+    Cheap change detector: frames are shrunk to a blurred grayscale thumbnail
+    and compared with the thumbnail of the last frame that was inspected.
+    The score is the mean absolute pixel difference scaled to [0, 1].
+    """
+
+    def __init__(self, threshold=VIDEO_DIFF_THRESHOLD, size=GATE_SIZE):
+        self.threshold = threshold
+        self.size = size
+        self.reference = None
+
+    def signature(self, frame):
+        height, width = frame.shape[:2]
+        scale = self.size / max(height, width)
+        small = cv2.resize(frame, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (3, 3), 0).astype(np.float32)
+
+    def score(self, signature):
+        if self.reference is None or self.reference.shape != signature.shape:
+            return 1.0
+        return float(np.mean(np.abs(signature - self.reference))) / 255.0
+
+    def check(self, frame):
+        """Return (changed, score); a changed frame becomes the new reference."""
+        signature = self.signature(frame)
+        score = self.score(signature)
+        changed = score >= self.threshold
+        if changed:
+            self.reference = signature
+        return changed, score
+
+
+def new_stats():
+    return {
+        "frames_read": 0,
+        "frames_sampled": 0,
+        "frames_skipped": 0,
+        "frames_inspected": 0,
+        "errors": 0,
+        "last_score": None,
+        "last_error": None
+    }
+
+
+def ingest(source, inspect, sample_fps=VIDEO_SAMPLE_FPS, diff_threshold=VIDEO_DIFF_THRESHOLD, max_frames=None, stats=None, stop=None):
+    """
+    Read a video source and call inspect(frame, frame_index) for every sampled
+    frame that differs enough from the previously inspected one. Returns the
+    counters (also updated live in `stats` if given).
+    """
+    stats = stats if stats is not None else new_stats()
+    gate = FrameGate(diff_threshold)
+    capture = open_source(source)
+    try:
+        for index, frame in iter_frames(capture, sample_fps, stats, stop):
+            stats["frames_sampled"] += 1
+            changed, score = gate.check(frame)
+            stats["last_score"] = score
+            if not changed:
+                stats["frames_skipped"] += 1
+            else:
+                try:
+                    inspect(frame, index)
+                    stats["frames_inspected"] += 1
+                except Exception as e:
+                    stats["errors"] += 1
+                    stats["last_error"] = str(e)
+            if max_frames and stats["frames_sampled"] >= max_frames:
+                break
+    finally:
+        capture.release()
+    return stats
+
+
+class VideoSession:
+    """One background ingestion run, started and polled through the API."""
+
+    def __init__(self, source, inspect, line=None, sample_fps=VIDEO_SAMPLE_FPS, diff_threshold=VIDEO_DIFF_THRESHOLD, max_frames=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.source = source
+        self.line = line
+        self.sample_fps = sample_fps
+        self.diff_threshold = diff_threshold
+        self.max_frames = max_frames
+        self.status = "running"
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.stats = new_stats()
+        self._inspect = inspect
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"video-{self.id}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        try:
+            ingest(
+                self.source,
+                lambda frame, index: self._inspect(frame, self.line),
+                self.sample_fps, self.diff_threshold, self.max_frames, self.stats, self._stop
+            )
+            self.status = "stopped" if self._stop.is_set() else "done"
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+        self.finished_at = time.time()
+
+    def expired(self, now, ttl=VIDEO_SESSION_TTL):
+        return self.finished_at is not None and now - self.finished_at > ttl
+
+    def to_dict(self):
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "session_id": self.id,
+            "source": self.source,
+            "line": self.line,
+            "status": self.status,
+            "error": self.error,
+            "sample_fps": self.sample_fps,
+            "diff_threshold": self.diff_threshold,
+            "elapsed_seconds": elapsed,
+            "inspected_per_second": self.stats["frames_inspected"] / elapsed if elapsed > 0 else 0.0,
+            **self.stats
+        }
+
+
+def running_count(sessions):
+    return sum(1 for session in list(sessions.values()) if session.finished_at is None)
+
+
+def expire_sessions(sessions, ttl=VIDEO_SESSION_TTL, max_finished=VIDEO_MAX_FINISHED):
+    """
+    Drop finished runs from a {session_id: VideoSession} dict once they are
+    older than ttl, and all but the newest max_finished of the rest.
+    Running sessions are never dropped.
+    """
+    now = time.time()
+    finished = sorted(
+        (session for session in list(sessions.values()) if session.finished_at is not None),
+        key=lambda session: session.finished_at, reverse=True
+    )
+    for index, session in enumerate(finished):
+        if index >= max_finished or session.expired(now, ttl):
+            sessions.pop(session.id, None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run change-gated frame sampling over a local video file or stream.")
+    parser.add_argument("source", help="Video file path, stream URL or camera index")
+    parser.add_argument("--sample-fps", type=float, default=VIDEO_SAMPLE_FPS)
+    parser.add_argument("--diff-threshold", type=float, default=VIDEO_DIFF_THRESHOLD)
+    parser.add_argument("--max-frames", type=int, default=None, help="Stop after this many sampled frames")
+    parser.add_argument("--inspect", action="store_true", help="Run the detector on gated frames (loads the model)")
+    parser.add_argument("--save-frames", default=None, help="Directory to write gated frames to, for tuning the threshold")
+    args = parser.parse_args()
+
+    detector = None
+    if args.inspect:
+        from .detector import detector
+        detector.start()
+    if args.save_frames:
+        os.makedirs(args.save_frames, exist_ok=True)
+
+    def inspect(frame, index):
+        if args.save_frames:
+            cv2.imwrite(os.path.join(args.save_frames, f"frame_{index:06d}.jpg"), frame)
+        if detector is not None:
+            analysis = detector.analyze(frame)
+            print(f"frame {index}: {analysis['status']} (max confidence {analysis['max_confidence']:.2f})")
+
+    started = time.time()
+    stats = ingest(args.source, inspect, args.sample_fps, args.diff_threshold, args.max_frames)
+    elapsed = time.time() - started
+    print(
+        f"read {stats['frames_read']} frames, sampled {stats['frames_sampled']}, "
+        f"skipped {stats['frames_skipped']} unchanged, inspected {stats['frames_inspected']} "
+        f"({stats['errors']} errors) in {elapsed:.1f}s"
+    )
@@ -0,0 +1,140 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from .database import engine
+
+WRITER_MAX_BATCH = int(os.getenv("WRITER_MAX_BATCH", "64"))
+WRITER_MAX_WAIT_MS = float(os.getenv("WRITER_MAX_WAIT_MS", "5"))
+
+# Rows stay readable after commit so results can be handed back to other threads
+WriterSession = sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
+
+
+class _Job:
+    __slots__ = ("fn", "fallback", "future")
+
+    def __init__(self, fn, fallback):
+        self.fn = fn
+        self.fallback = fallback
+        self.future = Future()
+
+
+class GroupCommitWriter:
+    """
+    Single writer thread that applies queued write jobs in shared transactions.
+    Each job is a function taking a session and staging rows (it must not
+    commit). Up to max_batch jobs, or whatever arrives within max_wait_ms of
+    the first, are committed together, turning N fsyncs into one.
+    If a shared commit fails, the jobs are replayed one transaction each so a
+    single bad row only fails its own caller; `fallback` is tried for a job
+    whose own transaction hits an IntegrityError.
+    """
+
+    def __init__(self, max_batch=WRITER_MAX_BATCH, max_wait_ms=WRITER_MAX_WAIT_MS, session_factory=WriterSession):
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.session_factory = session_factory
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+        self.jobs = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, fn, fallback=None):
+        """Queue a write job; the Future resolves to fn's return value after commit."""
+        self.start()
+        job = _Job(fn, fallback)
+        self._queue.put(job)
+        return job.future
+
+    def write(self, fn, fallback=None):
+        return self.submit(fn, fallback).result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                results = self._commit_group(batch)
+            except Exception:
+                for job in batch:
+                    self._commit_single(job)
+            else:
+                for job, result in zip(batch, results):
+                    job.future.set_result(result)
+            with self._lock:
+                self.batches += 1
+                self.jobs += len(batch)
+
+    def _commit_group(self, batch):
+        db = self.session_factory()
+        try:
+            results = [job.fn(db) for job in batch]
+            db.commit()
+            return results
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _commit_single(self, job):
+        for fn in (job.fn, job.fallback):
+            if fn is None:
+                break
+            db = self.session_factory()
+            try:
+                result = fn(db)
+                db.commit()
+                job.future.set_result(result)
+                return
+            except IntegrityError as e:
+                db.rollback()
+                error = e
+            except Exception as e:
+                db.rollback()
+                error = e
+                break
+            finally:
+                db.close()
+        job.future.set_exception(error)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self.batches,
+                "jobs": self.jobs,
+                "avg_jobs_per_commit": self.jobs / self.batches if self.batches else 0.0
+            }
+
+
+# Singleton instance
+writer = GroupCommitWriter()
@@ -0,0 +1,5 @@
+"""
+Reproducible performance benchmarks for the inspection pipeline.
+
+Run `python -m benchmarks --help` for the available suites.
+"""
@@ -0,0 +1,81 @@
+import argparse
+import json
+import sys
+
+from .results import compare, load_results, write_results
+
+
+def _csv(cast):
+    return lambda value: [cast(v) for v in value.split(",") if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Opti-Quality performance benchmarks")
+    sub = parser.add_subparsers(dest="suite", required=True)
+
+    det = sub.add_parser("detector", help="DefectDetector microbenchmark across batch sizes and backends")
+    det.add_argument("--model", default="yolo11n.pt")
+    det.add_argument("--backends", type=_csv(str), default=["pytorch"])
+    det.add_argument("--batch-sizes", type=_csv(int), default=[1, 2, 4, 8])
+    det.add_argument("--resolution", default="vga", choices=["vga", "hd", "12mp"])
+    det.add_argument("--repeats", type=int, default=10)
+
+    load = sub.add_parser("load", help="End-to-end async load test against a running API")
+    load.add_argument("--url", default="http://localhost:8000")
+    load.add_argument("--concurrency", type=int, default=16)
+    load.add_argument("--duration", type=float, default=30.0)
+    load.add_argument("--mix", type=json.loads, default=None, help='e.g. \'{"upload": 6, "stats": 1}\'')
+    load.add_argument("--resolution", default="vga", choices=["vga", "hd", "12mp"])
+
+    db = sub.add_parser("db", help="Database read-path benchmarks on seeded inspections")
+    db.add_argument("--sizes", type=_csv(int), default=[10000, 100000, 1000000])
+    db.add_argument("--repeats", type=int, default=20)
+    db.add_argument("--workdir", default=None)
+
+    for p in (det, load, db):
+        p.add_argument("--output", "-o", default=None, help="Write machine-readable JSON results here")
+
+    cmp_ = sub.add_parser("compare", help="Flag regressions of a result file against a baseline")
+    cmp_.add_argument("current")
+    cmp_.add_argument("baseline")
+    cmp_.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative change before flagging (default 0.10)")
+
+    args = parser.parse_args(argv)
+
+    if args.suite == "compare":
+        rows = compare(load_results(args.current), load_results(args.baseline), args.tolerance)
+        for row in rows:
+            flag = "REGRESSION" if row["regressed"] else "ok"
+            print(f"{row['metric']:45s} {row['baseline']:12.3f} -> {row['current']:12.3f} ({row['change']:+7.1%}) {flag}")
+        regressions = [r for r in rows if r["regressed"]]
+        print(f"{len(regressions)} regression(s) across {len(rows)} metrics")
+        return 1 if regressions else 0
+
+    if args.suite == "detector":
+        from . import detector_bench
+        params = {"model": args.model, "backends": args.backends, "batch_sizes": args.batch_sizes,
+                  "resolution": args.resolution, "repeats": args.repeats}
+        metrics = detector_bench.run(model_path=args.model, backends=args.backends, batch_sizes=args.batch_sizes,
+                                     resolution=args.resolution, repeats=args.repeats)
+    elif args.suite == "load":
+        from . import load_test
+        params = {"url": args.url, "concurrency": args.concurrency, "duration": args.duration,
+                  "mix": args.mix, "resolution": args.resolution}
+        metrics = load_test.run(base_url=args.url, concurrency=args.concurrency, duration=args.duration,
+                                mix=args.mix, resolution=args.resolution)
+    else:
+        from . import db_bench
+        params = {"sizes": args.sizes, "repeats": args.repeats}
+        metrics = db_bench.run(sizes=args.sizes, repeats=args.repeats, workdir=args.workdir)
+
+    if args.output:
+        write_results(args.output, args.suite, metrics, params)
+        print(f"Results written to {args.output}")
+    if metrics.get("upload_cache_hit_ratio"):
+        print("Uploads were served from the prediction cache; latencies do not measure inference")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import datetime
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, func, insert
+from sqlalchemy.orm import sessionmaker
+
+from .results import latency_summary
+
+STATUS_WEIGHTS = [("automated", 85), ("pending_review", 5), ("reviewed", 10)]
+CLASSES = ["defect", "fracture", "stain", "misalignment"]
+
+
+def _rows(count, seed=0, chunk=10000):
+    rng = random.Random(seed)
+    statuses = [s for s, w in STATUS_WEIGHTS for _ in range(w)]
+    start = datetime.datetime(2025, 1, 1)
+    for offset in range(0, count, chunk):
+        batch = []
+        for i in range(offset, min(offset + chunk, count)):
+            preds = [{
+                "class": rng.choice(CLASSES),
+                "confidence": rng.random(),
+                "bbox": [rng.uniform(0, 600), rng.uniform(0, 400), rng.uniform(600, 640), rng.uniform(400, 480)]
+            } for _ in range(rng.randint(0, 4))]
+            batch.append({
+                "image_filename": f"{i:08d}.jpg",
+                "prediction": preds,
+                "confidence": max((p["confidence"] for p in preds), default=0.0),
+                "status": rng.choice(statuses),
+                "created_at": start + datetime.timedelta(seconds=i * 3),
+                "image_width": 640,
+                "image_height": 480,
+            })
+        yield batch
+
+
+def seed(path, count):
+    """Create a fresh SQLite database at `path` with `count` synthetic inspections."""
+    from backend.database import Base, Inspection
+    from backend import counters
+
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for batch in _rows(count):
+            conn.execute(insert(Inspection), batch)
+    elapsed = time.perf_counter() - started
+
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    try:
+        counters.reconcile(db, fix=True)
+    finally:
+        db.close()
+    return engine, elapsed
+
+
+def _time(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def run(sizes=(10000, 100000, 1000000), repeats=20, workdir=None):
+    """
+    Seed databases of each size and time the read paths the dashboard hits.
+    Metrics are keyed "n<size>_<query>_<stat>".
+    """
+    from backend.database import Inspection
+    from backend import counters
+    from backend.pagination import keyset_page
+
+    workdir = workdir or tempfile.mkdtemp(prefix="opti_bench_")
+    metrics = {}
+    for size in sizes:
+        path = os.path.join(workdir, f"bench_{size}.db")
+        engine, seed_s = seed(path, size)
+        metrics[f"n{size}_seed_rows_per_s"] = size / seed_s
+        db = sessionmaker(bind=engine)()
+        columns = [Inspection.id, Inspection.created_at, Inspection.status, Inspection.confidence]
+
+        def first_page():
+            keyset_page(db.query(*columns).filter(Inspection.status == "pending_review"), Inspection.created_at, Inspection.id, limit=50)
+
+        def deep_pages():
+            cursor = None
+            for _ in range(10):
+                _, cursor = keyset_page(db.query(*columns), Inspection.created_at, Inspection.id, cursor=cursor, limit=50)
+
+        def full_page():
+            keyset_page(db.query(Inspection), Inspection.created_at, Inspection.id, limit=50)
+
+        def stats_counters():
+            counters.get_counts(db)
+
+        def stats_count_scan():
+            for status, _ in STATUS_WEIGHTS:
+                db.query(func.count(Inspection.id)).filter(Inspection.status == status).scalar()
+
+        for name, fn in [
+            ("pending_first_page", first_page),
+            ("ten_pages", deep_pages),
+            ("full_row_page", full_page),
+            ("stats_counters", stats_counters),
+            ("stats_count_scan", stats_count_scan),
+        ]:
+            summary = latency_summary(_time(fn, repeats), prefix=f"n{size}_{name}_")
+            metrics.update(summary)
+            print(f"n={size:<8d} {name:20s} p50 {summary[f'n{size}_{name}_p50_ms']:8.2f} ms  p95 {summary[f'n{size}_{name}_p95_ms']:8.2f} ms")
+        db.close()
+        engine.dispose()
+    return metrics
@@ -0,0 +1,40 @@
+import time
+
+from .images import image_set
+from .results import latency_summary
+
+
+def run(model_path="yolo11n.pt", backends=("pytorch",), batch_sizes=(1, 2, 4, 8),
+        resolution="vga", repeats=10, warmup=2):
+    """
+    Time DefectDetector.analyze_batch for every backend x batch size.
+    Metrics are keyed "<backend>_<resolution>_b<size>_<metric>".
+    """
+    from backend.detector import DefectDetector
+
+    metrics = {}
+    images = image_set(resolution, count=max(batch_sizes))
+    for backend in backends:
+        detector = DefectDetector(model_path=model_path, backend=backend)
+        loaded = detector.start()
+        if loaded.backend != backend:
+            print(f"Skipping {backend}: detector fell back to {loaded.backend} ({(loaded.parity or {}).get('fallback_reason')})")
+            continue
+        for size in batch_sizes:
+            batch = images[:size]
+            for _ in range(warmup):
+                detector.analyze_batch(batch)
+            samples = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                detector.analyze_batch(batch)
+                samples.append(time.perf_counter() - started)
+
+            prefix = f"{backend}_{resolution}_b{size}_"
+            summary = latency_summary(samples, prefix=f"{prefix}batch_")
+            metrics.update(summary)
+            mean_s = sum(samples) / len(samples)
+            metrics[f"{prefix}per_image_ms"] = mean_s / size * 1000
+            metrics[f"{prefix}ips"] = size / mean_s
+            print(f"{backend:14s} {resolution:5s} batch={size:<3d} {metrics[f'{prefix}per_image_ms']:8.1f} ms/img {metrics[f'{prefix}ips']:7.1f} img/s")
+    return metrics
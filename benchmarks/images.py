@@ -0,0 +1,52 @@
+import numpy as np
+import cv2
+
+RESOLUTIONS = {
+    "vga": (640, 480),
+    "hd": (1920, 1080),
+    "12mp": (4000, 3000),
+}
+
+
+def synthetic_image(width, height, seed=0, defects=3):
+    """
+    Deterministic BGR test frame: a lit metal-like gradient with a few
+    scratch / stain shaped marks so detectors have something to look at.
+    """
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    base = (120 + 60 * x + 40 * y).astype(np.float32)
+    noise = rng.normal(0, 6, (height, width)).astype(np.float32)
+    gray = np.clip(base + noise, 0, 255).astype(np.uint8)
+    image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+    scale = max(width, height) / 640
+    for _ in range(defects):
+        cx, cy = int(rng.integers(0, width)), int(rng.integers(0, height))
+        if rng.random() < 0.5:
+            length = int(rng.integers(20, 120) * scale)
+            angle = rng.uniform(0, np.pi)
+            end = (int(cx + length * np.cos(angle)), int(cy + length * np.sin(angle)))
+            cv2.line(image, (cx, cy), end, (40, 40, 40), max(1, int(2 * scale)))
+        else:
+            radius = int(rng.integers(8, 40) * scale)
+            cv2.circle(image, (cx, cy), radius, (60, 70, 90), -1)
+    return image
+
+
+def encode(image, ext=".jpg", quality=90):
+    ok, buf = cv2.imencode(ext, image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError(f"Could not encode image as {ext}")
+    return buf.tobytes()
+
+
+def image_set(resolution="vga", count=8, seed=0):
+    """Return `count` distinct decoded frames at a named resolution."""
+    width, height = RESOLUTIONS[resolution]
+    return [synthetic_image(width, height, seed=seed + i) for i in range(count)]
+
+
+def encoded_set(resolution="vga", count=8, seed=0):
+    return [encode(image) for image in image_set(resolution, count, seed)]
@@ -0,0 +1,108 @@
+import asyncio
+import itertools
+import random
+import struct
+import time
+
+from .images import encoded_set
+from .results import latency_summary
+
+# Relative weights of each request type in the mixed workload
+DEFAULT_MIX = {"upload": 6, "inspections": 2, "stats": 1, "drift": 1}
+
+
+def unique_jpeg(data, tag):
+    """
+    Insert a JPEG comment segment after the SOI marker. The pixels are
+    unchanged but the bytes, and with them the prediction cache key, are
+    unique, without re-encoding the frame on the client.
+    """
+    payload = tag.encode()
+    return data[:2] + b"\xff\xfe" + struct.pack(">H", len(payload) + 2) + payload + data[2:]
+
+
+async def _request(client, kind, images, rng, counter):
+    if kind == "upload":
+        data = unique_jpeg(images[rng.randrange(len(images))], f"bench-{next(counter)}")
+        return await client.post("/upload/", files={"file": ("bench.jpg", data, "image/jpeg")})
+    if kind == "inspections":
+        return await client.get("/inspections/", params={"status": "pending_review", "limit": 50, "fields": "id,status,confidence"})
+    if kind == "stats":
+        return await client.get("/stats/")
+    if kind == "drift":
+        return await client.get("/drift/")
+    raise ValueError(kind)
+
+
+async def _worker(client, deadline, mix, images, samples, errors, cache_hits, counter, seed):
+    rng = random.Random(seed)
+    kinds = [k for k, w in mix.items() for _ in range(w)]
+    while time.perf_counter() < deadline:
+        kind = rng.choice(kinds)
+        started = time.perf_counter()
+        try:
+            res = await _request(client, kind, images, rng, counter)
+            ok = res.status_code < 400
+            if ok and kind == "upload" and res.json().get("cached"):
+                cache_hits[kind] = cache_hits.get(kind, 0) + 1
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - started
+        if ok:
+            samples[kind].append(elapsed)
+        else:
+            errors[kind] = errors.get(kind, 0) + 1
+
+
+async def _run(base_url, concurrency, duration, mix, resolution, unique_images):
+    try:
+        import httpx
+    except ImportError:
+        raise SystemExit("The load test needs httpx: pip install httpx")
+
+    # Every upload is made unique by unique_jpeg so the prediction cache does not short-circuit inference
+    images = encoded_set(resolution, count=unique_images, seed=1000)
+    samples = {kind: [] for kind in mix}
+    errors = {}
+    cache_hits = {}
+    counter = itertools.count()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        ready = await client.get("/readyz")
+        if ready.status_code != 200:
+            raise SystemExit(f"Backend at {base_url} is not ready: {ready.text}")
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*[
+            _worker(client, deadline, mix, images, samples, errors, cache_hits, counter, seed=i)
+            for i in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+    return samples, errors, cache_hits, elapsed
+
+
+def run(base_url="http://localhost:8000", concurrency=16, duration=30.0, mix=None,
+        resolution="vga", unique_images=256):
+    """
+    Closed-loop load test: `concurrency` async clients issue a weighted mix
+    of requests for `duration` seconds. Reports per-endpoint throughput and
+    p50/p95/p99 latency, and the share of uploads answered from the
+    prediction cache, which should be zero.
+    """
+    mix = mix or DEFAULT_MIX
+    samples, errors, cache_hits, elapsed = asyncio.run(_run(base_url, concurrency, duration, mix, resolution, unique_images))
+
+    metrics = {}
+    total = 0
+    for kind, values in samples.items():
+        metrics.update(latency_summary(values, prefix=f"{kind}_"))
+        metrics[f"{kind}_rps"] = len(values) / elapsed
+        metrics[f"{kind}_errors"] = errors.get(kind, 0)
+        total += len(values)
+        print(f"{kind:12s} {len(values) / elapsed:8.1f} req/s  p50 {metrics[f'{kind}_p50_ms']:7.1f} ms  p95 {metrics[f'{kind}_p95_ms']:7.1f} ms  p99 {metrics[f'{kind}_p99_ms']:7.1f} ms  errors {errors.get(kind, 0)}")
+    metrics["total_rps"] = total / elapsed
+    if "upload" in samples:
+        uploads = len(samples["upload"])
+        metrics["upload_cache_hit_ratio"] = cache_hits.get("upload", 0) / uploads if uploads else 0.0
+        print(f"upload cache hit ratio {metrics['upload_cache_hit_ratio']:.1%}")
+    return metrics
@@ -0,0 +1,86 @@
+import datetime
+import json
+import os
+import platform
+
+# Metric name suffixes and whether larger values are better
+HIGHER_IS_BETTER = ("_rps", "_ips", "_per_s")
+LOWER_IS_BETTER = ("_ms", "_s", "_mb", "_errors", "_ratio")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def latency_summary(samples_s, prefix=""):
+    """Summarize latencies given in seconds as milliseconds metrics."""
+    ms = [s * 1000 for s in samples_s]
+    return {
+        f"{prefix}count": len(ms),
+        f"{prefix}mean_ms": sum(ms) / len(ms) if ms else 0.0,
+        f"{prefix}p50_ms": percentile(ms, 50),
+        f"{prefix}p95_ms": percentile(ms, 95),
+        f"{prefix}p99_ms": percentile(ms, 99),
+    }
+
+
+def write_results(path, suite, metrics, params=None):
+    report = {
+        "suite": suite,
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "params": params or {},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "metrics": metrics,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    return report
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def direction(metric):
+    if metric.endswith(HIGHER_IS_BETTER):
+        return 1
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(current, baseline, tolerance=0.10):
+    """
+    Compare two result files metric by metric. A metric regresses when it
+    moves in its "worse" direction by more than `tolerance` (relative).
+    Returns a list of dicts, one per shared directional metric.
+    """
+    rows = []
+    for name, base in sorted(baseline["metrics"].items()):
+        if name not in current["metrics"] or direction(name) == 0:
+            continue
+        value = current["metrics"][name]
+        if not isinstance(base, (int, float)) or not isinstance(value, (int, float)):
+            continue
+        if base == 0:
+            # No relative change from zero; any errors or cache hits on a clean baseline regress
+            if value == 0 or direction(name) > 0:
+                continue
+            change = float("inf") if value > 0 else float("-inf")
+        else:
+            change = (value - base) / abs(base)
+        regressed = change * direction(name) < -tolerance
+        rows.append({"metric": name, "baseline": base, "current": value, "change": change, "regressed": regressed})
+    return rows
@@ -1,13 +1,159 @@
 import streamlit as st
 import requests
-from PIL import Image, ImageDraw
-import io
+from requests.adapters import HTTPAdapter
 import pandas as pd
+import json
+import threading
 import time
-from datetime import datetime
 import os
+from collections import deque
 
 API_URL = os.getenv("API_URL", "http://localhost:8000")
+REVIEW_PAGE_SIZE = int(os.getenv("REVIEW_PAGE_SIZE", "10"))
+
+# --- API Client ---
+# Streamlit reruns the whole script on every interaction, so reads go through
+# one pooled session and short-lived caches shared by all viewers.
+@st.cache_resource
+def get_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def _get(path, params, generation):
+    # generation is only part of the cache key; it changes after this user's own
+    # writes and whenever the event feed reports a relevant change
+    res = get_session().get(f"{API_URL}{path}", params=params, timeout=5)
+    is_json = res.headers.get("content-type", "").startswith("application/json")
+    headers = {name.lower(): value for name, value in res.headers.items()}
+    return {"status_code": res.status_code, "data": res.json() if is_json else None, "headers": headers}
+
+@st.cache_data(ttl=2, show_spinner=False)
+def _get_live(path, params, generation):
+    return _get(path, params, generation)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _get_cached(path, params, generation):
+    return _get(path, params, generation)
+
+def api_get(path, params=None, live=False, events=()):
+    """
+    Cached GET keyed by endpoint and params; live=True for health and job
+    status. `events` lists the event types that make the cached copy stale.
+    """
+    generation = (
+        st.session_state.setdefault("api_generation", {}).get(path, 0),
+        get_event_feed().revision(*events)
+    )
+    fetch = _get_live if live else _get_cached
+    return fetch(path, params or {}, generation)
+
+# Renditions are immutable, so a fetched image never goes stale
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def _get_image(path):
+    res = get_session().get(f"{API_URL}{path}", timeout=10)
+    res.raise_for_status()
+    return res.content
+
+def show_image(path, **kwargs):
+    """
+    Render an API image fetched server-side through the pooled session; the
+    browser cannot be pointed at API_URL, which may be an internal hostname
+    (http://api:8000 under docker-compose). Failures are not cached.
+    """
+    try:
+        st.image(_get_image(path), **kwargs)
+    except requests.RequestException:
+        st.caption("Image not available yet.")
+
+def api_post(path, invalidates=(), **kwargs):
+    """POST through the pooled session, then drop this user's cached reads of `invalidates`."""
+    res = get_session().post(f"{API_URL}{path}", timeout=kwargs.pop("timeout", 60), **kwargs)
+    generations = st.session_state.setdefault("api_generation", {})
+    for stale in invalidates:
+        generations[stale] = generations.get(stale, 0) + 1
+    return res
+
+class EventFeed:
+    """
+    One background consumer of the API's /events/ stream per dashboard server.
+    It keeps the newest inspections up to date from deltas and a revision per
+    event type, so pages only refetch a list after it actually changed.
+    """
+    EVENT_TYPES = ("inspection-created", "status-changed", "config-changed", "drift-alert")
+
+    def __init__(self, max_recent=20):
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=max_recent)
+        self.revisions = {t: 0 for t in self.EVENT_TYPES}
+        self.last_event_id = None
+        self.drift_alert = None
+        self.connected = False
+        threading.Thread(target=self._run, name="event-feed", daemon=True).start()
+
+    def revision(self, *types):
+        with self.lock:
+            if self.connected:
+                return sum(self.revisions[t] for t in types)
+        # Without a live stream, let cached reads go stale every 15 seconds
+        return -int(time.time() // 15)
+
+    def _run(self):
+        # Own session: the stream holds its connection open indefinitely
+        session = requests.Session()
+        while True:
+            try:
+                headers = {"Last-Event-ID": self.last_event_id} if self.last_event_id else {}
+                with session.get(f"{API_URL}/events/", headers=headers, stream=True, timeout=(5, 60)) as res:
+                    res.raise_for_status()
+                    self.connected = True
+                    event = {}
+                    for line in res.iter_lines(decode_unicode=True):
+                        if line:
+                            field, _, value = line.partition(":")
+                            if field:
+                                event[field] = value.lstrip()
+                        elif event:
+                            self._apply(event)
+                            event = {}
+            except Exception:
+                pass
+            self.connected = False
+            time.sleep(2)
+
+    def _apply(self, event):
+        with self.lock:
+            if "id" in event:
+                self.last_event_id = event["id"]
+            kind = event.get("event")
+            if kind == "resync":
+                # History was lost: treat every cached list as stale
+                for t in self.revisions:
+                    self.revisions[t] += 1
+                self.last_event_id = None
+                return
+            if kind not in self.revisions:
+                return
+            self.revisions[kind] += 1
+            data = json.loads(event.get("data") or "{}")
+            if kind == "inspection-created":
+                self.recent.appendleft(data)
+            elif kind == "status-changed":
+                for item in self.recent:
+                    if item["id"] == data["id"]:
+                        item["status"] = data["status"]
+            elif kind == "drift-alert":
+                self.drift_alert = data
+
+    def snapshot(self, line=None):
+        with self.lock:
+            return [dict(item) for item in self.recent if line is None or item.get("line") in (line, None)]
+
+@st.cache_resource
+def get_event_feed():
+    return EventFeed()
 
 # --- Page Config ---
 st.set_page_config(
@@ -145,22 +291,45 @@ with st.sidebar:
     
     st.markdown("---")
     
-    # Simple Health Simulation
+    # Live health from the backend's readiness probe and inference stats
+    try:
+        readiness = api_get("/readyz", live=True)["data"]
+        inference_stats = api_get("/inference/stats", live=True)["data"]
+    except:
+        readiness = None
+        inference_stats = None
+    
     health_col1, health_col2 = st.columns(2)
     with health_col1:
         st.write("🛰️ API Status")
         st.write("🧠 Model")
     with health_col2:
-        st.markdown("<span style='color:#00B894'>● Online</span>", unsafe_allow_html=True)
-        st.markdown("<span style='color:#00B894'>● YOLOv11n</span>", unsafe_allow_html=True)
+        if readiness is None:
+            st.markdown("<span style='color:#D63031'>● Offline</span>", unsafe_allow_html=True)
+            st.markdown("<span style='color:#D63031'>● Unknown</span>", unsafe_allow_html=True)
+        elif readiness["ready"]:
+            st.markdown("<span style='color:#00B894'>● Online</span>", unsafe_allow_html=True)
+            st.markdown(f"<span style='color:#00B894'>● {(readiness['model_version'] or '')[:8]} ({inference_stats['backend']})</span>", unsafe_allow_html=True)
+        else:
+            st.markdown("<span style='color:#FDCB6E'>● Starting</span>", unsafe_allow_html=True)
+            st.markdown("<span style='color:#FDCB6E'>● Loading</span>", unsafe_allow_html=True)
+    
+    if inference_stats:
+        h1, h2 = st.columns(2)
+        h1.metric("p95 Upload", f"{inference_stats['p95_ms']['total']:.0f} ms")
+        h2.metric("p95 Inference", f"{inference_stats['p95_ms']['inference']:.0f} ms")
+        h3, h4 = st.columns(2)
+        h3.metric("Queue", inference_stats["batcher"]["queue_depth"] + inference_stats["executor"]["waiting"])
+        h4.metric("Avg Batch", f"{inference_stats['batcher']['avg_batch_size']:.1f}")
+        st.caption(f"Cache hit rate {inference_stats['prediction_cache']['hit_rate'] * 100:.0f}% · cold start {inference_stats['cold_start_seconds'] or 0:.1f}s")
 
     st.markdown("---")
     st.subheader("Inspection Configuration")
     
     # Fetch current threshold from API
     try:
-        current_threshold_res = requests.get(f"{API_URL}/config/confidence_threshold")
-        current_threshold = float(current_threshold_res.json()["value"]) if current_threshold_res.status_code == 200 else 0.6
+        current_threshold_res = api_get("/config/confidence_threshold", events=["config-changed"])
+        current_threshold = float(current_threshold_res["data"]["value"]) if current_threshold_res["status_code"] == 200 else 0.6
     except:
         current_threshold = 0.6
 
@@ -169,7 +338,7 @@ with st.sidebar:
     if new_threshold != current_threshold:
         if st.button("💾 SAVE CONFIGURATION"):
             try:
-                save_res = requests.post(f"{API_URL}/config/", json={"key": "confidence_threshold", "value": str(new_threshold)})
+                save_res = api_post("/config/", invalidates=["/config/confidence_threshold", "/audit/"], json={"key": "confidence_threshold", "value": str(new_threshold)})
                 if save_res.status_code == 200:
                     st.toast("✅ Configuration Updated", icon="⚙️")
                     st.rerun()
@@ -177,7 +346,11 @@ with st.sidebar:
                 st.error("Failed to update configuration.")
     
     st.markdown("---")
-    st.selectbox("Line Location", ["Plant Osaka - Line 4", "Plant Detroit - Line 12", "Plant Berlin - Line 1"])
+    line_location = st.selectbox("Line Location", ["Plant Osaka - Line 4", "Plant Detroit - Line 12", "Plant Berlin - Line 1"])
+    
+    feed = get_event_feed()
+    if feed.drift_alert:
+        st.warning(f"⚠️ Drift alert at {feed.drift_alert['at'][:19]}: {', '.join(feed.drift_alert['alarms'])}")
     
     st.markdown("---")
     st.info("💡 **Pro-Tip:** Lower confidence cases are automatically routed to the Annotator tab.")
@@ -212,10 +385,8 @@ with tabs[0]:
             if st.button("🚀 INITIATE GPU-ACCELERATED INSPECTION"):
                 files = {"file": (uploaded_file.name, uploaded_file.getvalue(), "image/jpeg")}
                 with st.spinner("AI Analysis in Progress..."):
-                    # Simulating a bit of delay for "vibe"
-                    time.sleep(1)
                     try:
-                        response = requests.post(f"{API_URL}/upload/", files=files)
+                        response = api_post("/upload/", invalidates=["/inspections/", "/stats/", "/drift/"], files=files, data={"line": line_location})
                         if response.status_code == 200:
                             st.session_state.last_upload = response.json()
                             st.toast("✅ Analysis Success", icon="🚀")
@@ -227,7 +398,6 @@ with tabs[0]:
     with col2:
         if "last_upload" in st.session_state:
             data = st.session_state.last_upload
-            img_url = f"{API_URL}/images/{data['filename']}"
             
             is_auto = data['status'] == "automated"
             status_class = "status-automated" if is_auto else "status-pending"
@@ -251,10 +421,7 @@ with tabs[0]:
                 </div>
             """, unsafe_allow_html=True)
             
-            # Fetch and display image
-            img_response = requests.get(img_url)
-            img = Image.open(io.BytesIO(img_response.content))
-            st.image(img, use_container_width=True)
+            show_image(f"/renditions/overlay/{data['filename']}", use_container_width=True)
         else:
             # Placeholder for "Live Feed"
             st.markdown("""
@@ -264,16 +431,43 @@ with tabs[0]:
                     </div>
                 </div>
             """, unsafe_allow_html=True)
+    
+    # Newest scans on this line, kept current from the event stream (no list polling)
+    recent_scans = feed.snapshot(line=line_location)
+    if recent_scans:
+        st.markdown("#### Recent Scans")
+        st.dataframe(
+            pd.DataFrame(recent_scans)[["id", "status", "confidence", "model_version", "at"]],
+            hide_index=True,
+            use_container_width=True
+        )
 
 # --- Tab 1: Annotator Mode ---
 with tabs[1]:
     st.markdown("### 🔍 Human Expert Review Queue")
     
+    # Keyset pages: review_cursors[i] is the cursor that fetches page i
+    if "review_cursors" not in st.session_state:
+        st.session_state.review_cursors = [None]
+    page = len(st.session_state.review_cursors) - 1
+    
     try:
-        response = requests.get(f"{API_URL}/inspections/", params={"status": "pending_review"})
-        pending = response.json() if response.status_code == 200 else []
+        params = {
+            "status": "pending_review",
+            "limit": REVIEW_PAGE_SIZE,
+            "fields": "image_filename,confidence,prediction",
+            "count": "true"
+        }
+        if st.session_state.review_cursors[-1]:
+            params["cursor"] = st.session_state.review_cursors[-1]
+        response = api_get("/inspections/", params, events=["inspection-created", "status-changed"])
+        pending = response["data"] if response["status_code"] == 200 else []
+        next_cursor = response["headers"].get("x-next-cursor")
+        total_pending = response["headers"].get("x-total-count-estimate")
     except:
         pending = []
+        next_cursor = None
+        total_pending = None
     
     if not pending:
         st.markdown("""
@@ -284,7 +478,26 @@ with tabs[1]:
             </div>
         """, unsafe_allow_html=True)
     else:
-        st.write(f"Showing {len(pending)} high-priority cases.")
+        total_text = f" of ~{total_pending}" if total_pending else ""
+        st.write(f"Page {page + 1}: showing {len(pending)}{total_text} high-priority cases.")
+        
+        nav_prev, nav_next = st.columns(2)
+        with nav_prev:
+            if page > 0 and st.button("⬅ PREVIOUS PAGE"):
+                st.session_state.review_cursors.pop()
+                st.rerun()
+        with nav_next:
+            if next_cursor and st.button("NEXT PAGE ➡"):
+                st.session_state.review_cursors.append(next_cursor)
+                st.rerun()
+        
+        # Near-duplicate groups, so one review can close a whole cluster
+        try:
+            clusters_res = api_get("/review/clusters", {"limit": 200}, events=["inspection-created", "status-changed"])
+            clusters = clusters_res["data"] if clusters_res["status_code"] == 200 else []
+        except:
+            clusters = []
+        cluster_members = {i: c["inspection_ids"] for c in clusters for i in c["inspection_ids"]}
         
         for item in pending:
             st.markdown(f"""
@@ -298,8 +511,10 @@ with tabs[1]:
             
             c1, c2 = st.columns([1, 1])
             with c1:
-                img_url = f"{API_URL}/images/{item['image_filename']}"
-                st.image(img_url, use_container_width=True)
+                # Small thumbnail first; the review-size rendition only when expanded
+                show_image(f"/renditions/thumb/{item['image_filename']}", use_container_width=True)
+                if st.toggle("Full view", key=f"full_{item['id']}"):
+                    show_image(f"/renditions/overlay/{item['image_filename']}", use_container_width=True)
             
             with c2:
                 st.markdown("#### Model Interpretation")
@@ -307,12 +522,21 @@ with tabs[1]:
                 
                 correction = st.text_area("Expert Correction / Remediation Notes", key=f"notes_{item['id']}", placeholder="Enter defect description or adjustment...")
                 
+                members = cluster_members.get(item['id'], [item['id']])
+                duplicates = len(members) - 1
+                apply_to_cluster = duplicates > 0 and st.checkbox(
+                    f"Also resolve {duplicates} near-identical pending case(s)",
+                    key=f"cluster_{item['id']}"
+                )
+                
                 bc1, bc2 = st.columns(2)
                 with bc1:
                     if st.button("✅ MARK AS RESOLVED", key=f"btn_res_{item['id']}"):
-                        review_data = {"final_prediction": {"notes": correction, "verified": True}}
-                        requests.post(f"{API_URL}/review/{item['id']}", json=review_data)
-                        st.toast(f"Case #{item['id']} Resolved")
+                        # Send the group shown here so only those cases are resolved
+                        review_data = {"final_prediction": {"notes": correction, "verified": True}, "apply_to_cluster": apply_to_cluster, "inspection_ids": members}
+                        res = api_post(f"/review/{item['id']}", invalidates=["/inspections/", "/stats/", "/audit/", "/review/clusters"], json=review_data)
+                        resolved = len(res.json().get("reviewed_ids", [])) if res.status_code == 200 else 1
+                        st.toast(f"Case #{item['id']} Resolved" + (f" with {resolved - 1} near-duplicates" if resolved > 1 else ""))
                         time.sleep(0.5)
                         st.rerun()
                 with bc2:
@@ -324,11 +548,11 @@ with tabs[2]:
     st.markdown("### 📊 Operational Intelligence")
     
     try:
-        stats_res = requests.get(f"{API_URL}/stats/")
-        stats = stats_res.json() if stats_res.status_code == 200 else None
+        stats_res = api_get("/stats/", events=["inspection-created", "status-changed"])
+        stats = stats_res["data"] if stats_res["status_code"] == 200 else None
         
-        drift_res = requests.get(f"{API_URL}/drift/")
-        drift_data = drift_res.json() if drift_res.status_code == 200 else None
+        drift_res = api_get("/drift/", events=["inspection-created", "drift-alert"])
+        drift_data = drift_res["data"] if drift_res["status_code"] == 200 else None
     except:
         stats = None
         drift_data = None
@@ -354,20 +578,37 @@ with tabs[2]:
             
             with c_retrain:
                 if st.button("🔄 RETRAIN MODEL", help="Fine-tune YOLO on human-reviewed data"):
-                    with st.spinner("Fine-tuning in progress... (This may take a while)"):
-                        try:
-                            res = requests.post(f"{API_URL}/retrain/")
-                            if res.status_code == 200:
-                                data = res.json()
-                                if data["success"]:
-                                    st.success("Retrained Successfully!")
-                                    st.toast("New model version deployed.", icon="🔥")
-                                else:
-                                    st.error(f"Failed: {data['message']}")
-                            else:
-                                st.error("Training Service Error")
-                        except:
-                            st.error("Connection failed.")
+                    try:
+                        res = api_post("/retrain/", invalidates=["/audit/"])
+                        if res.status_code == 200:
+                            st.session_state.train_job_id = res.json()["job_id"]
+                            st.toast("Training job queued.", icon="🔥")
+                        elif res.status_code == 409:
+                            st.session_state.train_job_id = res.json()["detail"]["job_id"]
+                            st.info("A training job is already in progress.")
+                        else:
+                            st.error("Training Service Error")
+                    except:
+                        st.error("Connection failed.")
+                
+                # Background training job progress
+                if "train_job_id" in st.session_state:
+                    try:
+                        job = api_get(f"/retrain/{st.session_state.train_job_id}", live=True)["data"]
+                        if job["status"] in ("queued", "running"):
+                            total = job["total_epochs"] or 1
+                            st.progress(min(job["epoch"] / total, 1.0), text=f"Job #{job['job_id']}: epoch {job['epoch']}/{total}")
+                            if st.button("⏹ CANCEL TRAINING"):
+                                api_post(f"/retrain/{job['job_id']}/cancel", invalidates=[f"/retrain/{job['job_id']}"])
+                                st.rerun()
+                        elif job["status"] == "done":
+                            st.success("Retrained Successfully!")
+                        elif job["status"] == "cancelled":
+                            st.info("Training cancelled.")
+                        else:
+                            st.error(f"Failed: {job['message']}")
+                    except:
+                        st.error("Training status unavailable.")
 
         st.markdown("<br>", unsafe_allow_html=True)
         
@@ -392,9 +633,9 @@ with tabs[2]:
         with col_c2:
             st.markdown('<div class="glass-card"><h4>System Audit Trail</h4></div>', unsafe_allow_html=True)
             try:
-                audit_res = requests.get(f"{API_URL}/audit/")
-                if audit_res.status_code == 200:
-                    audit_logs = audit_res.json()
+                audit_res = api_get("/audit/", events=["status-changed", "config-changed", "drift-alert"])
+                if audit_res["status_code"] == 200:
+                    audit_logs = audit_res["data"]
                     for log in audit_logs:
                         with st.container():
                             st.markdown(f"""
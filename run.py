@@ -2,6 +2,25 @@ import subprocess
 import sys
 import time
 import os
+import urllib.request
+
+READY_URL = "http://127.0.0.1:8000/readyz"
+READY_TIMEOUT = 300
+
+def wait_until_ready(process, url=READY_URL, timeout=READY_TIMEOUT):
+    """Poll the backend readiness probe until the model is warmed up."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=2) as res:
+                if res.status == 200:
+                    return True
+        except Exception:
+            pass
+        time.sleep(0.5)
+    return False
 
 def run_services():
     # Get the path to the virtual environment's python executable
@@ -28,8 +47,14 @@ def run_services():
         text=True
     )
 
-    # Give the backend a moment to start
-    time.sleep(3)
+    # Wait for the model to load instead of guessing a startup delay
+    print("⏳ Waiting for backend readiness (model warm-up)...")
+    started = time.time()
+    if not wait_until_ready(backend_process):
+        print("❌ Backend did not become ready. Check the backend logs.")
+        backend_process.terminate()
+        return
+    print(f"✅ Backend ready in {time.time() - started:.1f}s")
 
     # 2. Start Streamlit Frontend
     print("🎨 Starting Frontend (Streamlit) on http://localhost:8501...")
@@ -0,0 +1,86 @@
+import os
+import tempfile
+
+import pytest
+
+# Point the database and state files at a scratch directory before any backend module is imported
+WORK_DIR = tempfile.mkdtemp(prefix="optiq-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORK_DIR, 'test.db')}")
+os.environ.setdefault("DRIFT_STATE_PATH", os.path.join(WORK_DIR, "drift_state.json"))
+
+
+@pytest.fixture
+def db():
+    """A session on freshly created tables."""
+    from backend.database import Base, SessionLocal, engine, init_db
+
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+class FakeResult:
+    """Mimics an Ultralytics result: one box whose confidence is the image's mean brightness."""
+
+    names = {0: "defect"}
+
+    def __init__(self, image):
+        import numpy as np
+
+        height, width = image.shape[:2]
+        self.boxes = [type("Box", (), {
+            "cls": np.array([0]),
+            "conf": np.array([float(image.mean()) / 255.0]),
+            "xyxy": np.array([[0.0, 0.0, width / 2, height / 2]])
+        })()]
+
+
+class FakeModel:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self, images, verbose=False):
+        import time
+
+        self.calls += 1
+        time.sleep(self.delay)
+        images = images if isinstance(images, list) else [images]
+        return [FakeResult(image) for image in images]
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    """Serve a FakeModel instead of loading YOLO weights."""
+    from backend.detector import detector, LoadedModel
+
+    model = FakeModel()
+    monkeypatch.setattr(detector, "_active", LoadedModel(model, "test-model", "test.pt", "pytorch", None))
+    return model
+
+
+@pytest.fixture
+def client(db, fake_model, tmp_path, monkeypatch):
+    """API client on fresh tables, storing uploads and renditions under tmp_path."""
+    TestClient = pytest.importorskip("fastapi.testclient").TestClient
+    from backend.main import app
+
+    monkeypatch.chdir(tmp_path)
+    return TestClient(app)
+
+
+def encoded_image(brightness, seed=0, size=(96, 128)):
+    """A distinct JPEG whose fake-model confidence is about brightness / 255."""
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(-8, 9, (*size, 3))
+    image = np.clip(brightness + noise, 0, 255).astype(np.uint8)
+    ok, buf = cv2.imencode(".png", image)
+    assert ok
+    return buf.tobytes()
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from backend import detector as detector_module
+from backend.detector import DefectDetector
+
+
+class ShiftedModel:
+    """One fixed box per image; `shift` lowers its confidence like a lossy export would."""
+
+    def __init__(self, shift=0.0):
+        self.shift = shift
+
+    def __call__(self, images, verbose=False):
+        boxes = SimpleNamespace(
+            cls=np.array([0]),
+            conf=np.array([0.8 - self.shift]),
+            xyxy=np.array([[0.0, 0.0, 10.0, 10.0]])
+        )
+        return [SimpleNamespace(boxes=boxes)]
+
+
+@pytest.fixture
+def exports(monkeypatch):
+    monkeypatch.setattr(detector_module, "PARITY_TOLERANCE", 0.05)
+    monkeypatch.setattr(detector_module, "INT8_PARITY_TOLERANCE", 0.15)
+    monkeypatch.setattr(detector_module, "export_backend", lambda path, backend: f"{backend}.export")
+    monkeypatch.setattr(detector_module, "parity_samples", lambda: [np.zeros((8, 8, 3), dtype=np.uint8)])
+    # Every export drifts by 0.1: beyond the FP tolerance, within the INT8 one
+    monkeypatch.setattr(
+        detector_module, "YOLO",
+        lambda path, task=None: ShiftedModel(0.1 if path.endswith(".export") else 0.0)
+    )
+
+
+def test_int8_export_is_checked_against_its_own_tolerance(exports):
+    loaded = DefectDetector().load("w.pt", "v1", warmup=False, backend="openvino_int8")
+
+    assert loaded.backend == "openvino_int8"
+    assert loaded.parity["ok"] and loaded.parity["tolerance"] == 0.15
+
+
+def test_fallback_is_reported_in_the_parity_result(exports):
+    loaded = DefectDetector().load("w.pt", "v1", warmup=False, backend="onnx")
+
+    assert loaded.backend == "pytorch"
+    assert loaded.parity["ok"] is False
+    assert loaded.parity["requested_backend"] == "onnx"
+    assert loaded.parity["tolerance"] == 0.05
+    assert "differs from pytorch" in loaded.parity["fallback_reason"]
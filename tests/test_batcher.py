@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+from backend.batcher import InferenceBatcher
+
+
+class StubDetector:
+    """Records each forward pass; results echo the image and threshold they were given."""
+
+    def __init__(self, error=None, gate=None):
+        self.batches = []
+        self.error = error
+        self.gate = gate
+
+    def analyze_batch(self, images, thresholds):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batches.append(list(images))
+        if self.error is not None:
+            raise self.error
+        return [{"image": image, "threshold": threshold} for image, threshold in zip(images, thresholds)]
+
+
+def test_full_batch_is_dispatched_without_waiting():
+    detector = StubDetector()
+    batcher = InferenceBatcher(detector, max_batch_size=4, max_wait_ms=10000)
+    started = time.perf_counter()
+    futures = [batcher.submit(i) for i in range(4)]
+
+    assert [f.result(timeout=5)["image"] for f in futures] == [0, 1, 2, 3]
+    assert time.perf_counter() - started < 5
+    assert detector.batches == [[0, 1, 2, 3]]
+
+
+def test_partial_batch_is_dispatched_after_max_wait():
+    detector = StubDetector()
+    batcher = InferenceBatcher(detector, max_batch_size=8, max_wait_ms=50)
+    started = time.perf_counter()
+
+    assert batcher.analyze("only")["image"] == "only"
+    assert time.perf_counter() - started >= 0.05
+    assert detector.batches == [["only"]]
+    assert batcher.stats()["batch_size_histogram"] == {1: 1}
+
+
+def test_each_request_keeps_its_threshold_in_a_shared_batch():
+    detector = StubDetector()
+    batcher = InferenceBatcher(detector, max_batch_size=3, max_wait_ms=10000)
+    futures = [batcher.submit("a", 0.2), batcher.submit("b", None), batcher.submit("c", 0.9)]
+
+    assert [(f.result(timeout=5)["image"], f.result()["threshold"]) for f in futures] == [("a", 0.2), ("b", None), ("c", 0.9)]
+    assert len(detector.batches) == 1
+
+
+def test_model_error_reaches_every_waiting_request():
+    gate = threading.Event()
+    detector = StubDetector(error=RuntimeError("CUDA out of memory"), gate=gate)
+    batcher = InferenceBatcher(detector, max_batch_size=3, max_wait_ms=10000)
+    futures = [batcher.submit(i) for i in range(3)]
+    gate.set()
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="out of memory"):
+            future.result(timeout=5)
+    # The batcher thread survives and serves the next batch
+    detector.error = None
+    batcher.max_wait = 0
+    assert batcher.analyze("next", 0.5) == {"image": "next", "threshold": 0.5}
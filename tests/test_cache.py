@@ -0,0 +1,40 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+from backend.cache import PredictionCache
+from backend.database import CachedPrediction
+
+ANALYSIS = {"predictions": [], "max_confidence": 0.9}
+
+
+def stored(db):
+    return sorted((row.content_hash, row.model_version) for row in db.query(CachedPrediction))
+
+
+def test_prune_versions_keeps_active_previous_and_their_tiled_variants(db):
+    cache = PredictionCache()
+    for version in ["old", "prev", "prev:tiled-1024-0.2-wbf-0.5-1", "new", "new:tiled-1024-0.2-wbf-0.5-1"]:
+        cache.put(db, "h1", version, "a.jpg", ANALYSIS)
+    db.commit()
+
+    cache.prune_versions(db, ["new", "prev"])
+    db.commit()
+
+    assert stored(db) == [("h1", "new"), ("h1", "new:tiled-1024-0.2-wbf-0.5-1"), ("h1", "prev"), ("h1", "prev:tiled-1024-0.2-wbf-0.5-1")]
+    assert cache.get(db, "h1", "old") is None
+    assert cache.stats()["entries"] == 4
+
+
+def test_discard_images_drops_every_entry_for_the_file(db):
+    cache = PredictionCache()
+    cache.put(db, "h1", "v1", "a.jpg", ANALYSIS)
+    cache.put(db, "h1", "v2", "a.jpg", ANALYSIS)
+    cache.put(db, "h2", "v1", "b.jpg", ANALYSIS)
+    db.commit()
+
+    cache.discard_images(db, ["a.jpg"])
+    db.commit()
+
+    assert stored(db) == [("h2", "v1")]
+    assert cache.get(db, "h1", "v1") is None
+    assert cache.get(db, "h2", "v1")["image_filename"] == "b.jpg"
@@ -0,0 +1,62 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+from backend import counters
+from backend.database import Inspection
+
+
+def add_inspection(db, status):
+    db.add(Inspection(image_filename="x.jpg", status=status))
+    counters.bump(db, status)
+
+
+def test_counters_follow_inserts_and_status_changes(db):
+    for status in ["automated", "automated", "pending_review", "pending_review", "pending_review"]:
+        add_inspection(db, status)
+    db.commit()
+
+    inspection = db.query(Inspection).filter(Inspection.status == "pending_review").first()
+    inspection.status = "reviewed"
+    counters.move(db, "pending_review", "reviewed")
+    db.commit()
+
+    assert counters.get_counts(db) == {"automated": 2, "pending_review": 2, "reviewed": 1}
+    assert counters.get_counts(db) == counters.actual_counts(db)
+    assert counters.reconcile(db, fix=False) == {}
+
+
+def test_reconcile_repairs_drifted_counters(db):
+    add_inspection(db, "automated")
+    db.add(Inspection(image_filename="y.jpg", status="pending_review"))  # Written without a counter bump
+    db.commit()
+
+    assert counters.reconcile(db, fix=True) == {"pending_review": (0, 1)}
+    assert counters.get_counts(db) == counters.actual_counts(db)
+
+
+def test_a_review_that_lost_a_race_does_not_move_the_counters(client, db, monkeypatch):
+    from backend.database import SessionLocal
+    from backend.near_duplicates import pending_index
+
+    add_inspection(db, "pending_review")
+    add_inspection(db, "pending_review")
+    db.commit()
+    first, second = [row.id for row in db.query(Inspection.id).order_by(Inspection.id)]
+
+    def review_concurrently(session, inspection_id, radius=None):
+        # Another worker reviews both cases between this request's read and its update
+        other = SessionLocal()
+        other.query(Inspection).filter(Inspection.id.in_([first, second])).update({Inspection.status: "reviewed"})
+        counters.move(other, "pending_review", "reviewed")
+        counters.move(other, "pending_review", "reviewed")
+        other.commit()
+        other.close()
+        return [first, second]
+
+    monkeypatch.setattr(pending_index, "cluster_of", review_concurrently)
+    response = client.post(f"/review/{first}", json={"apply_to_cluster": True})
+
+    assert response.status_code == 409
+    db.expire_all()
+    assert counters.reconcile(db, fix=False) == {}
+    assert counters.get_counts(db)["pending_review"] == 0
@@ -0,0 +1,85 @@
+import os
+import random
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+from backend.drift import DriftMonitor, StreamStats
+
+STATIONARY = {
+    "uniform": lambda rng: rng.uniform(0.3, 0.9),
+    "normal": lambda rng: min(1.0, max(0.0, rng.gauss(0.7, 0.1))),
+    # Empty frames (no detection, confidence 0) mixed into a confident stream
+    "with_empty_frames": lambda rng: 0.0 if rng.random() < 0.15 else min(1.0, max(0.0, rng.gauss(0.8, 0.05))),
+}
+
+
+@pytest.mark.parametrize("name", sorted(STATIONARY))
+def test_stationary_stream_never_alarms(name, tmp_path):
+    draw = STATIONARY[name]
+    for seed in range(20):
+        rng = random.Random(seed)
+        monitor = DriftMonitor(state_path=str(tmp_path / "drift.json"))
+        for _ in range(1000):
+            monitor.update([], draw(rng))
+            assert not monitor.alarming(), f"{name} seed {seed} alarmed at {monitor.streams['confidence'].count}"
+
+
+@pytest.mark.parametrize("name", sorted(STATIONARY))
+def test_sequential_tests_rarely_fire_on_stationary_data(name):
+    draw = STATIONARY[name]
+    changes = 0
+    for seed in range(20):
+        rng = random.Random(seed)
+        stats = StreamStats()
+        for _ in range(1000):
+            stats.update(draw(rng))
+        changes += stats.changes
+    # Under one spurious change per 5,000 samples
+    assert changes <= 4
+
+
+def test_sustained_drop_is_detected_and_sequential_tests_restart():
+    rng = random.Random(1)
+    stats = StreamStats()
+    for _ in range(200):
+        stats.update(rng.gauss(0.8, 0.05))
+    assert stats.alarms() == []
+
+    for i in range(20):
+        stats.update(rng.gauss(0.55, 0.05))
+    assert "window" in stats.alarms()
+    assert stats.changes >= 1
+    # Restarted from the new level rather than latched
+    assert stats.cusum < stats.cusum_h and stats.page_hinkley < stats.ph_threshold
+
+
+def test_state_round_trip_keeps_current_tuning():
+    stats = StreamStats()
+    for x in [0.7, 0.8, 0.75] * 20:
+        stats.update(x)
+    state = stats.to_dict()
+    assert "cusum_h" not in state
+
+    # Snapshots written before scaling carried raw-unit tuning and sums
+    old = dict(state, cusum_h=3.0, ph_threshold=2.0, cusum=5.0)
+    del old["seq_count"]
+    restored = StreamStats.from_dict(old)
+    assert restored.cusum_h == StreamStats().cusum_h
+    assert restored.cusum == 0.0
+    assert list(restored.recent) == list(stats.recent)
+
+
+def test_snapshot_uses_a_per_process_temp_file(tmp_path, monkeypatch):
+    seen = []
+    real_replace = os.replace
+    monkeypatch.setattr(os, "replace", lambda src, dst: seen.append(src) or real_replace(src, dst))
+    monitor = DriftMonitor(state_path=str(tmp_path / "drift.json"))
+    monitor.update([], 0.5)
+    monitor.save()
+
+    assert seen and all(str(os.getpid()) in os.path.basename(src) for src in seen)
+    assert os.listdir(tmp_path) == ["drift.json"]
+    restored = DriftMonitor(state_path=str(tmp_path / "drift.json"))
+    restored.load()
+    assert restored.streams["confidence"].count == monitor.streams["confidence"].count
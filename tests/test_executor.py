@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+pytest.importorskip("fastapi")
+from backend import main
+from backend.detector import detector
+from backend.executor import InferenceExecutor
+from conftest import FakeModel, encoded_image
+
+
+class BlockingModel(FakeModel):
+    """Holds every forward pass until released."""
+
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, images, verbose=False):
+        self.entered.set()
+        self.release.wait(10)
+        return super().__call__(images, verbose)
+
+
+def upload(client, seed):
+    return client.post("/upload/", files={"file": ("part.png", encoded_image(200, seed=seed), "image/png")})
+
+
+def test_full_queue_rejects_with_429_and_frees_the_slot(client, fake_model, monkeypatch):
+    executor = InferenceExecutor(slots=1, queue_size=0, retry_after=3)
+    monkeypatch.setattr(main, "inference_executor", executor)
+    model = BlockingModel()
+    monkeypatch.setattr(detector, "_active", detector._active._replace(model=model))
+
+    first = {}
+    worker = threading.Thread(target=lambda: first.setdefault("response", upload(client, 1)))
+    worker.start()
+    try:
+        assert model.entered.wait(5)
+        rejected = upload(client, 2)
+        assert rejected.status_code == 429
+        assert rejected.headers["retry-after"] == "3"
+        assert executor.stats()["rejected"] == 1
+    finally:
+        model.release.set()
+        worker.join(10)
+
+    assert first["response"].status_code == 200
+    assert executor.stats()["running"] == executor.stats()["waiting"] == 0
+    assert upload(client, 3).status_code == 200
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+pytest.importorskip("cv2")
+from backend.near_duplicates import HashIndex, cluster, hamming
+
+
+def flip(value, bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def test_hash_index_matches_brute_force():
+    rng = random.Random(7)
+    index = HashIndex(radius=6)
+    hashes = {}
+    for i in range(2000):
+        # Near-duplicates of a few seeds mixed with unrelated hashes
+        if i % 4 == 0:
+            value = rng.getrandbits(64)
+        else:
+            value = flip(hashes[i - i % 4], rng.sample(range(64), rng.randint(0, 9)))
+        hashes[i] = value
+        index.add(i, f"{value:016x}")
+
+    for probe in rng.sample(sorted(hashes), 100):
+        expected = sorted(
+            ((i, hamming(hashes[probe], v)) for i, v in hashes.items() if hamming(hashes[probe], v) <= 6),
+            key=lambda m: (m[1], m[0])
+        )
+        assert index.query(f"{hashes[probe]:016x}") == expected
+
+
+def test_hash_index_remove_and_re_add():
+    index = HashIndex(radius=4)
+    index.add(1, "00000000000000ff")
+    index.add(2, "00000000000000fe")
+    assert [i for i, _ in index.query("00000000000000ff")] == [1, 2]
+    index.remove(1)
+    assert 1 not in index and len(index) == 1
+    index.add(2, "ffffffffffffffff")
+    assert index.query("00000000000000ff") == []
+
+
+def test_cluster_groups_by_leader():
+    items = [
+        (1, "0000000000000000"),
+        (2, "0000000000000003"),   # 2 bits from 1
+        (3, "ffffffffffffffff"),
+        (4, None),
+        (5, "fffffffffffffff0"),   # 4 bits from 3
+    ]
+    assert sorted(cluster(items, radius=4)) == [[1, 2], [3, 5], [4]]
@@ -0,0 +1,38 @@
+import datetime
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+from backend.database import Inspection
+from backend.pagination import encode_cursor, decode_cursor, keyset_page, InvalidCursorError
+
+
+def test_cursor_round_trip():
+    created_at = datetime.datetime(2024, 5, 1, 12, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("not-a-cursor")
+
+
+def test_pages_cover_every_row_once_with_tied_timestamps(db):
+    start = datetime.datetime(2024, 1, 1)
+    # Groups of three rows share a timestamp, so ordering must fall back to id
+    db.add_all([
+        Inspection(image_filename=f"{i}.jpg", status="automated", created_at=start + datetime.timedelta(seconds=i // 3))
+        for i in range(23)
+    ])
+    db.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = keyset_page(db.query(Inspection), Inspection.created_at, Inspection.id, cursor=cursor, limit=5)
+        seen.extend((row.created_at, row.id) for row in rows)
+        if cursor is None:
+            break
+
+    assert len(seen) == 23
+    assert seen == sorted(seen, reverse=True)
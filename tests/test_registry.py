@@ -0,0 +1,61 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from backend import registry
+from backend.detector import LoadedModel
+
+
+class StubDetector:
+    def __init__(self, version):
+        self._active = LoadedModel(object(), version, f"{version}.pt", "pytorch", None)
+        self.loads = []
+
+    @property
+    def model_version(self):
+        return self._active.version
+
+    def load(self, path, version, backend):
+        self.loads.append(version)
+        return LoadedModel(object(), version, path, backend, None)
+
+    def swap(self, loaded):
+        previous, self._active = self._active, loaded
+        return previous
+
+
+@pytest.fixture
+def watcher(monkeypatch):
+    state = {"version": "v1"}
+    monkeypatch.setattr(registry, "active_version", lambda: state["version"])
+    monkeypatch.setattr(registry, "active_backend", lambda: "pytorch")
+    monkeypatch.setattr(registry, "get_version", lambda db, v: SimpleNamespace(version=v, path=f"{v}.pt"))
+    detector = StubDetector("v1")
+    return registry.ModelWatcher(detector), detector, state
+
+
+def test_rollback_swaps_back_to_the_warm_model(watcher):
+    watcher, detector, state = watcher
+    original = detector._active
+    state["version"] = "v2"
+    assert watcher.sync()
+    assert detector.loads == ["v2"]
+
+    state["version"] = "v1"
+    assert watcher.sync()
+    assert detector._active is original
+    assert detector.loads == ["v2"]
+    assert not watcher.sync()
+
+
+def test_concurrent_syncs_load_once(watcher):
+    watcher, detector, state = watcher
+    state["version"] = "v2"
+    threads = [threading.Thread(target=watcher.sync) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert detector.loads == ["v2"]
+    assert detector.model_version == "v2"
@@ -0,0 +1,27 @@
+import threading
+
+from backend import renditions
+
+
+def test_background_renders_beyond_the_queue_size_are_dropped(monkeypatch):
+    release = threading.Event()
+    rendered = []
+
+    def slow_render(filename, image, predictions):
+        release.wait(5)
+        rendered.append(filename)
+
+    monkeypatch.setattr(renditions, "render", slow_render)
+    monkeypatch.setattr(renditions, "_pending", threading.BoundedSemaphore(1))
+
+    first = renditions.render_async("a.jpg", None, [])
+    assert renditions.render_async("b.jpg", None, []) is None
+
+    release.set()
+    first.result(timeout=5)
+    # The slot is freed once the job finishes, even if rendering fails
+    monkeypatch.setattr(renditions, "render", lambda *args: 1 / 0)
+    renditions.render_async("c.jpg", None, []).result(timeout=5)
+    monkeypatch.setattr(renditions, "render", slow_render)
+    renditions.render_async("d.jpg", None, []).result(timeout=5)
+    assert rendered == ["a.jpg", "d.jpg"]
@@ -0,0 +1,39 @@
+import datetime
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("fastapi")
+from backend import renditions, storage
+from backend.database import Inspection
+from backend.retention import apply_retention
+
+
+def box_columns(path, row):
+    # Overlay boxes are drawn in orange on a black frame
+    overlay = cv2.imread(path)
+    return np.flatnonzero(overlay[row, :, 2] > 200)
+
+
+def test_overlay_of_a_compressed_image_keeps_the_boxes_in_place(client, db):
+    filename = "retained.png"
+    image = np.zeros((1500, 3000, 3), np.uint8)
+    ok, buf = cv2.imencode(".png", image)
+    storage.write_bytes(filename, buf.tobytes())
+    db.add(Inspection(
+        image_filename=filename, status="automated", image_width=3000, image_height=1500,
+        prediction=[{"class": "defect", "confidence": 0.9, "bbox": [1500, 300, 2400, 1200]}],
+        created_at=datetime.datetime.utcnow() - datetime.timedelta(days=90)
+    ))
+    db.commit()
+
+    assert apply_retention(db, days=30, action="compress")["processed"] == 1
+    assert cv2.imdecode(np.frombuffer(storage.read_bytes(filename), np.uint8), cv2.IMREAD_COLOR).shape[1] < 3000
+
+    response = client.get(f"/renditions/overlay/{filename}")
+    assert response.status_code == 200
+    # The review size is 1024 px wide, a third of the upload; row 250 crosses the box sides
+    columns = box_columns(renditions.path_for("overlay", filename), 250)
+    assert abs(columns.min() - 512) <= 3
+    assert abs(columns.max() - 819) <= 3
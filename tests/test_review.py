@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("fastapi")
+from backend.database import AuditLog, Inspection
+from backend.near_duplicates import pending_index
+
+# 1 and 2 are 4 bits apart, as are 2 and 3, but 1 and 3 are 8 apart: /review/clusters lists [1, 2] and [3]
+HASHES = {1: "0000000000000000", 2: "000000000000000f", 3: "00000000000000ff"}
+
+
+@pytest.fixture
+def pending(db):
+    for inspection_id, hex_hash in HASHES.items():
+        db.add(Inspection(id=inspection_id, image_filename=f"{inspection_id}.jpg", status="pending_review", perceptual_hash=hex_hash))
+    db.commit()
+    pending_index.rebuild(db)
+    return db
+
+
+def statuses(db):
+    db.expire_all()
+    return {row.id: row.status for row in db.query(Inspection)}
+
+
+def test_cluster_review_resolves_the_listed_group_only(client, pending):
+    assert sorted(pending_index.clusters(pending, min_size=1)) == [[1, 2], [3]]
+
+    response = client.post("/review/2", json={"final_prediction": {"notes": "scratch"}, "apply_to_cluster": True})
+    assert sorted(response.json()["reviewed_ids"]) == [1, 2]
+    assert statuses(pending) == {1: "reviewed", 2: "reviewed", 3: "pending_review"}
+
+
+def test_cluster_review_resolves_only_shown_ids_of_the_group(client, pending):
+    # 3 is not in the group of 1, whatever the client sends
+    response = client.post("/review/1", json={"apply_to_cluster": True, "inspection_ids": [1, 3]})
+    assert response.json()["reviewed_ids"] == [1]
+    assert statuses(pending) == {1: "reviewed", 2: "pending_review", 3: "pending_review"}
+
+
+@pytest.mark.parametrize("radius", [-1, 64])
+def test_radius_out_of_range_is_rejected(client, pending, radius):
+    assert client.get("/review/clusters", params={"radius": radius}).status_code == 422
+    assert client.get("/inspections/1/similar", params={"radius": radius}).status_code == 422
+
+
+def test_sync_drops_cases_reviewed_by_another_worker(pending):
+    # Another process reviewed #3: only its status and audit entry reach this one
+    pending.query(Inspection).filter(Inspection.id == 3).update({Inspection.status: "reviewed"})
+    pending.add(AuditLog(inspection_id=3, action_type="human_review", details="reviewed elsewhere"))
+    pending.commit()
+
+    assert [i for i, _ in pending_index.similar(pending, HASHES[2])] == [2, 1]
+    assert 3 not in pending_index.snapshot()
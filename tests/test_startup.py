@@ -0,0 +1,23 @@
+import warnings
+
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+
+
+def test_lifespan_initializes_the_database_and_serves_probes(db, tmp_path, monkeypatch):
+    from backend import main
+
+    monkeypatch.chdir(tmp_path)
+    # Keep the background loaders out of the test; only the synchronous startup path runs
+    for owner, name in [(main, "load_model"), (main.detections, "init_detections"), (main.near_duplicates, "init_index")]:
+        monkeypatch.setattr(owner, name, lambda: None)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        with TestClient(main.app) as client:
+            assert main.startup_state["db_ready"] is True
+            assert client.get("/healthz").status_code == 200
+            ready = client.get("/readyz")
+    assert ready.status_code == 503
+    assert ready.json()["model_ready"] is False
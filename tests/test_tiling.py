@@ -0,0 +1,75 @@
+import pytest
+
+from backend.tiling import tile_grid, merge_predictions, parse_tiling, cache_variant, DEFAULT_TILING
+
+
+def box(x1, y1, x2, y2, confidence, name="defect"):
+    return {"class": name, "confidence": confidence, "bbox": [x1, y1, x2, y2]}
+
+
+def test_tile_grid_covers_image_with_full_size_tiles():
+    tiles = tile_grid(3000, 2000, 1024, 0.2)
+    assert all(x2 - x1 == 1024 and y2 - y1 == 1024 for x1, y1, x2, y2 in tiles)
+    assert max(x2 for _, _, x2, _ in tiles) == 3000
+    assert max(y2 for _, _, _, y2 in tiles) == 2000
+    assert tile_grid(500, 400, 1024, 0.2) == [(0, 0, 500, 400)]
+
+
+def test_nms_keeps_most_confident_of_duplicates_across_tiles():
+    # The same defect seen by two overlapping tiles, plus a separate one
+    merged = merge_predictions([
+        box(100, 100, 200, 200, 0.6),
+        box(104, 98, 202, 204, 0.9),
+        box(800, 800, 900, 900, 0.7),
+    ], method="nms", iou=0.5)
+    assert [p["confidence"] for p in merged] == [0.9, 0.7]
+    assert merged[0]["bbox"] == [104, 98, 202, 204]
+
+
+def test_wbf_averages_duplicates_by_confidence():
+    merged = merge_predictions([box(0, 0, 100, 100, 0.75), box(10, 0, 110, 100, 0.25)], method="wbf", iou=0.5)
+    assert len(merged) == 1
+    assert merged[0]["confidence"] == 0.75
+    assert merged[0]["bbox"] == [2.5, 0.0, 102.5, 100.0]
+
+
+def test_merge_never_fuses_different_classes():
+    merged = merge_predictions([box(0, 0, 100, 100, 0.8, "stain"), box(0, 0, 100, 100, 0.7, "fracture")], method="wbf")
+    assert sorted(p["class"] for p in merged) == ["fracture", "stain"]
+
+
+def test_parse_tiling_and_cache_variant():
+    assert parse_tiling(None) is None
+    assert parse_tiling('{"enabled": false}') is None
+    config = parse_tiling('{"tile_size": 1280, "merge": "nms"}')
+    assert config == DEFAULT_TILING._replace(tile_size=1280, merge="nms")
+    assert cache_variant("v1", None) == "v1"
+    assert cache_variant("v1", config) != cache_variant("v1", DEFAULT_TILING)
+
+
+@pytest.mark.parametrize("value", ["1", "null", "[]", '"on"', "{tile_size: 1280}", '{"merge": "max"}', '{"tile_size": 8}'])
+def test_parse_tiling_rejects_invalid_values(value):
+    with pytest.raises(ValueError):
+        parse_tiling(value)
+
+
+def test_invalid_tiling_config_is_a_bad_request(client):
+    response = client.post("/config/", json={"key": "tiling", "value": "1"})
+    assert response.status_code == 400
+    assert "JSON object" in response.json()["detail"]
+
+
+def test_tiles_are_queued_on_the_micro_batcher(fake_model):
+    import numpy as np
+    from backend.batcher import InferenceBatcher
+    from backend.detector import detector
+
+    batcher = InferenceBatcher(detector, max_batch_size=4, max_wait_ms=10)
+    image = np.full((128, 128, 3), 200, np.uint8)
+    analysis = batcher.analyze_tiled(image, parse_tiling('{"tile_size": 64, "overlap": 0}'), threshold=0.5)
+
+    # Four tiles plus the whole frame, in a full batch of four and one more
+    assert analysis["tiles"] == 5
+    assert batcher.stats()["batch_size_histogram"] == {1: 1, 4: 1}
+    assert [64, 64, 96, 96] in [p["bbox"] for p in analysis["predictions"]]
+    assert analysis["status"] == "automated"
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+from backend.database import Inspection
+from backend.executor import inference_executor
+from conftest import encoded_image
+
+
+def post_batch(client, images, **data):
+    files = [("files", (f"{i}.png", image, "image/png")) for i, image in enumerate(images)]
+    response = client.post("/upload/batch", files=files, data=data)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_batch_stores_every_image_with_its_line(client, db):
+    images = [encoded_image(230 if i % 2 else 40, seed=i) for i in range(20)]
+    lines = post_batch(client, images, line="Line 4")
+
+    *results, trailer = lines
+    assert trailer == {"done": True, "count": 20, "committed": True}
+    assert sorted(r["index"] for r in results) == list(range(20))
+    assert all("error" not in r for r in results)
+
+    rows = db.query(Inspection).order_by(Inspection.id).all()
+    assert sorted(r.id for r in rows) == sorted(r["id"] for r in results)
+    assert {r.line for r in rows} == {"Line 4"}
+    assert {r["status"] for r in results} == {"automated", "pending_review"}
+
+
+def test_batch_reports_unreadable_images_and_keeps_the_rest(client, db):
+    lines = post_batch(client, [encoded_image(200, seed=100), b"not an image", encoded_image(200, seed=101)])
+
+    *results, trailer = lines
+    assert trailer["committed"] is True
+    errors = [r for r in results if "error" in r]
+    assert [r["index"] for r in errors] == [1]
+    assert db.query(Inspection).count() == 2
+
+
+def test_batch_releases_its_slot(client):
+    before = inference_executor.stats()["waiting"] + inference_executor.stats()["running"]
+    post_batch(client, [encoded_image(200, seed=200)])
+    after = inference_executor.stats()["waiting"] + inference_executor.stats()["running"]
+    assert after == before
+
+
+def test_batch_writes_go_through_the_group_commit_writer(client, db, monkeypatch):
+    from backend.writer import writer
+
+    submitted = []
+    submit = writer.submit
+    monkeypatch.setattr(writer, "submit", lambda fn, fallback=None: submitted.append(fn) or submit(fn, fallback))
+    # The same bytes twice: both miss the cache lookup, and the second must not fail on the cache row
+    image = encoded_image(200, seed=300)
+    *results, trailer = post_batch(client, [image, image, encoded_image(40, seed=301)])
+
+    assert trailer["committed"] is True
+    assert all("error" not in r for r in results)
+    assert db.query(Inspection).count() == 3
+    assert len(submitted) >= 3
@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+
+import pytest
+
+from backend import video
+
+
+def test_files_must_stay_inside_the_source_directory(tmp_path):
+    source_dir = tmp_path / "videos"
+    source_dir.mkdir()
+    inside = str(source_dir / "line4.mp4")
+
+    assert video.check_source(inside, str(source_dir), []) == os.path.realpath(inside)
+    for source in ["/etc/passwd", str(source_dir / ".." / "secret.mp4"), str(tmp_path / "videos-other" / "a.mp4")]:
+        with pytest.raises(video.VideoSourceError):
+            video.check_source(source, str(source_dir), [])
+
+
+def test_streams_and_cameras_must_be_allowed(tmp_path):
+    allowed = ["rtsp://cameras.local/", "0"]
+    assert video.check_source("rtsp://cameras.local/line4", str(tmp_path), allowed) == "rtsp://cameras.local/line4"
+    assert video.check_source("0", str(tmp_path), allowed) == "0"
+    for source in ["rtsp://elsewhere/line4", "http://169.254.169.254/latest", "1"]:
+        with pytest.raises(video.VideoSourceError):
+            video.check_source(source, str(tmp_path), allowed)
+
+
+def test_finished_sessions_expire_and_running_ones_stay():
+    now = time.time()
+    sessions = {}
+    for name, finished_at in [("running", None), ("old", now - 7200), ("recent", now - 10), ("older", now - 20)]:
+        session = video.VideoSession("unused", lambda frame, line: None)
+        session.id = name
+        session.finished_at = finished_at
+        sessions[name] = session
+
+    video.expire_sessions(sessions, ttl=3600, max_finished=1)
+    assert set(sessions) == {"running", "recent"}
+
+
+def write_clip(path, static_frames=10, fps=10):
+    """static_frames identical gray frames followed by one bright one."""
+    import cv2
+    import numpy as np
+
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (160, 120))
+    if not writer.isOpened():
+        pytest.skip("OpenCV was built without a video writer")
+    for _ in range(static_frames):
+        writer.write(np.full((120, 160, 3), 90, np.uint8))
+    writer.write(np.full((120, 160, 3), 220, np.uint8))
+    writer.release()
+    return str(path)
+
+
+def test_gate_skips_static_frames_and_inspects_changes(tmp_path):
+    clip = write_clip(tmp_path / "line4.avi")
+    inspected = []
+
+    stats = video.ingest(clip, lambda frame, index: inspected.append(index), sample_fps=10)
+
+    assert stats["frames_read"] == stats["frames_sampled"] == 11
+    assert stats["frames_skipped"] == 9
+    assert stats["frames_inspected"] == 2
+    assert inspected == [0, 10]
+
+
+def test_max_frames_and_stop_end_the_run(tmp_path):
+    clip = write_clip(tmp_path / "line4.avi")
+
+    assert video.ingest(clip, lambda frame, index: None, sample_fps=10, max_frames=3)["frames_sampled"] == 3
+
+    stop = threading.Event()
+    stats = video.ingest(clip, lambda frame, index: stop.set(), sample_fps=10, stop=stop)
+    assert stats["frames_sampled"] == stats["frames_inspected"] == 1
+
+
+def test_starts_beyond_the_running_limit_are_rejected(client, tmp_path, monkeypatch):
+    from backend import main
+
+    os.makedirs("data/videos")
+    write_clip(tmp_path / "data" / "videos" / "line4.avi")
+    busy = video.VideoSession("busy", lambda frame, line: None)
+    monkeypatch.setattr(main, "video_sessions", {busy.id: busy})
+    monkeypatch.setattr(video, "VIDEO_MAX_RUNNING", 1)
+
+    response = client.post("/ingest/video", json={"source": "data/videos/line4.avi"})
+    assert response.status_code == 429
+    assert "retry-after" in response.headers
+
+    busy.finished_at = time.time()
+    response = client.post("/ingest/video", json={"source": "data/videos/line4.avi", "sample_fps": 10})
+    assert response.status_code == 200
+    main.video_sessions[response.json()["session_id"]]._thread.join(10)
+    assert main.video_sessions[response.json()["session_id"]].status == "done"
@@ -0,0 +1,25 @@
+from sqlalchemy.exc import IntegrityError
+
+from backend.database import Inspection
+from backend.writer import GroupCommitWriter
+
+
+def add_inspection(inspection_id, filename):
+    return lambda wdb: wdb.add(Inspection(id=inspection_id, image_filename=filename, status="automated"))
+
+
+def test_conflicting_job_falls_back_without_failing_the_group(db):
+    # A long wait puts all jobs in one shared transaction, which the duplicate id breaks
+    writer = GroupCommitWriter(max_batch=8, max_wait_ms=200)
+    first = writer.submit(add_inspection(1, "a.jpg"))
+    conflict = writer.submit(add_inspection(1, "b.jpg"), fallback=add_inspection(2, "b.jpg"))
+    unrecoverable = writer.submit(add_inspection(1, "c.jpg"))
+    last = writer.submit(add_inspection(3, "d.jpg"))
+
+    first.result(timeout=5)
+    conflict.result(timeout=5)
+    last.result(timeout=5)
+    assert isinstance(unrecoverable.exception(timeout=5), IntegrityError)
+
+    rows = {row.id: row.image_filename for row in db.query(Inspection)}
+    assert rows == {1: "a.jpg", 2: "b.jpg", 3: "d.jpg"}